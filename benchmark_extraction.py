@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+In-process benchmark for MCQ extraction.
+
+Generates synthetic question banks (TXT, DOCX, XLSX, PDF, PNG) of a given
+size, clean or with OCR-style noise, and runs them through MCQExtractor
+stage by stage and through the FastAPI app with a test client. For each
+format/size/noise case it reports throughput, p50/p95/p99 latency and
+memory per stage. Use --json to save the results and compare them across
+commits.
+
+    python benchmark_extraction.py --sizes 10,100,1000 --formats txt,pdf --repeat 5
+    python benchmark_extraction.py --sizes 50000 --formats txt,xlsx --noise clean --json bench.json
+    python benchmark_extraction.py --sizes 5000 --formats pdf,xlsx --stages extract_text
+    python benchmark_extraction.py --sizes 1000,10000,100000 --formats txt --stages extract_text --answer-keys
+"""
+
+import argparse
+import io
+import json
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import main
+
+SUBJECTS = ["photosynthesis", "the French Revolution", "binary search", "plate tectonics", "inflation",
+            "Newton's second law", "the mitochondria", "supply and demand", "the water cycle", "recursion"]
+STEMS = ["Which statement best describes {}?", "What is the main cause of {}?",
+         "Which of the following is an example of {}?", "What happens during {}?"]
+WORDS = ["energy", "process", "system", "value", "force", "market", "cell", "layer", "cycle", "function",
+         "rate", "change", "balance", "structure", "pressure", "signal"]
+OPTION_LETTERS = "ABCD"
+
+
+def generate_questions(count, seed=0):
+    """Deterministic list of (number, question, {letter: option}, answer)"""
+    rng = random.Random(seed)
+    questions = []
+    for number in range(1, count + 1):
+        stem = rng.choice(STEMS).format(rng.choice(SUBJECTS))
+        options = {letter: " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).capitalize()
+                   for letter in OPTION_LETTERS}
+        questions.append((number, stem, options, rng.choice(OPTION_LETTERS)))
+    return questions
+
+
+def render_lines(questions, noisy=False, seed=0):
+    """Text lines for a question bank; noisy mode mimics OCR and PDF extraction artefacts"""
+    rng = random.Random(seed)
+    lines = []
+    for number, stem, options, answer in questions:
+        if noisy and rng.random() < 0.2:
+            # Question number split from its text
+            lines.extend([f"{number}.", stem])
+        else:
+            lines.append(f"{number}. {stem}")
+        for letter, text in options.items():
+            label = letter
+            if noisy and letter == "C" and rng.random() < 0.3:
+                label = "G"  # Common OCR misread
+            separator = rng.choice([") ", ". ", ")"]) if noisy else ") "
+            lines.append(f"{label}{separator}{text}")
+        lines.append(f"Answer: {answer}")
+        if noisy and rng.random() < 0.1:
+            lines.append("   ")
+    return lines
+
+
+def make_txt(questions, noisy):
+    return "\n".join(render_lines(questions, noisy)).encode("utf-8")
+
+
+def make_docx(questions, noisy):
+    from docx import Document
+    doc = Document()
+    for line in render_lines(questions, noisy):
+        doc.add_paragraph(line)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def make_xlsx(questions, noisy):
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Questions")
+    if noisy:
+        # No header row: forces the text path
+        for line in render_lines(questions, noisy):
+            sheet.append([line])
+    else:
+        sheet.append(["No", "Question", "A", "B", "C", "D", "Answer"])
+        for number, stem, options, answer in questions:
+            sheet.append([number, stem, *options.values(), answer])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def make_pdf(questions, noisy, lines_per_page=60):
+    import fitz  # PyMuPDF
+    lines = render_lines(questions, noisy)
+    doc = fitz.open()
+    for start in range(0, len(lines), lines_per_page):
+        page = doc.new_page()
+        page.insert_text((50, 50), "\n".join(lines[start:start + lines_per_page]), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_png(questions, noisy, lines_per_image=60):
+    from PIL import Image, ImageDraw, ImageFilter
+    lines = render_lines(questions, noisy)[:lines_per_image]
+    image = Image.new("L", (1240, 40 + 22 * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    for row, line in enumerate(lines):
+        draw.text((40, 20 + 22 * row), line, fill=0)
+    if noisy:
+        image = image.filter(ImageFilter.GaussianBlur(0.8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def answer_key_inputs(size, seed=0):
+    """Adversarial answer-key texts of about `size` lines each, keyed by name"""
+    rng = random.Random(seed)
+    letters = [rng.choice(OPTION_LETTERS) for _ in range(size)]
+    return {
+        # "answers" inside every question and digit/letter pairs everywhere, no blank lines
+        "prose_with_answers": "\n".join(
+            f"{n}. Which answers are correct for {n % 7} {letters[n - 1]} and part {n % 5} {letters[-n]}?"
+            for n in range(1, size + 1)
+        ),
+        # A header on every other line, each followed by prose
+        "repeated_headers": "\n".join(
+            "Answer Key" if n % 2 else f"{n} A note about answers {n} B" for n in range(1, size + 1)
+        ),
+        # The whole key on one line
+        "single_line_key": "Answer Key: " + " ".join(f"{n}-{letter}" for n, letter in enumerate(letters, 1)),
+        # Ten-column grid of numbers over letters
+        "grid_key": "Correct Answers\n" + "\n".join(
+            f"{' '.join(str(n) for n in range(start, start + 10))}\n{' '.join(letters[start - 1:start + 9])}"
+            for start in range(1, size - 9, 10)
+        ),
+    }
+
+
+def benchmark_answer_keys(extractor, sizes, repeat):
+    """Time _extract_answer_key on adversarial inputs; ns/byte should stay flat as size grows"""
+    results = []
+    for size in sizes:
+        for name, text in answer_key_inputs(size).items():
+            lines = text.split("\n")
+            key, latencies, memory = measure(lambda: extractor._extract_answer_key(lines), repeat)
+            stats = summarize(latencies, size, memory)
+            stats["ns_per_byte"] = round(percentile(latencies, 0.5) * 1e9 / len(text), 1)
+            results.append({"input": name, "lines": size, "bytes": len(text), "answers": len(key), "stats": stats})
+            print(f"answer-key {name:<20} {size:>6} lines  p50 {stats['p50_ms']:>9.2f} ms  "
+                  f"{stats['ns_per_byte']:>7.1f} ns/byte  {len(key):>6} answers")
+    return results
+
+
+GENERATORS = {"txt": make_txt, "docx": make_docx, "xlsx": make_xlsx, "pdf": make_pdf, "png": make_png}
+
+
+def tesseract_available():
+    try:
+        subprocess.run(["tesseract", "--version"], capture_output=True, check=True)
+        return True
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+
+def measure(function, repeat):
+    """Run function `repeat` times; return (last result, latencies in seconds, memory stats in MB)"""
+    latencies = []
+    peak_bytes = 0
+    transient_bytes = 0
+    result = None
+    for _ in range(repeat):
+        result = None
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = function()
+        latencies.append(time.perf_counter() - start)
+        current, peak = tracemalloc.get_traced_memory()
+        peak_bytes = max(peak_bytes, peak)
+        # Memory churn: the peak above what the result still holds (intermediate copies and buffers)
+        transient_bytes = max(transient_bytes, peak - current)
+        tracemalloc.stop()
+    memory = {
+        "peak_traced_mb": peak_bytes / (1024 * 1024),
+        "transient_mb": transient_bytes / (1024 * 1024),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    return result, latencies, memory
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, questions, memory):
+    p50 = percentile(latencies, 0.50)
+    return {
+        "runs": len(latencies),
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "questions_per_sec": round(questions / p50, 1) if p50 > 0 else None,
+        "peak_traced_mb": round(memory["peak_traced_mb"], 2),
+        "transient_mb": round(memory["transient_mb"], 2),
+        "max_rss_mb": round(memory["max_rss_mb"], 1),
+    }
+
+
+STAGES = ("extract_text", "parse_mcqs", "extract_mcqs", "api")
+
+
+def benchmark_case(extractor, client, file_format, size, noisy, repeat, stages_to_run):
+    questions = generate_questions(size)
+    content = GENERATORS[file_format](questions, noisy)
+    filename = f"bank.{file_format}"
+    spec = main.detect_file_format(content, filename)
+    stages = {}
+    mcqs = None
+
+    text, latencies, memory = measure(lambda: getattr(extractor, spec.method)(content), repeat)
+    stages["extract_text"] = summarize(latencies, size, memory)
+
+    if "parse_mcqs" in stages_to_run:
+        _, latencies, memory = measure(lambda: extractor.parse_mcqs(text), repeat)
+        stages["parse_mcqs"] = summarize(latencies, size, memory)
+
+    if "extract_mcqs" in stages_to_run:
+        (mcqs, _, _), latencies, memory = measure(lambda: extractor.extract_mcqs(content, filename), repeat)
+        stages["extract_mcqs"] = summarize(latencies, size, memory)
+
+    if "api" in stages_to_run and client is not None:
+        for endpoint in ("/extract-mcq", "/extract-mcq-enhanced"):
+            response, latencies, memory = measure(
+                lambda: client.post(endpoint, files={"file": (filename, content)}), repeat
+            )
+            stages[endpoint] = summarize(latencies, size, memory)
+            stages[endpoint]["status"] = response.status_code
+
+    return {
+        "format": file_format,
+        "questions": size,
+        "noise": "noisy" if noisy else "clean",
+        "input_bytes": len(content),
+        "questions_found": len(mcqs) if mcqs is not None else None,
+        "stages": stages,
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark MCQ extraction on synthetic question banks")
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated question counts (10 to 50000)")
+    parser.add_argument("--formats", default="txt,docx,xlsx,pdf,png", help="comma-separated formats")
+    parser.add_argument("--noise", default="clean,noisy", help="clean, noisy or both")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help="comma-separated stages after extract_text: parse_mcqs, extract_mcqs, api")
+    parser.add_argument("--no-api", action="store_true", help="skip the in-process FastAPI requests")
+    parser.add_argument("--answer-keys", action="store_true",
+                        help="also time answer-key extraction on adversarial inputs of --sizes lines")
+    parser.add_argument("--json", dest="json_path", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    formats = [name.strip() for name in args.formats.split(",") if name.strip()]
+    noise_modes = [mode.strip() == "noisy" for mode in args.noise.split(",") if mode.strip()]
+    stages_to_run = {stage.strip() for stage in args.stages.split(",") if stage.strip()}
+    if args.no_api:
+        stages_to_run.discard("api")
+
+    if "png" in formats and not tesseract_available():
+        print("Tesseract not found: skipping PNG cases")
+        formats.remove("png")
+
+    client = None
+    if "api" in stages_to_run:
+        from fastapi.testclient import TestClient
+        client = TestClient(main.app)
+
+    # A fresh extractor so learned parsing profiles from earlier runs do not skew the numbers
+    extractor = main.MCQExtractor()
+    results = []
+    for file_format in formats:
+        for size in sizes:
+            # Image OCR is page-sized; larger banks do not change the work done
+            if file_format == "png" and size > 60:
+                continue
+            for noisy in noise_modes:
+                case = benchmark_case(extractor, client, file_format, size, noisy, args.repeat, stages_to_run)
+                results.append(case)
+                print(f"{file_format:>4} {size:>6} {case['noise']:>5}  found {case['questions_found'] if case['questions_found'] is not None else '-':>6}")
+                for stage, stats in case["stages"].items():
+                    print(f"      {stage:<22} p50 {stats['p50_ms']:>10.2f} ms  p95 {stats['p95_ms']:>10.2f} ms  "
+                          f"p99 {stats['p99_ms']:>10.2f} ms  {stats['questions_per_sec'] or 0:>10.1f} q/s  "
+                          f"peak {stats['peak_traced_mb']:>8.2f} MB  transient {stats['transient_mb']:>8.2f} MB")
+
+    answer_key_results = benchmark_answer_keys(extractor, sizes, args.repeat) if args.answer_keys else []
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": results,
+                       "answer_keys": answer_key_results}, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main_cli()
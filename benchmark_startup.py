@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the API module.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and reports
+the total import time, peak RSS and the slowest imports. Use --preload to
+measure a worker that warms up backends at startup, and --json to save the
+results for comparison across commits.
+
+    python benchmark_startup.py --runs 5
+    python benchmark_startup.py --preload pdf,ocr --json startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_once(preload):
+    """Import main in a fresh interpreter and return (importtime rows, max RSS in KB)"""
+    code = "import main"
+    if preload:
+        code += f"; main.preload_backends({preload!r})"
+    code += "; import resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=HERE, capture_output=True, text=True, check=True
+    )
+
+    rows = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+
+    max_rss_kb = int(result.stdout.strip().splitlines()[-1])
+    return rows, max_rss_kb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import cost of main.py")
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to start")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    parser.add_argument("--preload", default="", help="comma-separated backends to preload (pdf,docx,xlsx,ocr)")
+    parser.add_argument("--json", dest="json_path", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    preload = [b.strip() for b in args.preload.split(",") if b.strip()]
+
+    totals_ms = []
+    rss_kb = []
+    slowest = {}
+    for _ in range(args.runs):
+        rows, max_rss_kb = run_once(preload)
+        # Top-level imports (no leading indentation) add up to the total import time
+        totals_ms.append(sum(cum for name, _, cum in rows if not name.startswith("  ")) / 1000)
+        rss_kb.append(max_rss_kb)
+        for name, _, cumulative_us in rows:
+            module = name.strip()
+            slowest[module] = max(slowest.get(module, 0), cumulative_us)
+
+    top = sorted(slowest.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    results = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "preload": preload,
+        "import_time_ms": {
+            "median": round(statistics.median(totals_ms), 1),
+            "min": round(min(totals_ms), 1),
+            "max": round(max(totals_ms), 1),
+        },
+        "max_rss_mb": round(statistics.median(rss_kb) / 1024, 1),
+        "slowest_imports_ms": {name: round(us / 1000, 1) for name, us in top},
+    }
+
+    print(f"Import time (median of {args.runs}): {results['import_time_ms']['median']} ms")
+    print(f"Peak RSS: {results['max_rss_mb']} MB")
+    print("Slowest imports (cumulative):")
+    for name, ms in results["slowest_imports_ms"].items():
+        print(f"  {ms:>9.1f} ms  {name}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
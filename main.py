@@ -1,35 +1,530 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Header, Depends, Request, Body
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from starlette.concurrency import run_in_threadpool
 import re
 import json
 import base64
 import io
 import os
-from typing import List, Dict, Any, Optional, Union, Tuple
-import fitz  # PyMuPDF
-import pytesseract
-from PIL import Image
-import numpy as np
-import cv2
-import sympy
-from sympy import latex, sympify, parse_expr
-import matplotlib.pyplot as plt
-from tabulate import tabulate
-import PyPDF2
-from docx import Document
-import openpyxl
-
-# Configure Tesseract path for Windows
-if os.name == 'nt':  # Windows
-    tesseract_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-    if os.path.exists(tesseract_path):
-        pytesseract.pytesseract.tesseract_cmd = tesseract_path
+import time
+import asyncio
+import logging
+import threading
+import random
+import hmac
+import importlib
+import importlib.util
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict, replace
+from typing import List, Dict, Any, Optional, Union, Tuple, Callable, Sequence, Iterable, BinaryIO
+import zipfile
+import struct
+import tempfile
+import csv
+import hashlib
+import bisect
+import unicodedata
+from collections import OrderedDict
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Format and OCR backends (PyMuPDF, PyPDF2, python-docx, openpyxl, Pillow, OpenCV, pytesseract)
+# are imported inside the methods that use them, so workers boot without loading them.
+# Backends can be loaded ahead of the first request by listing them in MCQ_PRELOAD_BACKENDS.
+OPTIONAL_BACKENDS = {
+    "pdf": ("fitz", "PyPDF2"),
+    "docx": ("docx",),
+    "xlsx": ("openpyxl",),
+    "ocr": ("PIL.Image", "numpy", "cv2", "pytesseract"),
+    "arrow": ("pyarrow", "pyarrow.parquet"),
+}
+
+def _import_pytesseract():
+    """Import pytesseract on first OCR use, configuring the Tesseract path on Windows"""
+    import pytesseract
+    if os.name == 'nt':  # Windows
+        tesseract_path = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+        if os.path.exists(tesseract_path):
+            pytesseract.pytesseract.tesseract_cmd = tesseract_path
+    return pytesseract
+
+def preload_backends(backends: List[str]) -> List[str]:
+    """Import the named backends now instead of on first use; returns the modules loaded"""
+    loaded = []
+    for backend in backends:
+        if backend not in OPTIONAL_BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}. Available backends: {', '.join(OPTIONAL_BACKENDS)}")
+        for module_name in OPTIONAL_BACKENDS[backend]:
+            if module_name == "pytesseract":
+                _import_pytesseract()
+            else:
+                importlib.import_module(module_name)
+            loaded.append(module_name)
+    return loaded
+
+@asynccontextmanager
+async def lifespan(app):
+    """Warm up the backends listed in MCQ_PRELOAD_BACKENDS (comma-separated, or "all")"""
+    preload = os.environ.get("MCQ_PRELOAD_BACKENDS", "").strip()
+    if preload:
+        if preload == "all":
+            # Optional extras such as pyarrow are preloaded only when installed
+            backends = [b for b, modules in OPTIONAL_BACKENDS.items() if importlib.util.find_spec(modules[0])]
+        else:
+            backends = [b.strip() for b in preload.split(',') if b.strip()]
+        preload_backends(backends)
+    yield
+    # Entries added since the last periodic save
+    if mcq_extractor._duplicates is not None:
+        mcq_extractor._duplicates.save()
+
+def _json_default(obj: Any) -> Any:
+    """Fallback for values orjson cannot serialize natively"""
+    if isinstance(obj, MCQ):
+        return obj.to_dict()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class MCQJSONResponse(JSONResponse):
+    """JSON response rendered directly with orjson, skipping jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_json_default)
+
+
+# Responses at or above this many bytes are gzip-compressed for clients that accept it
+GZIP_MINIMUM_SIZE = 1024
+
+# Per-MCQ field selections available through the `profile` query parameter (None keeps everything)
+MCQ_FIELD_PROFILES = {
+    "full": None,
+    "compact": frozenset({
+        "question_number", "question", "options", "correct_answer", "extraction_issues",
+        "missing_options", "page", "content_analysis", "has_math_content", "has_visual_content", "question_type",
+        "duplicates"
+    }),
+    "summary": frozenset({
+        "question_number", "question", "options", "correct_answer", "extraction_issues",
+        "missing_options", "page", "has_math_content", "has_visual_content", "question_type", "duplicates"
+    }),
+    "minimal": frozenset({"question_number", "question", "options", "correct_answer"}),
+}
+MCQ_FIELDS = MCQ_FIELD_PROFILES["compact"] | {"math_content", "visual_content"}
+
+# Upper bounds (seconds) of the stage latency histogram buckets exposed on /metrics
+STAGE_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Format of the document being processed, used to label stage timings
+_current_file_type: ContextVar[str] = ContextVar("mcq_file_type", default="unknown")
+# (stage, method, seconds) timings of the current request, collected only when Server-Timing is enabled
+_request_timings: ContextVar[Optional[List[Tuple[str, str, float]]]] = ContextVar("mcq_request_timings", default=None)
+
+# Seconds between client-disconnect checks while extraction runs in the thread pool
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class TimeBudget:
+    """Cooperative deadline for one request: page, row and line loops stop early once it expires or is cancelled"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.cancelled = False
+        self.exhausted = False  # a stage stopped early because of this budget
+        self.pages_processed = 0
+        self.pages_total: Optional[int] = None
+
+    def expired(self) -> bool:
+        return self.cancelled or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+# Budget of the current request (None outside requests or without a budget)
+_request_budget: ContextVar[Optional[TimeBudget]] = ContextVar("mcq_request_budget", default=None)
+
+
+def _budget_expired() -> bool:
+    """Checkpoint before a step of work: True once the current request's budget is used up or cancelled,
+    in which case the caller skips the step and the budget is marked exhausted"""
+    budget = _request_budget.get()
+    if budget is None or not budget.expired():
+        return False
+    budget.exhausted = True
+    return True
+
+
+def _budget_exhausted() -> bool:
+    """Whether a stage of the current request skipped work because of its budget (no check of the clock)"""
+    budget = _request_budget.get()
+    return budget is not None and budget.exhausted
+
+
+# Lines that open a numbered question ("12.", "3)", "Q4:", "Question 5."), counted to stop page loops early
+QUESTION_START_PATTERN = re.compile(r'^\s*(?:Q(?:uestion)?\s*[\.:]?\s*)?\d{1,4}\s*[\.\):]', re.MULTILINE | re.IGNORECASE)
+
+
+def parse_page_ranges(spec: str) -> List[Tuple[int, Optional[int]]]:
+    """Parse 1-based page ranges such as "1-3,5,8-" into (first, last) pairs; last is None for open ranges"""
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        match = re.fullmatch(r'(\d+)\s*(?:-\s*(\d*))?', part)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Invalid page range: {part}. Use e.g. 1-3,5,8-")
+        first = int(match.group(1))
+        if match.group(2) is None:
+            last = first
+        else:
+            last = int(match.group(2)) if match.group(2) else None
+        if last is not None and last < first:
+            raise ValueError(f"Invalid page range: {part}. Use e.g. 1-3,5,8-")
+        ranges.append((first, last))
+    if not ranges:
+        raise ValueError("No page ranges given")
+    return ranges
+
+
+class PageRangeError(ValueError):
+    """The requested page ranges select no page of the document, or the document has no pages"""
+
+
+class PageScan:
+    """Iterates the selected pages of a document (0-based), stopping early when the request's time budget
+    runs out or, with max_questions, once more question starts than that have been seen.
+    Raises PageRangeError when page_ranges lie entirely beyond the document."""
+
+    def __init__(self, page_count: int, page_ranges: Optional[List[Tuple[int, Optional[int]]]] = None,
+                 max_questions: Optional[int] = None):
+        if page_ranges is None:
+            self.indexes = list(range(page_count))
+        else:
+            selected = set()
+            for first, last in page_ranges:
+                selected.update(range(first - 1, min(last or page_count, page_count)))
+            if not selected:
+                ranges = ','.join(f"{first}-{last or ''}" if last != first else str(first) for first, last in page_ranges)
+                raise PageRangeError(
+                    f"Page range {ranges} is outside the document, which has {page_count} page{'s' if page_count != 1 else ''}"
+                )
+            self.indexes = sorted(selected)
+        self.max_questions = max_questions
+        self.questions_seen = 0
+
+    def __iter__(self):
+        budget = _request_budget.get()
+        if budget is not None:
+            budget.pages_total = len(self.indexes)
+            budget.pages_processed = 0
+        for index in self.indexes:
+            # One question start beyond the limit means the first max_questions are complete
+            if self.max_questions and self.questions_seen > self.max_questions:
+                return
+            if _budget_expired():
+                return
+            yield index
+            if budget is not None:
+                budget.pages_processed += 1
+
+    def count_questions(self, text: str):
+        if self.max_questions:
+            self.questions_seen += len(QUESTION_START_PATTERN.findall(text))
+
+
+class ExtractionMetrics:
+    """Process-wide stage latency histograms and fallback/failure counters in Prometheus text format"""
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._durations: Dict[Tuple[str, str, str], Dict[str, Any]] = {}  # (stage, file_type, method) -> histogram
+        self._fallbacks: Dict[Tuple[str, str, str], int] = {}  # (file_type, from_method, to_method) -> count
+        self._failures: Dict[Tuple[str, str, str], int] = {}  # (stage, file_type, method) -> count
+        self._partial: Dict[str, int] = {}  # reason -> count
+
+    def observe(self, stage: str, file_type: str, method: str, seconds: float):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._durations.get((stage, file_type, method))
+            if histogram is None:
+                histogram = self._durations[(stage, file_type, method)] = {
+                    "buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0
+                }
+            if bucket < len(self.buckets):
+                histogram["buckets"][bucket] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def count_fallback(self, from_method: str, to_method: str, file_type: Optional[str] = None, count: int = 1):
+        key = (file_type or _current_file_type.get(), from_method, to_method)
+        with self._lock:
+            self._fallbacks[key] = self._fallbacks.get(key, 0) + count
+
+    def count_failure(self, stage: str, method: str = "", file_type: Optional[str] = None):
+        key = (stage, file_type or _current_file_type.get(), method)
+        with self._lock:
+            self._failures[key] = self._failures.get(key, 0) + 1
+
+    def count_partial(self, reason: str):
+        with self._lock:
+            self._partial[reason] = self._partial.get(reason, 0) + 1
+
+    def render(self) -> str:
+        """Prometheus text exposition (version 0.0.4) of all metrics"""
+        lines = [
+            "# HELP mcq_stage_duration_seconds Time spent in each extraction stage",
+            "# TYPE mcq_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, file_type, method), histogram in sorted(self._durations.items()):
+                labels = f'stage="{stage}",file_type="{file_type}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    cumulative += count
+                    lines.append(f'mcq_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'mcq_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+                lines.append(f'mcq_stage_duration_seconds_sum{{{labels}}} {histogram["sum"]:.6f}')
+                lines.append(f'mcq_stage_duration_seconds_count{{{labels}}} {histogram["count"]}')
+            
+            lines.append("# HELP mcq_fallbacks_total Extraction fallbacks taken (e.g. PyMuPDF to PyPDF2 to OCR)")
+            lines.append("# TYPE mcq_fallbacks_total counter")
+            for (file_type, from_method, to_method), count in sorted(self._fallbacks.items()):
+                lines.append(f'mcq_fallbacks_total{{file_type="{file_type}",from_method="{from_method}",to_method="{to_method}"}} {count}')
+            
+            lines.append("# HELP mcq_stage_failures_total Extraction stages that raised an error")
+            lines.append("# TYPE mcq_stage_failures_total counter")
+            for (stage, file_type, method), count in sorted(self._failures.items()):
+                lines.append(f'mcq_stage_failures_total{{stage="{stage}",file_type="{file_type}",method="{method}"}} {count}')
+            
+            lines.append("# HELP mcq_partial_results_total Requests cut short by their time budget or a client disconnect")
+            lines.append("# TYPE mcq_partial_results_total counter")
+            for reason, count in sorted(self._partial.items()):
+                lines.append(f'mcq_partial_results_total{{reason="{reason}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = ExtractionMetrics()
+
+
+@contextmanager
+def stage_timer(stage: str, method: str = ""):
+    """Time a block as an extraction stage, labelled with the current file type"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe(stage, _current_file_type.get(), method, elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, method, elapsed))
+
+
+class ServerTimingMiddleware:
+    """Adds a Server-Timing header with the extraction stages timed during each request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        timings = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                entries = [f'{stage};desc="{method}";dur={seconds * 1000:.1f}' if method else f"{stage};dur={seconds * 1000:.1f}"
+                           for stage, method, seconds in timings]
+                entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                headers = list(message.get("headers", [])) + [(b"server-timing", ", ".join(entries).encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+
+class RequestProfiler:
+    """Opt-in cProfile capture of extraction requests, aggregated per function across requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.remaining = 0  # next N requests to profile
+        self.sample_rate = 0.0  # fraction of later requests to profile
+        self.profiled_requests = 0
+        self._stats = None  # pstats.Stats summed over the profiled requests
+        self._active = False
+        # arm()/disarm() calls so far, so a slot is only given back to the arming it was taken from
+        self._generation = 0
+        self._refund_generation = None
+
+    @property
+    def armed(self) -> bool:
+        return self.remaining > 0 or self.sample_rate > 0
+
+    def arm(self, requests: int = 0, sample_rate: float = 0.0, reset: bool = True):
+        with self._lock:
+            self.remaining = requests
+            self.sample_rate = sample_rate
+            self._generation += 1
+            if reset:
+                self._stats = None
+                self.profiled_requests = 0
+
+    def disarm(self):
+        with self._lock:
+            self.remaining = 0
+            self.sample_rate = 0.0
+            self._generation += 1
+
+    def claim(self) -> bool:
+        """Decide whether to profile the next request; one request is profiled at a time"""
+        with self._lock:
+            if self._active or not self.armed:
+                return False
+            self._refund_generation = self._generation if self.remaining > 0 else None
+            if self.remaining > 0:
+                self.remaining -= 1
+            elif random.random() >= self.sample_rate:
+                return False
+            self._active = True
+            return True
+
+    def record(self, profile):
+        """Add a claimed request's profile. Requests that failed before any profiled work ran
+        (e.g. a 400 or 422 on their parameters) are skipped and give their slot back."""
+        import pstats
+        
+        with self._lock:
+            self._active = False
+            if profile is None or not profile.getstats():
+                if self._refund_generation == self._generation:
+                    self.remaining += 1
+                return
+            if self._stats is None:
+                self._stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                self._stats.add(profile)
+            self.profiled_requests += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "armed": self.armed,
+            "remaining_requests": self.remaining,
+            "sample_rate": self.sample_rate,
+            "profiled_requests": self.profiled_requests,
+        }
+
+    def report(self, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+        """Top functions as pstats text, or None before any request was profiled"""
+        with self._lock:
+            if self._stats is None:
+                return None
+            stream = io.StringIO()
+            self._stats.stream = stream
+            self._stats.sort_stats(sort).print_stats(limit)
+            return stream.getvalue()
+
+    def dump(self) -> Optional[bytes]:
+        """Aggregated stats in the binary format written by pstats.Stats.dump_stats (snakeviz, flameprof, gprof2dot)"""
+        import marshal
+        
+        with self._lock:
+            if self._stats is None:
+                return None
+            return marshal.dumps(self._stats.stats)
+
+
+request_profiler = RequestProfiler()
+
+
+# cProfile collector of the current request when the request profiler claimed it
+_request_profile: ContextVar[Any] = ContextVar("mcq_request_profile", default=None)
+
+
+class ProfilingMiddleware:
+    """Profiles claimed /extract-* and /parse-text requests while the request profiler is armed"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not request_profiler.armed
+                or not scope["path"].startswith(("/extract", "/parse-text")) or not request_profiler.claim()):
+            await self.app(scope, receive, send)
+            return
+        
+        import cProfile
+        
+        # The profile is enabled around the blocking work in the worker thread (see _call_profiled)
+        profile = cProfile.Profile()
+        token = _request_profile.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_profile.reset(token)
+            request_profiler.record(profile)
+
+
+def _call_profiled(function: Callable, *args):
+    """Call function, under the request's cProfile collector when profiling claimed the request"""
+    profile = _request_profile.get()
+    if profile is None:
+        return function(*args)
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is already attached
+        return function(*args)
+    try:
+        return function(*args)
+    finally:
+        profile.disable()
+
+
+async def _run_with_budget(request: Request, budget: TimeBudget, function: Callable, *args):
+    """Run blocking extraction work in the thread pool under the request's time budget,
+    cancelling it cooperatively when the client disconnects"""
+    token = _request_budget.set(budget)
+    try:
+        # The worker thread runs in a copy of this context, budget included
+        task = asyncio.ensure_future(run_in_threadpool(_call_profiled, function, *args))
+    finally:
+        _request_budget.reset(token)
+    
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if not budget.cancelled and await request.is_disconnected():
+            budget.cancel()
+
 
 app = FastAPI(
     title="MCQ Extractor API",
     description="API to extract Multiple Choice Questions from uploaded files with enhanced mathematical and visual content analysis",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=MCQJSONResponse,
+    lifespan=lifespan
 )
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+if os.environ.get("MCQ_SERVER_TIMING", "").strip().lower() in ("1", "true", "yes"):
+    app.add_middleware(ServerTimingMiddleware)
+# Admin endpoints (and the profiling hook) exist only when MCQ_ADMIN_TOKEN is set
+if os.environ.get("MCQ_ADMIN_TOKEN"):
+    app.add_middleware(ProfilingMiddleware)
 
 @app.get("/")
 async def root():
@@ -39,6 +534,1018 @@ async def root():
 async def health():
     return {"status": "ok"}
 
+@dataclass(slots=True)
+class MCQ:
+    """Single extracted question, mutated in place through the pipeline and serialized once in the response"""
+    question_number: int
+    question: str
+    options: Dict[str, str]
+    correct_answer: Optional[str] = None
+    extraction_issues: List[str] = field(default_factory=list)
+    missing_options: Optional[List[str]] = None
+    math_content: Optional[Dict[str, Any]] = None
+    visual_content: Optional[Dict[str, Any]] = None
+    question_type: Optional[str] = None
+    page: Optional[int] = None
+    duplicates: Optional[List[int]] = None
+
+    @property
+    def has_math_content(self) -> bool:
+        return bool(self.math_content and self.math_content['has_math'])
+
+    @property
+    def has_visual_content(self) -> bool:
+        return bool(self.visual_content and self.visual_content['has_visual_content'])
+
+    # Read-only mapping access so scripts written against the old dict MCQs keep working
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def to_dict(self, fields: Optional[frozenset] = None) -> Dict[str, Any]:
+        """Build the response representation, optionally restricted to the given top-level fields"""
+        data = {
+            "question_number": self.question_number,
+            "question": self.question,
+            "options": self.options,
+            "correct_answer": self.correct_answer,
+        }
+        if self.extraction_issues:
+            data["extraction_issues"] = self.extraction_issues
+        if self.missing_options is not None:
+            data["missing_options"] = self.missing_options
+        if self.page is not None:
+            data["page"] = self.page
+        if self.math_content is not None or self.visual_content is not None:
+            data["content_analysis"] = {
+                "mathematics": self.math_content,
+                "visual_elements": self.visual_content
+            }
+            # Same objects as content_analysis, kept for clients of the original response shape
+            data["math_content"] = self.math_content
+            data["visual_content"] = self.visual_content
+            data["has_math_content"] = self.has_math_content
+            data["has_visual_content"] = self.has_visual_content
+        if self.question_type is not None:
+            data["question_type"] = self.question_type
+        if self.duplicates:
+            data["duplicates"] = self.duplicates
+        if fields is not None:
+            return {key: value for key, value in data.items() if key in fields}
+        return data
+
+# Magic-byte signatures used to detect the real format of an upload
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # Legacy .xls / .doc
+IMAGE_SIGNATURES = (
+    b'\x89PNG\r\n\x1a\n',  # PNG
+    b'\xff\xd8\xff',  # JPEG
+    b'II*\x00',  # TIFF (little-endian)
+    b'MM\x00*',  # TIFF (big-endian)
+    b'GIF87a', b'GIF89a',  # GIF
+)
+
+# Sizes of the DIB headers a BMP can carry (BITMAPCOREHEADER through BITMAPV5HEADER)
+BMP_DIB_HEADER_SIZES = frozenset({12, 16, 40, 52, 56, 64, 108, 124})
+
+def _is_webp(content: bytes) -> bool:
+    return content[:4] == b'RIFF' and content[8:12] == b'WEBP'
+
+def _is_bmp(content: bytes) -> bool:
+    """Check the BMP file-size and DIB header fields, not just the 'BM' magic that plain text can also start with"""
+    if len(content) < 26 or not content.startswith(b'BM'):
+        return False
+    file_size, dib_size = struct.unpack_from('<I', content, 2)[0], struct.unpack_from('<I', content, 14)[0]
+    return dib_size in BMP_DIB_HEADER_SIZES and 14 + dib_size <= file_size <= len(content)
+
+def _zip_contains(content: bytes, member: str) -> bool:
+    """Check whether an OOXML (zip) upload contains the given part"""
+    if not content.startswith(b'PK\x03\x04'):
+        return False
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            return member in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+def _looks_like_text(content: bytes) -> bool:
+    """Heuristic for plain text: no NUL bytes and almost no control characters in the first 4 KB"""
+    head = content[:4096]
+    if not head or b'\x00' in head:
+        return False
+    control = sum(1 for byte in head if byte < 32 and byte not in (9, 10, 12, 13))
+    return control / len(head) < 0.05
+
+
+@dataclass(frozen=True)
+class ExtractorSpec:
+    """Text extractor for one file format: how to recognise it, which MCQExtractor method reads it,
+    its relative cost (1 = cheap, 10 = OCR) and what it can do"""
+    name: str
+    method: str
+    mime_type: str
+    extensions: Tuple[str, ...]
+    sniff: Callable[[bytes], bool]
+    cost: int
+    capabilities: frozenset
+    backends: Tuple[str, ...] = ()
+    # Optional MCQExtractor method that builds MCQs directly from structured content, returning None to fall back to text
+    structured_method: Optional[str] = None
+
+
+# Registered extractors, checked in registration order when sniffing content
+EXTRACTOR_REGISTRY: Dict[str, ExtractorSpec] = {}
+
+def register_extractor(spec: ExtractorSpec) -> ExtractorSpec:
+    """Add (or replace) a format in the extractor registry"""
+    EXTRACTOR_REGISTRY[spec.name] = spec
+    return spec
+
+register_extractor(ExtractorSpec(
+    name="pdf", method="extract_text_from_pdf", mime_type="application/pdf", extensions=("pdf",),
+    sniff=lambda content: b'%PDF-' in content[:1024],
+    cost=5, capabilities=frozenset({"text", "layout", "ocr_fallback", "pages"}), backends=("pdf", "ocr"),
+    structured_method="extract_mcqs_from_pdf"
+))
+register_extractor(ExtractorSpec(
+    name="image", method="extract_text_from_image", mime_type="image/*",
+    extensions=("jpg", "jpeg", "png", "bmp", "tiff", "tif", "gif", "webp"),
+    sniff=lambda content: content.startswith(IMAGE_SIGNATURES) or _is_webp(content) or _is_bmp(content),
+    cost=10, capabilities=frozenset({"ocr", "pages"}), backends=("ocr",)
+))
+register_extractor(ExtractorSpec(
+    name="docx", method="extract_text_from_docx",
+    mime_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document", extensions=("docx",),
+    sniff=lambda content: _zip_contains(content, "word/document.xml"),
+    cost=2, capabilities=frozenset({"text", "structured"}), backends=("docx",),
+    structured_method="extract_mcqs_from_docx"
+))
+register_extractor(ExtractorSpec(
+    name="xlsx", method="extract_text_from_xlsx",
+    mime_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", extensions=("xlsx",),
+    sniff=lambda content: _zip_contains(content, "xl/workbook.xml"),
+    cost=2, capabilities=frozenset({"text", "structured"}), backends=("xlsx",),
+    structured_method="extract_mcqs_from_xlsx"
+))
+register_extractor(ExtractorSpec(
+    name="txt", method="extract_text_from_txt", mime_type="text/plain", extensions=("txt",),
+    sniff=_looks_like_text,
+    cost=1, capabilities=frozenset({"text"})
+))
+
+def detect_file_format(content: bytes, filename: Optional[str] = None) -> ExtractorSpec:
+    """Pick the extractor for an upload from its content, using the extension only as a fallback"""
+    if content.startswith(OLE2_SIGNATURE):
+        raise ValueError("Legacy binary Office files (.xls/.doc) are not supported. Please save the file as .xlsx or .docx")
+    
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    text_spec = EXTRACTOR_REGISTRY.get("txt")
+    for spec in EXTRACTOR_REGISTRY.values():
+        if spec.sniff(content):
+            # A short printable image signature (e.g. "GIF89a") can open a text file; trust a text extension then
+            if spec.name == "image" and text_spec and extension in text_spec.extensions and _looks_like_text(content):
+                return text_spec
+            return spec
+    
+    for spec in EXTRACTOR_REGISTRY.values():
+        if extension in spec.extensions:
+            return spec
+    
+    raise ValueError(f"Unsupported file type: {extension or 'unknown'}")
+
+def _file_type_label(spec: ExtractorSpec, filename: Optional[str]) -> str:
+    """Report the upload's extension when it agrees with the detected format, otherwise the format name"""
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    return (extension if extension in spec.extensions else spec.name).upper()
+
+
+class PageText(str):
+    """Extracted text that also records the (label, start, end) offsets of each page or sheet in it"""
+    pages: Tuple[Tuple[str, int, int], ...] = ()
+    # Offset of each page's first line after its marker
+    body_starts: Tuple[int, ...] = ()
+    # Whether each page was already passed through MCQExtractor._preprocess_text
+    preprocessed: bool = False
+
+    def page_text(self, index: int) -> str:
+        _, start, end = self.pages[index]
+        return self[start:end]
+
+    def page_body(self, index: int) -> str:
+        """A page's text without its marker line"""
+        return self[self.body_starts[index]:self.pages[index][2]]
+
+
+class PageBuffer:
+    """Collects extracted lines page by page and joins them once, recording each page's offsets"""
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._size = 0
+        self._pages: List[List[Any]] = []  # [label, start, end]
+        self._body_starts: List[int] = []
+        self.preprocessed = False
+
+    def start_page(self, label: str, header: Optional[str] = None):
+        """Begin a page (or sheet); its span includes the optional marker line"""
+        self._close_page()
+        self._pages.append([label, self._size, self._size])
+        if header is not None:
+            self.add_line(header)
+        self._body_starts.append(self._size)
+
+    def add_line(self, line: str):
+        self._parts.append(line)
+        self._parts.append("\n")
+        self._size += len(line) + 1
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def _close_page(self):
+        if self._pages:
+            self._pages[-1][2] = self._size
+
+    def getvalue(self) -> PageText:
+        self._close_page()
+        text = PageText("".join(self._parts))
+        text.pages = tuple((label, start, end) for label, start, end in self._pages)
+        text.body_starts = tuple(self._body_starts)
+        text.preprocessed = self.preprocessed
+        return text
+
+
+# "--- Page N ---" marker lines written in front of each PDF page (see _add_pdf_page)
+PAGE_MARKER_PATTERN = re.compile(r'^---\s*Page\s+(\d+)\b.*---$')
+# Numbered question starts ("12. ") used to locate a question's line when matching answers
+QUESTION_NUMBER_PATTERN = re.compile(r'\b(\d+)\.\s')
+# Answer-key section header at the start of a line, with any entries that follow it on the same line
+ANSWER_KEY_HEADER_PATTERN = re.compile(r'^\s*(?:answer\s*(?:key|sheet)|(?:correct\s*)?answers)\b\s*[:\-]?(.*)$', re.IGNORECASE)
+# One answer-key entry: "1-A", "2. c", "Q3: B", "4 (D)", "5 | A"
+ANSWER_KEY_ENTRY_PATTERN = re.compile(r'(?<!\w)(?:Q\s*)?(\d+)\s*[\.\):=|\-]?\s*\(?([A-Da-d])\)?(?!\w)')
+# Column labels allowed inside an answer-key table ("Q.No | Answer")
+ANSWER_KEY_LABEL_WORDS = frozenset({'q', 'qn', 'question', 'questions', 'no', 'number', 'sn', 's', 'answer', 'answers', 'ans', 'key', 'correct', 'option'})
+
+
+class DocumentIndex:
+    """Line and page map of a document's (preprocessed) text, built once per document and shared by
+    parsing, answer matching and content analysis. Page numbers come from PageText offsets; plain
+    text (e.g. posted to /parse-text) falls back to its "--- Page N ---" marker lines.
+    questions_only marks the text of MCQs built by a structured reader, which is not the whole document."""
+
+    __slots__ = ("text", "lines", "line_offsets", "content_line_numbers", "content_lines", "questions_only",
+                 "_page_starts", "_page_numbers", "_cleaner", "_cleaned_lines", "_question_lines")
+
+    def __init__(self, text: str, cleaner: Optional[Callable[[str], str]] = None, questions_only: bool = False):
+        self.text = text
+        self.questions_only = questions_only
+        self.lines = tuple(text.split('\n'))
+        
+        offsets = []
+        content_line_numbers = []
+        content_lines = []
+        page_starts = []
+        page_numbers = []
+        pages = text.pages if isinstance(text, PageText) else ()
+        position = 0
+        for line_number, line in enumerate(self.lines):
+            offsets.append(position)
+            position += len(line) + 1
+            stripped = line.strip()
+            if not stripped:
+                continue
+            content_line_numbers.append(line_number)
+            content_lines.append(stripped)
+            if not pages and stripped.startswith('---'):
+                marker = PAGE_MARKER_PATTERN.match(stripped)
+                if marker:
+                    page_starts.append(line_number)
+                    page_numbers.append(int(marker.group(1)))
+        
+        self.line_offsets = tuple(offsets)
+        for label, start, _ in pages:
+            # Sheets are labelled by name and have no page number
+            page_starts.append(self.line_at(start))
+            page_numbers.append(int(label) if label.isdigit() else None)
+        # Non-blank lines, stripped, with their positions in `lines`
+        self.content_line_numbers = tuple(content_line_numbers)
+        self.content_lines = tuple(content_lines)
+        self._page_starts = page_starts
+        self._page_numbers = page_numbers
+        self._cleaner = cleaner
+        self._cleaned_lines = None
+        self._question_lines = None
+
+    @property
+    def cleaned_lines(self) -> Tuple[str, ...]:
+        """content_lines passed through the cleaner, computed on first use"""
+        if self._cleaned_lines is None:
+            cleaner = self._cleaner or (lambda line: line)
+            self._cleaned_lines = tuple(cleaner(line) for line in self.content_lines)
+        return self._cleaned_lines
+
+    def line_at(self, offset: int) -> int:
+        """Index of the line containing a character offset"""
+        return bisect.bisect_right(self.line_offsets, offset) - 1
+
+    def page_of_line(self, line_number: int) -> Optional[int]:
+        """Page number of a line, or None when the text has no page markers before it"""
+        position = bisect.bisect_right(self._page_starts, line_number) - 1
+        return self._page_numbers[position] if position >= 0 else None
+
+    def question_line(self, question_number: int) -> Optional[int]:
+        """First line containing "<question_number>. ", from a map built on first use"""
+        if self._question_lines is None:
+            self._question_lines = {}
+            for line_number, line in enumerate(self.lines):
+                for number in QUESTION_NUMBER_PATTERN.findall(line):
+                    self._question_lines.setdefault(int(number), line_number)
+        return self._question_lines.get(question_number)
+
+
+# Narrowest empty vertical band (in points) treated as a gutter between text columns
+MIN_COLUMN_GUTTER = 10
+# Number of document templates whose column geometry is remembered
+COLUMN_LAYOUT_CACHE_SIZE = 128
+
+@dataclass(slots=True)
+class LayoutLine:
+    """One line of positioned PDF text used by the layout-aware segmenter"""
+    page: int
+    x0: float
+    x1: float
+    y0: float
+    text: str
+    bold: bool
+    span_starts: List[Tuple[float, str]]
+
+
+# Digits and letters OCR reads for option labels in place of the letter they resemble
+OCR_OPTION_LABEL_MISREADS = {'8': 'B', 'G': 'C', '6': 'C', 'O': 'D', '0': 'D'}
+# OCR words below this confidence (0-100) send their line back for a second, closer read
+OCR_RECHECK_CONFIDENCE = 60
+# Option labels ("A)", "(b", "C.") are short and decide the parse, so they are rechecked below a higher confidence
+OCR_LABEL_CONFIDENCE = 85
+# Upscaling, padding (pixels) and page limit for rechecked lines
+OCR_RECHECK_SCALE = 2
+OCR_RECHECK_PADDING = 4
+OCR_MAX_RECHECK_LINES = 40
+# The upscaled rechecked lines may cover at most this share of the page's area, which keeps the
+# recheck cheaper than a second full pass when most of a poor scan is uncertain
+OCR_RECHECK_MAX_AREA = 0.25
+# White space (pixels) between the rechecked line regions stacked into one image
+OCR_RECHECK_GAP = 24
+# Leading word of a line that is an option or question label ("B)", "(c)", "d.", "12."), possibly fused with its text
+OCR_LABEL_PATTERN = re.compile(r'^\(?(?:[A-Da-d]|\d{1,3})[\.\)]')
+
+# Long side (pixels) that uploaded photos are decoded down to before OCR; about 170 DPI for a full A4 page
+OCR_IMAGE_TARGET_SIDE = 2000
+# ...without taking the short side below this, so tall narrow screenshots keep their text size
+OCR_IMAGE_MIN_SHORT_SIDE = 1500
+# Scanned pages are OCR'd from their embedded images when the images cover this share of the page
+OCR_EMBEDDED_MIN_COVERAGE = 0.5
+# ...and are at least as sharp as the 2x page render (144 DPI); smaller images (logos, bullets) are skipped
+OCR_EMBEDDED_MIN_DPI = 144
+OCR_EMBEDDED_MIN_PIXELS = 32
+
+@dataclass(slots=True)
+class OCRLine:
+    """One line of Tesseract word output with its per-word confidences and bounding box in pixels"""
+    paragraph: Tuple[int, int]
+    words: List[str]
+    confidences: List[float]
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+    @property
+    def confidence(self) -> float:
+        return sum(self.confidences) / len(self.confidences)
+
+
+@dataclass(slots=True)
+class PatternSet:
+    """Question/option patterns (with their index in the full lists) used for one parse,
+    recording which of them matched"""
+    question: List[Tuple[int, str]]
+    option: List[Tuple[int, str]]
+    matched_question: set = field(default_factory=set)
+    matched_option: set = field(default_factory=set)
+
+
+@dataclass
+class ParsingProfile:
+    """What worked for one document template: the question/option patterns that matched and
+    whether layout-aware segmentation succeeded"""
+    fingerprint: str
+    question_patterns: List[int] = field(default_factory=list)
+    option_patterns: List[int] = field(default_factory=list)
+    structured: Optional[bool] = None
+    documents: int = 0
+
+
+class ParsingProfileStore:
+    """Parsing profiles keyed by document fingerprint, persisted as JSON when a path is given.
+    Safe to share between the threads that run extractions."""
+
+    def __init__(self, path: Optional[str] = None, max_profiles: int = 1000):
+        self.path = path
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, ParsingProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    for data in orjson.loads(f.read()):
+                        profile = ParsingProfile(**data)
+                        self._profiles[profile.fingerprint] = profile
+            except Exception as e:
+                logger.warning("Could not load parsing profiles from %s: %s", path, e)
+
+    def get(self, fingerprint: Optional[str]) -> Optional[ParsingProfile]:
+        if fingerprint is None:
+            return None
+        with self._lock:
+            return self._get(fingerprint)
+
+    def _get(self, fingerprint: str) -> Optional[ParsingProfile]:
+        profile = self._profiles.get(fingerprint)
+        if profile is not None:
+            self._profiles.move_to_end(fingerprint)
+        return profile
+
+    def _get_or_create(self, fingerprint: str) -> ParsingProfile:
+        profile = self._get(fingerprint)
+        if profile is None:
+            profile = self._profiles[fingerprint] = ParsingProfile(fingerprint)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def learn_patterns(self, fingerprint: str, patterns: PatternSet):
+        """Remember the patterns that matched in a successful full parse"""
+        with self._lock:
+            profile = self._get_or_create(fingerprint)
+            profile.question_patterns = sorted(patterns.matched_question)
+            profile.option_patterns = sorted(patterns.matched_option)
+            profile.documents += 1
+            self._save()
+
+    def record_structured(self, fingerprint: str, succeeded: bool):
+        """Remember whether layout-aware segmentation worked for this template"""
+        with self._lock:
+            profile = self._get_or_create(fingerprint)
+            if profile.structured != succeeded:
+                profile.structured = succeeded
+                self._save()
+
+    def record_hit(self, fingerprint: str):
+        with self._lock:
+            profile = self._get(fingerprint)
+            if profile is not None:
+                profile.documents += 1
+
+    def _save(self):
+        """Write the profiles through a temporary file of their own; called with the lock held"""
+        if not self.path:
+            return
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                'wb', dir=os.path.dirname(self.path) or '.', prefix=f"{os.path.basename(self.path)}.",
+                suffix='.tmp', delete=False
+            ) as f:
+                temp_path = f.name
+                f.write(orjson.dumps([asdict(profile) for profile in self._profiles.values()]))
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save parsing profiles to %s: %s", self.path, e)
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+# MinHash signature length, split into LSH bands of DUPLICATE_NUM_PERM // DUPLICATE_BANDS rows.
+# 16 bands of 8 rows make pairs above ~0.7 Jaccard similarity likely to share a band.
+DUPLICATE_NUM_PERM = 128
+DUPLICATE_BANDS = 16
+# Estimated Jaccard similarity of character shingles at which two questions count as near-duplicates
+DUPLICATE_THRESHOLD = 0.8
+DUPLICATE_SHINGLE_SIZE = 5
+# New entries kept in memory before the index is rewritten to disk
+DUPLICATE_INDEX_SAVE_EVERY = 1000
+# Without MCQ_DUPLICATE_INDEX_PATH the index lives only in memory, and stops taking new entries at this size
+DUPLICATE_INDEX_MAX_MEMORY_ENTRIES = 100_000
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive lock on path across processes (flock on POSIX, msvcrt on Windows)"""
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        f = open(path, 'a+b')
+    except OSError as e:
+        logger.warning("Could not open lock file %s, continuing unlocked: %s", path, e)
+        yield
+        return
+    with f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class DuplicateIndex:
+    """MinHash/LSH index of normalized question + option text, used to tag near-duplicate MCQs across uploads.
+
+    Signatures and per-band sorted LSH keys are saved as .npy files in a directory and memory-mapped on first use,
+    so lookups are binary searches over the saved bands plus a dict of entries added since the last save.
+    Those entries are also appended to pending.jsonl under a file lock, and every process reads the other
+    processes' appends before a lookup, so uvicorn workers sharing the directory agree on entry ids."""
+
+    def __init__(self, path: Optional[str] = None):
+        import numpy as np
+        
+        self.path = path
+        self._lock = threading.Lock()
+        rng = np.random.default_rng(1)
+        # Fixed seed: signatures must stay comparable across restarts
+        self._a = rng.integers(1, 1 << 32, DUPLICATE_NUM_PERM, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, DUPLICATE_NUM_PERM, dtype=np.uint64)
+        rows = DUPLICATE_NUM_PERM // DUPLICATE_BANDS
+        self._band_mix = rng.integers(1, 1 << 63, rows, dtype=np.uint64) | np.uint64(1)
+        
+        self._signatures = np.empty((0, DUPLICATE_NUM_PERM), dtype=np.uint32)
+        self._band_keys = np.empty((DUPLICATE_BANDS, 0), dtype=np.uint64)
+        self._band_ids = np.empty((DUPLICATE_BANDS, 0), dtype=np.uint32)
+        self._entries: List[Dict[str, Any]] = []
+        # SHA-256 of every document with indexed questions
+        self._documents = set()
+        self._clear_new()
+        # entries.json as last loaded (mtime, size, inode) and how far pending.jsonl has been read
+        self._saved_stamp: Optional[Tuple[int, int, int]] = None
+        self._pending_offset = 0
+        self._full_logged = False
+
+    def __len__(self) -> int:
+        with self._locked():
+            return len(self._entries)
+
+    def _clear_new(self):
+        import numpy as np
+        
+        # Entries added since the last save: signatures in a buffer grown by doubling, and their LSH buckets
+        self._new_signatures = np.empty((64, DUPLICATE_NUM_PERM), dtype=np.uint32)
+        self._new_count = 0
+        self._new_buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread lock and, for a persisted index, the directory's file lock, caught up with
+        saves and appends made by other processes"""
+        with self._lock, (_file_lock(os.path.join(self.path, "index.lock")) if self.path else nullcontext()):
+            if self.path:
+                self._sync()
+            yield
+
+    def _stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.path, "entries.json"))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _sync(self):
+        stamp = self._stamp()
+        if stamp != self._saved_stamp:
+            self._saved_stamp = stamp
+            self._load()
+        self._read_pending()
+
+    def _load(self):
+        import numpy as np
+        
+        self._entries = []
+        self._documents = set()
+        self._signatures = np.empty((0, DUPLICATE_NUM_PERM), dtype=np.uint32)
+        self._band_keys = np.empty((DUPLICATE_BANDS, 0), dtype=np.uint64)
+        self._band_ids = np.empty((DUPLICATE_BANDS, 0), dtype=np.uint32)
+        self._clear_new()
+        self._pending_offset = 0
+        try:
+            if not os.path.exists(os.path.join(self.path, "entries.json")):
+                return
+            with open(os.path.join(self.path, "entries.json"), 'rb') as f:
+                entries = orjson.loads(f.read())
+            signatures = np.load(os.path.join(self.path, "signatures.npy"), mmap_mode='r')
+            band_keys = np.load(os.path.join(self.path, "band_keys.npy"), mmap_mode='r')
+            band_ids = np.load(os.path.join(self.path, "band_ids.npy"), mmap_mode='r')
+            if not (len(entries) == signatures.shape[0] == band_keys.shape[1] == band_ids.shape[1]):
+                raise ValueError("index files are out of step")
+        except Exception as e:
+            logger.warning("Could not load duplicate index from %s: %s", self.path, e)
+            return
+        self._entries, self._signatures, self._band_keys, self._band_ids = entries, signatures, band_keys, band_ids
+        self._documents = {entry["document"] for entry in entries if entry.get("document")}
+
+    def _read_pending(self):
+        """Add the entries other processes appended to pending.jsonl since it was last read"""
+        import numpy as np
+        
+        pending_path = os.path.join(self.path, "pending.jsonl")
+        try:
+            with open(pending_path, 'rb') as f:
+                f.seek(self._pending_offset)
+                data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                # A process died mid-append; drop the torn line so later appends stay line-aligned
+                os.truncate(pending_path, self._pending_offset + end)
+        except OSError:
+            return
+        for line in data[:end].splitlines():
+            record = orjson.loads(line)
+            # Entries already in entries.json, if a save stopped before clearing pending.jsonl
+            if record.pop("id") < len(self._entries):
+                continue
+            self._add(np.frombuffer(bytes.fromhex(record.pop("signature")), dtype=np.uint32), record)
+        self._pending_offset += end
+
+    def signature(self, question: str, options: Dict[str, str]):
+        """MinHash signature of a question and its options (order-insensitive), or None for empty text"""
+        import numpy as np
+        
+        text = (question + " | " + " ".join(sorted(options.values()))).casefold()
+        if text.isascii():
+            text = re.sub(r'[\W_]+', ' ', text)
+        else:
+            # \w leaves out combining marks such as Devanagari vowel signs, which belong to their word
+            text = ''.join(c if c.isalnum() or unicodedata.category(c)[0] == 'M' else ' ' for c in text)
+        text = ' '.join(text.split())
+        if not text:
+            return None
+        # Shingles of code points weighted by powers of 256, which is the old byte packing for ASCII text
+        # (saved indexes stay valid); wider code points fit in 53 bits and only collide across scripts
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        size = min(DUPLICATE_SHINGLE_SIZE, len(codes))
+        windows = np.lib.stride_tricks.sliding_window_view(codes, size)
+        shingles = np.unique(windows @ (np.uint64(256) ** np.arange(size, dtype=np.uint64)))
+        # Fold to 32 bits (Fibonacci hashing) so the permutations below stay within 64-bit arithmetic
+        hashes = (shingles * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+        permuted = (np.outer(hashes, self._a) + self._b) % np.uint64(_MERSENNE_PRIME)
+        return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    def _keys(self, signatures):
+        """LSH key of every band: (bands, n) uint64 for an (n, num_perm) signature array"""
+        import numpy as np
+        
+        rows = DUPLICATE_NUM_PERM // DUPLICATE_BANDS
+        bands = signatures.astype(np.uint64).reshape(len(signatures), DUPLICATE_BANDS, rows)
+        return (bands * self._band_mix).sum(axis=2, dtype=np.uint64).T
+
+    def _similarities(self, candidates, signature):
+        """Estimated Jaccard similarity of each candidate entry to a signature"""
+        import numpy as np
+        
+        saved = len(self._signatures)
+        old, new = candidates[candidates < saved], candidates[candidates >= saved]
+        rows = np.concatenate([self._signatures[np.sort(old)], self._new_signatures[new - saved]])
+        ids = np.concatenate([np.sort(old), new])
+        return ids, np.count_nonzero(rows == signature, axis=1) / DUPLICATE_NUM_PERM
+
+    def _query(self, signature, threshold: float, limit: int) -> List[Tuple[int, float]]:
+        import numpy as np
+        
+        keys = self._keys(signature[np.newaxis])[:, 0]
+        candidates = []
+        for band, key in enumerate(keys):
+            if self._band_keys.shape[1]:
+                start = np.searchsorted(self._band_keys[band], key, side='left')
+                end = np.searchsorted(self._band_keys[band], key, side='right')
+                candidates.append(np.asarray(self._band_ids[band, start:end], dtype=np.int64))
+            bucket = self._new_buckets.get((band, int(key)))
+            if bucket:
+                candidates.append(np.asarray(bucket, dtype=np.int64))
+        if not candidates:
+            return []
+        
+        ids, similarities = self._similarities(np.unique(np.concatenate(candidates)), signature)
+        keep = similarities >= threshold
+        ids, similarities = ids[keep], similarities[keep]
+        # Most similar first, then oldest
+        order = np.lexsort((ids, -similarities))[:limit]
+        return [(int(ids[i]), float(similarities[i])) for i in order]
+
+    def query(self, question: str, options: Dict[str, str], threshold: float = DUPLICATE_THRESHOLD,
+              limit: int = 20) -> List[Dict[str, Any]]:
+        """Indexed entries similar to a question, most similar first"""
+        signature = self.signature(question, options)
+        if signature is None:
+            return []
+        with self._locked():
+            return [{"id": entry_id, "similarity": round(similarity, 3), **self._entries[entry_id]}
+                    for entry_id, similarity in self._query(signature, threshold, limit)]
+
+    def _add(self, signature, entry: Dict[str, Any]) -> int:
+        import numpy as np
+        
+        entry_id = len(self._entries)
+        self._entries.append(entry)
+        if entry.get("document"):
+            self._documents.add(entry["document"])
+        if self._new_count == len(self._new_signatures):
+            self._new_signatures = np.concatenate([self._new_signatures, np.empty_like(self._new_signatures)])
+        self._new_signatures[self._new_count] = signature
+        self._new_count += 1
+        for band, key in enumerate(self._keys(signature[None])[:, 0]):
+            self._new_buckets.setdefault((band, int(key)), []).append(entry_id)
+        return entry_id
+
+    def tag(self, mcqs: List[MCQ], source: Optional[str] = None, document: Optional[str] = None, add: bool = True):
+        """Set each MCQ's duplicates to the ids of near-duplicates indexed from other documents, then index it.
+        document (the source file's SHA-256) keeps a document from matching its own questions and from being
+        indexed twice. A question identical to an indexed one (same signature) is not added again,
+        and with add=False (partial or limited extractions) nothing is."""
+        with self._locked():
+            add = add and not (document and document in self._documents)
+            appended = []
+            for mcq in mcqs:
+                signature = self.signature(mcq.question, mcq.options)
+                if signature is None:
+                    continue
+                matches = self._query(signature, DUPLICATE_THRESHOLD, 20)
+                if document:
+                    matches = [match for match in matches if self._entries[match[0]].get("document") != document]
+                mcq.duplicates = [entry_id for entry_id, _ in matches]
+                if not add or (matches and matches[0][1] == 1.0):
+                    continue
+                if not self.path and len(self._entries) >= DUPLICATE_INDEX_MAX_MEMORY_ENTRIES:
+                    if not self._full_logged:
+                        logger.warning("In-memory duplicate index is full (%d entries); set MCQ_DUPLICATE_INDEX_PATH "
+                                       "to keep indexing new questions", len(self._entries))
+                        self._full_logged = True
+                    continue
+                entry = {"source": source, "question_number": mcq.question_number, "question": mcq.question[:200]}
+                if document:
+                    entry["document"] = document
+                entry_id = self._add(signature, entry)
+                appended.append(orjson.dumps({"id": entry_id, **entry, "signature": signature.tobytes().hex()}))
+            if self.path and appended:
+                self._append_pending(b'\n'.join(appended) + b'\n')
+            if self.path and self._new_count >= DUPLICATE_INDEX_SAVE_EVERY:
+                self._save()
+
+    def _append_pending(self, data: bytes):
+        try:
+            with open(os.path.join(self.path, "pending.jsonl"), 'ab') as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning("Could not append to duplicate index in %s: %s", self.path, e)
+            return
+        self._pending_offset += len(data)
+
+    def save(self):
+        """Rewrite the index files with every entry, pending ones included, and memory-map them again"""
+        if not self.path:
+            return
+        with self._locked():
+            if self._new_count:
+                self._save()
+
+    def _save(self):
+        import numpy as np
+        
+        try:
+            signatures = np.concatenate([np.asarray(self._signatures), self._new_signatures[:self._new_count]])
+            keys = self._keys(signatures)
+            order = np.argsort(keys, axis=1, kind='stable').astype(np.uint32)
+            arrays = {
+                "signatures.npy": signatures,
+                "band_keys.npy": np.take_along_axis(keys, order.astype(np.intp), axis=1),
+                "band_ids.npy": order,
+            }
+            for name, array in arrays.items():
+                temp_path = os.path.join(self.path, f"{name}.tmp")
+                with open(temp_path, 'wb') as f:
+                    np.save(f, array)
+                os.replace(temp_path, os.path.join(self.path, name))
+            temp_path = os.path.join(self.path, "entries.json.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(orjson.dumps(self._entries))
+            os.replace(temp_path, os.path.join(self.path, "entries.json"))
+            open(os.path.join(self.path, "pending.jsonl"), 'wb').close()
+        except OSError as e:
+            logger.warning("Could not save duplicate index to %s: %s", self.path, e)
+            return
+        # Other processes see the new entries.json and reload on their next lookup
+        self._saved_stamp = self._stamp()
+        self._signatures = np.load(os.path.join(self.path, "signatures.npy"), mmap_mode='r')
+        self._band_keys = np.load(os.path.join(self.path, "band_keys.npy"), mmap_mode='r')
+        self._band_ids = np.load(os.path.join(self.path, "band_ids.npy"), mmap_mode='r')
+        self._clear_new()
+        self._pending_offset = 0
+
+
+class QuestionStore:
+    """SQLite store of extracted MCQs keyed by source document hash, with an FTS5 index over question and option text"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY,
+            sha256 TEXT NOT NULL UNIQUE,
+            filename TEXT,
+            file_type TEXT,
+            questions INTEGER NOT NULL,
+            stored_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY,
+            document_id INTEGER NOT NULL REFERENCES documents(id),
+            question_number INTEGER,
+            page INTEGER,
+            question TEXT NOT NULL,
+            options TEXT NOT NULL,
+            correct_answer TEXT
+        );
+        CREATE INDEX IF NOT EXISTS questions_document ON questions(document_id, question_number);
+        CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(question, options, tokenize='unicode61 remove_diacritics 2');
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+        
+        self.path = path
+        self._lock = threading.Lock()
+        # One connection shared by the worker threads, serialized by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+
+    def store_document(self, sha256: str, filename: Optional[str], file_type: str, mcqs: List[MCQ]):
+        """Store a document's MCQs in one transaction, replacing any earlier extraction of the same file"""
+        rows = [
+            (mcq.question_number, mcq.page, mcq.question, orjson.dumps(mcq.options).decode(), mcq.correct_answer)
+            for mcq in mcqs
+        ]
+        with self._lock, self._db:
+            existing = self._db.execute("SELECT id FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+            if existing:
+                document_id = existing[0]
+                self._db.execute("DELETE FROM questions_fts WHERE rowid IN "
+                                 "(SELECT id FROM questions WHERE document_id = ?)", (document_id,))
+                self._db.execute("DELETE FROM questions WHERE document_id = ?", (document_id,))
+                self._db.execute("UPDATE documents SET filename = ?, file_type = ?, questions = ?, stored_at = ? "
+                                 "WHERE id = ?", (filename, file_type, len(rows), time.time(), document_id))
+            else:
+                document_id = self._db.execute(
+                    "INSERT INTO documents (sha256, filename, file_type, questions, stored_at) VALUES (?, ?, ?, ?, ?)",
+                    (sha256, filename, file_type, len(rows), time.time())
+                ).lastrowid
+            self._db.executemany(
+                "INSERT INTO questions (document_id, question_number, page, question, options, correct_answer) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(document_id, *row) for row in rows]
+            )
+            # Option text (without letters) is indexed alongside the question
+            self._db.execute(
+                "INSERT INTO questions_fts (rowid, question, options) "
+                "SELECT id, question, (SELECT group_concat(value, ' ') FROM json_each(questions.options)) "
+                "FROM questions WHERE document_id = ?", (document_id,)
+            )
+
+    def search(self, query: Optional[str] = None, document: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """(total matches, one page of questions) for a full-text query and/or a document hash,
+        best matches first for queries and in question order otherwise"""
+        conditions, params = [], []
+        if query is not None:
+            # Quote every term so user input is never parsed as FTS5 syntax; terms are ANDed
+            terms = re.findall(r'\w+', query)
+            if not terms:
+                raise ValueError("Search query has no words")
+            source = "questions_fts JOIN questions q ON q.id = questions_fts.rowid"
+            conditions.append("questions_fts MATCH ?")
+            params.append(" ".join(f'"{term}"' for term in terms))
+            order = "bm25(questions_fts), q.id"
+        else:
+            source = "questions q"
+            order = "q.document_id, q.question_number, q.id"
+        if document is not None:
+            conditions.append("d.sha256 = ?")
+            params.append(document.lower())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        with self._lock:
+            total = self._db.execute(
+                f"SELECT COUNT(*) FROM {source} JOIN documents d ON d.id = q.document_id {where}", params
+            ).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT q.id, d.sha256, d.filename, d.file_type, q.question_number, q.page, q.question, q.options, "
+                f"q.correct_answer FROM {source} JOIN documents d ON d.id = q.document_id {where} "
+                f"ORDER BY {order} LIMIT ? OFFSET ?", (*params, limit, offset)
+            ).fetchall()
+        
+        return total, [{
+            "id": row[0],
+            "document": {"sha256": row[1], "filename": row[2], "file_type": row[3]},
+            "question_number": row[4],
+            "page": row[5],
+            "question": row[6],
+            "options": orjson.loads(row[7]),
+            "correct_answer": row[8],
+        } for row in rows]
+
+
+# Flat export schema: one row per MCQ, options A-D as columns and boolean content/quality flags
+MCQ_EXPORT_COLUMNS = (
+    "question_number", "question", "option_a", "option_b", "option_c", "option_d", "correct_answer",
+    "question_type", "page", "has_math_content", "has_visual_content", "has_missing_options", "has_extraction_issues",
+)
+# Export format -> (media type, file extension)
+MCQ_EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def _mcq_export_values(mcqs: Sequence[MCQ]) -> List[list]:
+    """Column values of a batch in MCQ_EXPORT_COLUMNS order, read straight from the MCQ records"""
+    return [
+        [mcq.question_number for mcq in mcqs],
+        [mcq.question for mcq in mcqs],
+        *([mcq.options.get(letter) for mcq in mcqs] for letter in "ABCD"),
+        [mcq.correct_answer for mcq in mcqs],
+        [mcq.question_type for mcq in mcqs],
+        [mcq.page for mcq in mcqs],
+        [mcq.has_math_content for mcq in mcqs],
+        [mcq.has_visual_content for mcq in mcqs],
+        [bool(mcq.missing_options) for mcq in mcqs],
+        [bool(mcq.extraction_issues) for mcq in mcqs],
+    ]
+
+
+def export_mcq_batches(batches: Iterable[Sequence[MCQ]], format: str, sink: BinaryIO):
+    """Write batches of MCQs to a binary file-like sink as CSV, Parquet or an Arrow IPC stream with the
+    flat MCQ_EXPORT_COLUMNS schema, one batch at a time. Arrow and Parquet need pyarrow."""
+    if format not in MCQ_EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {format}. Use {', '.join(MCQ_EXPORT_FORMATS)}")
+    
+    if format == "csv":
+        text = io.TextIOWrapper(sink, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(MCQ_EXPORT_COLUMNS)
+        for batch in batches:
+            writer.writerows(zip(*_mcq_export_values(batch)))
+        text.flush()
+        # Leave the caller's sink open
+        text.detach()
+        return
+    
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError(f"{format} export needs pyarrow (pip install pyarrow)")
+    
+    schema = pa.schema([
+        ("question_number", pa.int32()), ("question", pa.string()),
+        ("option_a", pa.string()), ("option_b", pa.string()), ("option_c", pa.string()), ("option_d", pa.string()),
+        ("correct_answer", pa.string()), ("question_type", pa.string()), ("page", pa.int32()),
+        ("has_math_content", pa.bool_()), ("has_visual_content", pa.bool_()),
+        ("has_missing_options", pa.bool_()), ("has_extraction_issues", pa.bool_()),
+    ])
+    writer = pq.ParquetWriter(sink, schema) if format == "parquet" else pa.ipc.new_stream(sink, schema)
+    try:
+        for batch in batches:
+            columns = [pa.array(values, type=column.type) for values, column in zip(_mcq_export_values(batch), schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+    finally:
+        writer.close()
+
+
+def export_mcqs(mcqs: Sequence[MCQ], format: str, sink: BinaryIO):
+    """Write one list of MCQs to sink (see export_mcq_batches)"""
+    export_mcq_batches([mcqs], format, sink)
+
+
 class MCQExtractor:
     def __init__(self):
         self.question_patterns = [
@@ -84,123 +1591,1027 @@ class MCQExtractor:
             r'\b([A-Da-d])\s*is\s*correct',
             r'Option\s*([A-Da-d])\s*is\s*correct',
         ]
+        
+        # Spreadsheet header names (lowercased, punctuation stripped) mapped to MCQ columns
+        self.column_aliases = {
+            'number': {'no', 'sn', 'sno', 'qno', 'q no', 'number', 'question no', 'question number', 'serial'},
+            'question': {'question', 'questions', 'question text', 'q', 'stem'},
+            'A': {'a', 'option a', 'optiona', 'opt a', 'choice a', 'option 1'},
+            'B': {'b', 'option b', 'optionb', 'opt b', 'choice b', 'option 2'},
+            'C': {'c', 'option c', 'optionc', 'opt c', 'choice c', 'option 3'},
+            'D': {'d', 'option d', 'optiond', 'opt d', 'choice d', 'option 4'},
+            'answer': {'answer', 'ans', 'correct', 'correct answer', 'correct option', 'key', 'answer key'},
+        }
+        
+        # Inline answer lines and typed question numbers seen while reading structured DOCX
+        self._docx_answer_pattern = re.compile(r'^(?:Correct\s*)?(?:Answer|Ans|Correct)\s*[:\.\-]?\s*\(?([A-Da-d])\)?(?:\W|$)', re.IGNORECASE)
+        self._docx_typed_question_pattern = re.compile(r'^(?:Q(?:uestion)?\s*)?\d+\s*[\.\):\-]')
+        
+        # Learned per-template parsing profiles (set MCQ_PROFILE_PATH to keep them across restarts)
+        self.profiles = ParsingProfileStore(os.environ.get("MCQ_PROFILE_PATH"))
+        
+        # Near-duplicate index across uploads, created on first use (set MCQ_DUPLICATE_INDEX_PATH to persist it)
+        self._duplicates: Optional[DuplicateIndex] = None
+        self._duplicates_lock = threading.Lock()
+        
+        # Column gutters per document template (see _pdf_template_key), most recently used last
+        self._column_layout_cache = OrderedDict()
+        self._column_layout_lock = threading.Lock()
+        
+        # Line classifiers for the PDF layout segmenter
+        self._layout_question_pattern = re.compile(r'^(?:(?:Q|Question)\s*[\.:]?\s*(\d{1,4})\s*[\.\):]?|(\d{1,4})\s*[\.\):])\s*(.*)$')
+        self._layout_option_pattern = re.compile(r'^\(?([A-Da-d])\s*[\.\)]\s*(.*)$')
+        self._layout_inline_option_split = re.compile(r'\s{2,}(?=\(?[A-Da-d][\.\)]\s)')
+        self._layout_misread_label = re.compile(r'^\(?([{}])\s*[\.\)]'.format(''.join(OCR_OPTION_LABEL_MISREADS)))
+        # Option or question labels, including OCR misreads such as "8)" for "B)"
+        self._layout_label_like = re.compile(r'^\(?[A-Za-z0-9]{1,3}\s*[\.\)]')
 
-    def extract_text_from_pdf(self, file_content: bytes) -> str:
-        """Extract text from PDF file using multiple methods with page-by-page processing"""
-        text = ""
-        extraction_errors = []
-          # Method 1: Try PyMuPDF (fitz) first - usually better for complex layouts
+    def extract_text(self, file_content: bytes, filename: Optional[str] = None,
+                     pages: Optional[List[Tuple[int, Optional[int]]]] = None) -> Tuple[str, ExtractorSpec]:
+        """Detect the upload's format and extract its text with the registered extractor.
+        pages (see parse_page_ranges) limits paged formats to those pages and is rejected for the others."""
+        spec = detect_file_format(file_content, filename)
+        _current_file_type.set(spec.name)
+        with stage_timer("extract_text", spec.method):
+            return getattr(self, spec.method)(file_content, **self._page_options(spec, pages)), spec
+
+    def _page_options(self, spec: ExtractorSpec, pages: Optional[List[Tuple[int, Optional[int]]]]) -> Dict[str, Any]:
+        """Keyword arguments selecting pages, for the extractors of paged formats only.
+        Raises PageRangeError when pages are requested from a format without pages."""
+        if "pages" not in spec.capabilities:
+            if pages is not None:
+                raise PageRangeError(f"{spec.name.upper()} files have no pages; pages applies to PDFs and multi-frame images")
+            return {}
+        return {"pages": pages}
+
+    def extract_mcqs(self, file_content: bytes, filename: Optional[str] = None,
+                     pages: Optional[List[Tuple[int, Optional[int]]]] = None,
+                     max_questions: Optional[int] = None) -> Tuple[List[MCQ], DocumentIndex, ExtractorSpec]:
+        """Detect the upload's format and return (mcqs, document, spec), building MCQs directly from
+        structured content when the format supports it and parsing extracted text otherwise.
+        document indexes the text that was parsed, for the content-analysis stage to reuse.
+        pages limits paged formats to those pages and is rejected for others; max_questions returns only the first questions
+        and stops reading once they are complete."""
+        spec = detect_file_format(file_content, filename)
+        # Labels the stage timings of this document (each request runs in its own context)
+        _current_file_type.set(spec.name)
+        
+        # PDFs are fingerprinted from their first page up front so a known template can skip a failing layout pass
+        fingerprint = None
+        if spec.name == "pdf":
+            with stage_timer("fingerprint"):
+                fingerprint = self._pdf_fingerprint(file_content)
+        profile = self.profiles.get(fingerprint)
+        
+        if spec.structured_method and not (profile and profile.structured is False):
+            with stage_timer("structured", spec.structured_method):
+                mcqs = getattr(self, spec.structured_method)(
+                    file_content, max_questions=max_questions, **self._page_options(spec, pages)
+                )
+            # A pass cut short by the time budget, or limited to some pages or questions, says nothing about the template
+            out_of_time = _budget_exhausted()
+            if fingerprint and not out_of_time and pages is None and not max_questions:
+                self.profiles.record_structured(fingerprint, bool(mcqs))
+            if mcqs or out_of_time:
+                mcqs = (mcqs or [])[:max_questions]
+                # Text of the questions themselves; see document_for_analysis for the whole document
+                text = '\n'.join(f"{mcq.question} {' '.join(mcq.options.values())}" for mcq in mcqs)
+                return mcqs, DocumentIndex(text, questions_only=True), spec
+            metrics.count_fallback(spec.structured_method, spec.method)
+        
+        # Paged text extractors can also stop early once max_questions questions are complete
+        text_options = self._page_options(spec, pages)
+        if text_options:
+            text_options["max_questions"] = max_questions
+        with stage_timer("extract_text", spec.method):
+            text = getattr(self, spec.method)(file_content, **text_options)
+        # The budget also covers preprocessing and parsing: stop at each boundary once it is spent
+        if not text.strip() or _budget_expired():
+            return [], DocumentIndex(text), spec
+        if fingerprint is None:
+            fingerprint = self._document_fingerprint(spec.name, text)
+        document = self.index_document(text)
+        if _budget_expired():
+            return [], document, spec
+        mcqs = self.parse_mcqs(text, fingerprint=fingerprint, max_questions=max_questions, document=document,
+                               learn=pages is None)
+        return mcqs, document, spec
+
+    @property
+    def duplicates(self) -> DuplicateIndex:
+        if self._duplicates is None:
+            with self._duplicates_lock:
+                if self._duplicates is None:
+                    self._duplicates = DuplicateIndex(os.environ.get("MCQ_DUPLICATE_INDEX_PATH"))
+        return self._duplicates
+
+    def tag_duplicates(self, mcqs: List[MCQ], source: Optional[str] = None, document: Optional[str] = None,
+                       add: bool = True):
+        """Tag MCQs with the ids of near-duplicates seen in earlier uploads, and index them unless add is False"""
+        with stage_timer("duplicates"):
+            self.duplicates.tag(mcqs, source, document, add)
+
+    def parse_text(self, text: str, max_questions: Optional[int] = None) -> List[MCQ]:
+        """Parse MCQs from text a caller already has, sharing the parsing profiles of uploaded text files"""
+        _current_file_type.set("txt")
+        fingerprint = self._document_fingerprint("txt", text)
+        return self.parse_mcqs(text, fingerprint=fingerprint, max_questions=max_questions)
+
+    def _document_fingerprint(self, format_name: str, header_text: str, fonts: Tuple[str, ...] = ()) -> str:
+        """Fingerprint a document's formatting from its format, first lines (numbers masked) and fonts"""
+        header_lines = []
+        for line in header_text.split('\n'):
+            line = re.sub(r'\s+', ' ', re.sub(r'\d+', '#', line.strip().lower()))
+            if line:
+                header_lines.append(line[:80])
+            if len(header_lines) == 3:
+                break
+        signature = '\n'.join([format_name, *header_lines, *sorted(set(fonts))])
+        return hashlib.sha1(signature.encode('utf-8')).hexdigest()
+
+    def _pdf_fingerprint(self, file_content: bytes) -> Optional[str]:
+        """Fingerprint a PDF from the text and fonts of its first page"""
+        import fitz  # PyMuPDF
+        
         try:
             pdf_doc = fitz.open(stream=file_content, filetype="pdf")
-            for page_num in range(pdf_doc.page_count):
-                page = pdf_doc.load_page(page_num)  # Fixed: use load_page() instead of page()
-                page_text = page.get_text()
-                if page_text.strip():
-                    text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+        except Exception:
+            return None
+        try:
+            if pdf_doc.page_count == 0:
+                return None
+            page = pdf_doc.load_page(0)
+            # Drop the subset tag from embedded font names ("ABCDEF+Arial" -> "Arial")
+            fonts = tuple(font[3].split('+')[-1] for font in page.get_fonts())
+            return self._document_fingerprint("pdf", page.get_text(), fonts)
+        finally:
             pdf_doc.close()
+
+    def extract_text_from_pdf(self, file_content: bytes, pages: Optional[List[Tuple[int, Optional[int]]]] = None,
+                              max_questions: Optional[int] = None) -> str:
+        """Extract text from PDF file using multiple methods with page-by-page processing.
+        Only the given page ranges are read, and reading stops once max_questions questions are complete."""
+        import fitz  # PyMuPDF
+        import PyPDF2
+        
+        extraction_errors = []
+          # Method 1: Try PyMuPDF (fitz) first - usually better for complex layouts
+        try:
+            buffer = PageBuffer()
+            with stage_timer("pdf_text", "pymupdf"):
+                pdf_doc = fitz.open(stream=file_content, filetype="pdf")
+                scan = PageScan(pdf_doc.page_count, pages, max_questions)
+                for page_num in scan:
+                    page = pdf_doc.load_page(page_num)  # Fixed: use load_page() instead of page()
+                    page_text = self._pdf_page_text(page, self._pdf_template_key(pdf_doc, page))
+                    self._add_pdf_page(buffer, page_num, page_text)
+                    scan.count_questions(page_text)
+                pdf_doc.close()
             
-            if text.strip():
-                return self._preprocess_text(text)
+            # Out of time: return what was read rather than starting a slower fallback
+            if buffer or _budget_exhausted():
+                return buffer.getvalue()
+        except PageRangeError:
+            # The document opened fine; other backends would reject the same pages
+            raise
         except Exception as e:
             extraction_errors.append(f"PyMuPDF: {str(e)}")
-            print(f"PyMuPDF extraction failed: {e}")
+            metrics.count_failure("pdf_text", "pymupdf")
+            logger.warning("PyMuPDF extraction failed: %s", e)
         
         # Method 2: Try PyPDF2 as fallback
+        metrics.count_fallback("pymupdf", "pypdf2")
         try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                if page_text.strip():
-                    text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+            buffer = PageBuffer()
+            with stage_timer("pdf_text", "pypdf2"):
+                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+                scan = PageScan(len(pdf_reader.pages), pages, max_questions)
+                for page_num in scan:
+                    page_text = pdf_reader.pages[page_num].extract_text()
+                    self._add_pdf_page(buffer, page_num, page_text)
+                    scan.count_questions(page_text)
             
-            if text.strip():
-                return self._preprocess_text(text)
+            if buffer or _budget_exhausted():
+                return buffer.getvalue()
+        except PageRangeError:
+            raise
         except Exception as e:
             extraction_errors.append(f"PyPDF2: {str(e)}")
-            print(f"PyPDF2 extraction failed: {e}")
+            metrics.count_failure("pdf_text", "pypdf2")
+            logger.warning("PyPDF2 extraction failed: %s", e)
         
         # Method 3: OCR as last resort for scanned PDFs
+        metrics.count_fallback("pypdf2", "ocr")
         try:
-            return self._extract_text_from_scanned_pdf(file_content)
+            return self._extract_text_from_scanned_pdf(file_content, pages, max_questions)
+        except PageRangeError:
+            raise
         except Exception as e:
             extraction_errors.append(f"OCR: {str(e)}")
-            print(f"OCR extraction failed: {e}")
+            metrics.count_failure("pdf_text", "ocr")
+            logger.warning("OCR extraction failed: %s", e)
         
         # If all methods failed, raise a comprehensive error
         error_details = "; ".join(extraction_errors)
         raise ValueError(f"Could not extract text from PDF using any method. Errors: {error_details}. The PDF may be corrupted, protected, or contain only images.")
 
-    def _extract_text_from_scanned_pdf(self, file_content: bytes) -> str:
-        """Extract text from scanned PDF using OCR"""
+    def _add_pdf_page(self, buffer: PageBuffer, page_num: int, page_text: str, marker: str = ""):
+        """Preprocess one page's text and append it under its "--- Page N ---" marker unless it is blank.
+        Pages are preprocessed one at a time so the recorded page offsets hold in the final text."""
+        buffer.preprocessed = True
+        if not page_text.strip():
+            return
+        page_text = self._preprocess_text(page_text)
+        if page_text:
+            buffer.start_page(str(page_num + 1), f"--- Page {page_num + 1}{marker} ---")
+            buffer.add_line(page_text)
+
+    def extract_mcqs_from_pdf(self, file_content: bytes, pages: Optional[List[Tuple[int, Optional[int]]]] = None,
+                              max_questions: Optional[int] = None) -> Optional[List[MCQ]]:
+        """Segment questions and options from PyMuPDF's positioned text (lines, spans, fonts) in one pass;
+        returns None to fall back to text parsing when the layout is not recognised"""
+        import fitz  # PyMuPDF
+        
+        try:
+            pdf_doc = fitz.open(stream=file_content, filetype="pdf")
+        except Exception:
+            # Let the text extractor report the error
+            return None
+        
+        try:
+            lines = []
+            scan = PageScan(pdf_doc.page_count, pages, max_questions)
+            for page_num in scan:
+                page = pdf_doc.load_page(page_num)
+                page_lines = self._pdf_layout_lines(page, page_num, self._pdf_template_key(pdf_doc, page))
+                lines.extend(page_lines)
+                if max_questions:
+                    scan.count_questions('\n'.join(line.text for line in page_lines))
+        finally:
+            pdf_doc.close()
+        
+        if not lines:
+            # Scanned PDF: the text path handles OCR
+            return None
+        return self._segment_layout_lines(lines)
+
+    def _pdf_layout_lines(self, page, page_num: int, template_key: Tuple) -> List[LayoutLine]:
+        """Positioned text lines of one page in reading order, column by column on multi-column pages"""
+        lines = []
+        page_dict = page.get_text("dict", sort=True)
+        for block in page_dict["blocks"]:
+            if block.get("type") != 0:
+                continue
+            for line in block["lines"]:
+                spans = [span for span in line["spans"] if span["text"].strip()]
+                if not spans:
+                    continue
+                lines.append(LayoutLine(
+                    page=page_num,
+                    x0=spans[0]["bbox"][0],
+                    x1=line["bbox"][2],
+                    y0=line["bbox"][1],
+                    text="".join(span["text"] for span in line["spans"]).strip(),
+                    bold=all(span["flags"] & 16 or "Bold" in span["font"] for span in spans),
+                    span_starts=[(span["bbox"][0], span["text"].strip()) for span in spans]
+                ))
+        
+        gutters = self._page_gutters([(line.x0, line.x1, line.y0) for line in lines], page.rect.width, template_key)
+        if gutters:
+            lines = self._reading_order([(line.x0, line.x1, line.y0, line) for line in lines], gutters)
+        return lines
+
+    def _layout_options(self, line: LayoutLine) -> List[Tuple[str, str]]:
+        """Options on a line that starts with an option label, split at spans or wide gaps that begin a new label"""
+        if not self._layout_option_pattern.match(line.text):
+            return []
+        
+        # Separate spans starting with a label are separate options ("A) 12" "B) 15" laid out in a row)
+        pieces = []
+        for _, span_text in line.span_starts:
+            if pieces and not self._layout_option_pattern.match(span_text):
+                pieces[-1] = f"{pieces[-1]} {span_text}"
+            else:
+                pieces.append(span_text)
+        
+        options = []
+        for piece in pieces:
+            for part in self._layout_inline_option_split.split(piece):
+                match = self._layout_option_pattern.match(part.strip())
+                if match:
+                    options.append((match.group(1).upper(), match.group(2).strip()))
+                elif options and part.strip():
+                    letter, text = options[-1]
+                    options[-1] = (letter, f"{text} {part.strip()}".strip())
+        return options
+
+    def _segment_layout_lines(self, lines: List[LayoutLine]) -> Optional[List[MCQ]]:
+        """Group positioned lines into MCQs: question numbers at the left edge start a question,
+        option labels start options, indented lines continue the previous option"""
+        mcqs = []
+        leftover = []
+        current = None
+        question_x0 = None
+        last_option = None
+        accepting_options = False
+        
+        for line in lines:
+            # Same label repairs as the text path ("G)" read for "C)"), so a misread label does not end the options
+            text = self._clean_ocr_errors(line.text)
+            if text != line.text:
+                line = replace(line, text=text, span_starts=[(x0, self._clean_ocr_errors(span_text))
+                                                             for x0, span_text in line.span_starts])
+            # A misread label that follows the last option in sequence ("8)" after "A)") is that option,
+            # unless it is the next question's number
+            misread = self._layout_misread_label.match(text) if current is not None and last_option else None
+            if misread:
+                label = misread.group(1)
+                if (OCR_OPTION_LABEL_MISREADS.get(label) == chr(ord(last_option) + 1)
+                        and not (label.isdigit() and int(label) == current.question_number + 1)):
+                    text = text[:misread.start(1)] + OCR_OPTION_LABEL_MISREADS[label] + text[misread.end(1):]
+                    span_starts = list(line.span_starts)
+                    if span_starts and span_starts[0][1].lstrip('(').startswith(label):
+                        x0, span_text = span_starts[0]
+                        span_starts[0] = (x0, span_text.replace(label, OCR_OPTION_LABEL_MISREADS[label], 1))
+                    line = replace(line, text=text, span_starts=span_starts)
+            
+            if current is not None:
+                # Answer lines ("Answer: B", "Correct option: C", "B is correct") never continue an option
+                answer_match = self._docx_answer_pattern.match(text)
+                answer = answer_match.group(1).upper() if answer_match else None
+                if answer is None and current.options and not (
+                    self._layout_option_pattern.match(text) or self._layout_question_pattern.match(text)
+                ):
+                    answer = self._answer_on_line(text)
+                if answer:
+                    current.correct_answer = answer
+                    continue
+            
+            question_match = self._layout_question_pattern.match(text)
+            if question_match and (
+                current is None or current.options or line.bold or abs(line.x0 - question_x0) <= 2
+            ):
+                current = MCQ(
+                    question_number=int(question_match.group(1) or question_match.group(2)),
+                    question=question_match.group(3).strip(),
+                    options={},
+                    page=line.page + 1
+                )
+                mcqs.append(current)
+                question_x0 = line.x0
+                last_option = None
+                accepting_options = True
+                continue
+            
+            options = self._layout_options(line) if current is not None and accepting_options else []
+            if options:
+                for letter, option_text in options:
+                    current.options[letter] = option_text
+                    last_option = letter
+            elif current is not None and not current.options:
+                # Question stem wrapped onto the next line
+                current.question = f"{current.question} {text}".strip()
+            elif current is not None and last_option and line.x0 > question_x0 + 2:
+                # Indented line continues the last option
+                current.options[last_option] = f"{current.options[last_option]} {text}"
+            else:
+                # Text between questions closes the current option list
+                leftover.append(text)
+                last_option = None
+                accepting_options = False
+        
+        if not mcqs:
+            return None
+        # Only trust the segmentation when nearly every question found its options and a stem
+        if sum(1 for mcq in mcqs if len(mcq.options) >= 2 and mcq.question) < 0.8 * len(mcqs):
+            return None
+        # ... and, unless every question has four options and no label-like line was left over, when it
+        # found as many options and complete questions as the text parser does on the same lines
+        if not all(len(mcq.options) >= 4 for mcq in mcqs) or any(self._layout_label_like.match(text) for text in leftover):
+            with stage_timer("parse", "layout_check"):
+                text = '\n'.join(line.text for line in lines)
+                parsed = self._parse_mcqs_with_patterns(self.index_document(text), self._pattern_set(), None)
+            if (sum(len(mcq.options) for mcq in mcqs) < sum(len(mcq.options) for mcq in parsed)
+                    or sum(len(mcq.options) >= 4 for mcq in mcqs) < sum(len(mcq.options) >= 4 for mcq in parsed)):
+                return None
+        
+        answer_key = self._extract_answer_key(leftover)
+        mcqs = [mcq for mcq in mcqs if mcq.options]
+        document = None
+        for mcq in mcqs:
+            mcq.options = self._validate_options(mcq.options)
+            if mcq.correct_answer is None:
+                mcq.correct_answer = answer_key.get(mcq.question_number)
+            if mcq.correct_answer is None:
+                # Same lookup as the text path: answer patterns within a few lines of the question
+                if document is None:
+                    document = DocumentIndex('\n'.join(line.text for line in lines))
+                mcq.correct_answer = self._find_answer_near_question(document, mcq)
+        
+        mcqs.sort(key=lambda x: x.question_number)
+        return mcqs
+
+    def _pdf_template_key(self, pdf_doc, page) -> Tuple:
+        """Fingerprint of a document template for the column geometry cache: page size and producing software"""
+        metadata = pdf_doc.metadata or {}
+        return (
+            round(page.rect.width), round(page.rect.height),
+            metadata.get("producer") or "", metadata.get("creator") or ""
+        )
+
+    def _page_gutters(self, boxes: List[Tuple[float, float, float]], page_width: float, template_key: Tuple) -> List[Tuple[float, float]]:
+        """Column gutters for a page, reusing the cached geometry of its template when it still fits the text"""
+        with self._column_layout_lock:
+            cached = self._column_layout_cache.get(template_key)
+        if cached and self._gutters_fit(boxes, cached):
+            with self._column_layout_lock:
+                if template_key in self._column_layout_cache:
+                    self._column_layout_cache.move_to_end(template_key)
+            return cached
+        
+        gutters = self._detect_column_gutters(boxes, page_width)
+        if gutters:
+            with self._column_layout_lock:
+                self._column_layout_cache[template_key] = gutters
+                self._column_layout_cache.move_to_end(template_key)
+                while len(self._column_layout_cache) > COLUMN_LAYOUT_CACHE_SIZE:
+                    self._column_layout_cache.popitem(last=False)
+        return gutters
+
+    def _detect_column_gutters(self, boxes: List[Tuple[float, float, float]], page_width: float) -> List[Tuple[float, float]]:
+        """Find vertical gutters: bands at least MIN_COLUMN_GUTTER wide that (almost) no text box
+        crosses, with enough text on both sides to be columns. Boxes are (x0, x1, y0)."""
+        if len(boxes) < 20:
+            return []
+        
+        # Count boxes covering each 1pt slice of the page with a difference array
+        width = int(page_width) + 2
+        delta = [0] * (width + 1)
+        for x0, x1, _ in boxes:
+            delta[max(0, min(width, int(x0)))] += 1
+            delta[max(0, min(width, int(x1) + 1))] -= 1
+        coverage = []
+        running = 0
+        for change in delta[:width]:
+            running += change
+            coverage.append(running)
+        
+        left = max(0, int(min(box[0] for box in boxes)))
+        right = min(width - 1, int(max(box[1] for box in boxes)))
+        # Full-width headings and footers may cross a gutter
+        allowed_crossings = max(2, len(boxes) * 0.02)
+        
+        gutters = []
+        start = None
+        for x in range(left, right + 1):
+            if coverage[x] <= allowed_crossings:
+                if start is None:
+                    start = x
+            elif start is not None:
+                if x - start >= MIN_COLUMN_GUTTER:
+                    gutters.append((float(start), float(x)))
+                start = None
+        
+        return gutters if self._gutters_fit(boxes, gutters) else []
+
+    def _gutters_fit(self, boxes: List[Tuple[float, float, float]], gutters: List[Tuple[float, float]]) -> bool:
+        """Check that every column between gutters holds a real share of the text and few boxes cross a gutter"""
+        if not gutters:
+            return False
+        edges = [(start + end) / 2 for start, end in gutters]
+        allowed_crossings = max(2, len(boxes) * 0.02)
+        
+        column_rows = [set() for _ in range(len(gutters) + 1)]
+        crossings = 0
+        for x0, x1, y0 in boxes:
+            if any(x0 < end and x1 > start for start, end in gutters):
+                crossings += 1
+                continue
+            column_rows[bisect.bisect_right(edges, x0)].add(round(y0))
+        
+        if crossings > allowed_crossings:
+            return False
+        # Each column needs several distinct text rows (not just an option grid cell)
+        return all(len(rows) >= 5 for rows in column_rows)
+
+    def _reading_order(self, items: List[Tuple[float, float, float, Any]], gutters: List[Tuple[float, float]]) -> List[Any]:
+        """Order (x0, x1, y0, payload) items column by column. Items crossing a gutter (headings,
+        footers) split the page into bands that are read top to bottom."""
+        edges = [(start + end) / 2 for start, end in gutters]
+        
+        def crosses(item):
+            return any(item[0] < end and item[1] > start for start, end in gutters)
+        
+        spanning_ys = sorted(item[2] for item in items if crosses(item))
+        
+        def sort_key(item):
+            x0, _, y0, _ = item
+            band = bisect.bisect_left(spanning_ys, y0)
+            if crosses(item):
+                return (band, 1, 0, y0, x0)
+            return (band, 0, bisect.bisect_right(edges, x0), y0, x0)
+        
+        return [item[3] for item in sorted(items, key=sort_key)]
+
+    def _pdf_page_text(self, page, template_key: Tuple) -> str:
+        """Plain text of a page, reflowed column by column when the page has a multi-column layout"""
+        words = page.get_text("words")
+        gutters = self._page_gutters([(w[0], w[2], w[1]) for w in words], page.rect.width, template_key)
+        if not gutters:
+            return page.get_text()
+        
+        # Rebuild lines from words, splitting any line that runs across columns
+        edges = [(start + end) / 2 for start, end in gutters]
+        lines = {}
+        for x0, y0, x1, _, word, block_no, line_no, _ in words:
+            key = (block_no, line_no, bisect.bisect_right(edges, x0))
+            if key in lines:
+                entry = lines[key]
+                entry[1] = max(entry[1], x1)
+                entry[3].append(word)
+            else:
+                lines[key] = [x0, x1, y0, [word]]
+        
+        items = [(x0, x1, y0, " ".join(line_words)) for x0, x1, y0, line_words in lines.values()]
+        return "\n".join(self._reading_order(items, gutters)) + "\n"
+
+    def _extract_text_from_scanned_pdf(self, file_content: bytes, pages: Optional[List[Tuple[int, Optional[int]]]] = None,
+                                       max_questions: Optional[int] = None) -> str:
+        """Extract text from scanned PDF using OCR, limited to the given pages and stopping once
+        max_questions questions are complete"""
+        import fitz  # PyMuPDF
+        import numpy as np
+        import cv2
+        from PIL import Image
+        
         try:
             # Convert PDF to images using PyMuPDF
             pdf_doc = fitz.open(stream=file_content, filetype="pdf")
-            text = ""
+            buffer = PageBuffer()
             
-            for page_num in range(pdf_doc.page_count):
-                # Get page as image
+            # OCR text of each embedded image, by content hash, so repeated logos and headers are read once
+            image_texts = {}
+            use_embedded = os.environ.get("MCQ_OCR_EMBEDDED_IMAGES", "1").strip().lower() not in ("0", "false", "no")
+            scan = PageScan(pdf_doc.page_count, pages, max_questions)
+            for page_num in scan:
                 page = pdf_doc.load_page(page_num)  # Fixed: use load_page() instead of page()
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x scaling for better OCR
-                img_data = pix.tobytes("png")
-                
-                # Convert to PIL Image
-                image = Image.open(io.BytesIO(img_data))
-                
-                # Convert to OpenCV format for preprocessing
-                opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                
-                # Preprocess image for better OCR
-                processed_image = self.preprocess_image(opencv_image)
+                page_text = self._ocr_embedded_images(pdf_doc, page, image_texts) if use_embedded else None
                 
-                # Perform OCR
-                page_text = pytesseract.image_to_string(processed_image, config='--psm 6')
+                if page_text is None:
+                    # Get page as image
+                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x scaling for better OCR
+                    img_data = pix.tobytes("png")
+                    
+                    # Convert to PIL Image
+                    image = Image.open(io.BytesIO(img_data))
+                    
+                    # Convert to OpenCV format for preprocessing
+                    opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+                    
+                    # Preprocess image for better OCR
+                    processed_image = self.preprocess_image(opencv_image)
+                    
+                    page_text = self._ocr_image(processed_image)
                 
-                if page_text.strip():
-                    text += f"\n--- Page {page_num + 1} (OCR) ---\n{page_text}\n"
+                self._add_pdf_page(buffer, page_num, page_text, " (OCR)")
+                scan.count_questions(page_text)
             
             pdf_doc.close()
             
-            if not text.strip():
+            if not buffer and not _budget_exhausted():
                 raise ValueError("No text could be extracted from the scanned PDF")
             
-            return self._preprocess_text(text)
+            return buffer.getvalue()
             
+        except PageRangeError:
+            raise
         except Exception as e:
             raise ValueError(f"Error processing scanned PDF with OCR: {str(e)}")
 
-    def extract_text_from_docx(self, file_content: bytes) -> str:
-        """Extract text from DOCX file"""
-        try:
-            doc = Document(io.BytesIO(file_content))
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
-        except Exception as e:
-            raise ValueError(f"Error reading DOCX file: {str(e)}")
+    def _ocr_embedded_images(self, pdf_doc, page, image_texts: Dict[str, str]) -> Optional[str]:
+        """OCR the raster images placed on a page at their native resolution, in reading order.
+        Returns None when the page should be rendered instead: the images leave too much of the page
+        uncovered (vector text or drawings), are lower resolution than the 2x render, or cannot be decoded."""
+        import fitz  # PyMuPDF
+        import numpy as np
+        
+        page_rect = page.rect
+        placements = []
+        covered = 0.0
+        for image in page.get_images(full=True):
+            xref, width, height = image[0], image[2], image[3]
+            for rect in page.get_image_rects(xref):
+                rect = rect & page_rect
+                if rect.is_empty:
+                    continue
+                covered += rect.width * rect.height
+                # Icons and rules carry no text worth OCR-ing
+                if min(width, height) < OCR_EMBEDDED_MIN_PIXELS:
+                    continue
+                if width / (rect.width / 72) < OCR_EMBEDDED_MIN_DPI:
+                    return None
+                placements.append((rect.y0, rect.x0, xref))
+        
+        if not placements or covered < OCR_EMBEDDED_MIN_COVERAGE * page_rect.width * page_rect.height:
+            return None
+        
+        texts = []
+        for _, _, xref in sorted(placements):
+            digest = hashlib.sha1(pdf_doc.xref_stream_raw(xref) or b"").hexdigest()
+            text = image_texts.get(digest)
+            if text is None:
+                try:
+                    with stage_timer("ocr_image", "embedded"):
+                        pix = fitz.Pixmap(pdf_doc, xref)
+                        if pix.colorspace is None:
+                            # Stencil masks have no colour data to OCR
+                            return None
+                        if pix.alpha:
+                            pix = fitz.Pixmap(pix, 0)
+                        if pix.colorspace.n != 1:
+                            pix = fitz.Pixmap(fitz.csGRAY, pix)
+                        gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+                except Exception as e:
+                    logger.warning("Rendering page %d instead of its image (xref %d): %s", page.number + 1, xref, e)
+                    return None
+                text = self._ocr_image(self.preprocess_image(gray))
+                image_texts[digest] = text
+            texts.append(text)
+        return "".join(texts)
+
+    def extract_text_from_docx(self, file_content: bytes) -> str:
+        """Extract text from DOCX file in body order, including tables and list numbering"""
+        from docx import Document
+        
+        try:
+            doc = Document(io.BytesIO(file_content))
+            # DOCX has no fixed pages, so the text is a single unpaged segment
+            buffer = PageBuffer()
+            for kind, block in self._iter_docx_blocks(doc):
+                if _budget_expired():
+                    break
+                if kind == "paragraph":
+                    text, label, _ = block
+                    buffer.add_line(f"{label} {text}" if label else text)
+                else:
+                    for row in block:
+                        for line in self._docx_row_lines(row):
+                            buffer.add_line(line)
+            return buffer.getvalue()
+        except Exception as e:
+            raise ValueError(f"Error reading DOCX file: {str(e)}")
+
+    def extract_mcqs_from_docx(self, file_content: bytes, max_questions: Optional[int] = None) -> Optional[List[MCQ]]:
+        """Build MCQs from Word list numbering (numbered questions, lettered options) and
+        Question/A/B/C/D header tables; returns None to fall back to text parsing"""
+        from docx import Document
+        
+        try:
+            doc = Document(io.BytesIO(file_content))
+        except Exception:
+            # Let the text extractor report the error
+            return None
+        
+        mcqs = []
+        leftover = []
+        current = None
+        
+        for kind, block in self._iter_docx_blocks(doc):
+            # Another question after max_questions means the first ones are complete
+            if _budget_expired() or (max_questions and len(mcqs) > max_questions):
+                break
+            if kind == "table":
+                columns = self._match_mcq_columns(tuple(block[0])) if block else None
+                if columns:
+                    for row in block[1:]:
+                        mcq = self._mcq_from_row(tuple(row), columns, len(mcqs) + 1)
+                        if mcq:
+                            mcqs.append(mcq)
+                    current = None
+                elif current is not None:
+                    # Options laid out as a grid under a numbered question
+                    for row in block:
+                        for cell in row:
+                            self._add_docx_option(current, cell, assign_next_letter=True)
+                else:
+                    leftover.extend(line for row in block for line in self._docx_row_lines(row))
+                continue
+            
+            text, label, list_format = block
+            text = text.strip()
+            if not text:
+                continue
+            
+            if label and list_format == 'decimal':
+                number_match = re.search(r'\d+', label)
+                current = MCQ(
+                    question_number=int(number_match.group(0)) if number_match else len(mcqs) + 1,
+                    question=text,
+                    options={}
+                )
+                mcqs.append(current)
+            elif label and list_format in ('upperLetter', 'lowerLetter') and current is not None:
+                letter = re.search(r'[A-Za-z]', label).group(0).upper()
+                current.options[letter] = text
+            elif current is not None and self._docx_answer_pattern.match(text):
+                current.correct_answer = self._docx_answer_pattern.match(text).group(1).upper()
+            elif current is not None and self._add_docx_option(current, text):
+                continue
+            elif current is not None and not current.options:
+                # Question stem continued on the next paragraph
+                current.question = f"{current.question} {text}"
+            else:
+                leftover.append(text)
+        
+        mcqs = [mcq for mcq in mcqs if mcq.options]
+        # Numbered questions typed as plain text mean the numbering is not used consistently
+        if not mcqs or any(self._docx_typed_question_pattern.match(line) for line in leftover):
+            return None
+        
+        answer_key = self._extract_answer_key(leftover)
+        for mcq in mcqs:
+            mcq.options = self._validate_options(mcq.options)
+            if mcq.correct_answer is None:
+                mcq.correct_answer = answer_key.get(mcq.question_number)
+        
+        return mcqs
+
+    def _add_docx_option(self, mcq: MCQ, text: str, assign_next_letter: bool = False) -> bool:
+        """Add a typed option ("A. text", "(b) text") to the question; with assign_next_letter,
+        unlabelled text (e.g. a table cell) takes the next free option letter"""
+        text = text.strip()
+        if not text or len(mcq.options) >= 4:
+            return False
+        for pattern in self.option_patterns:
+            match = re.match(pattern, text)
+            if match:
+                mcq.options[match.group(1).upper()] = match.group(2).strip()
+                return True
+        if assign_next_letter:
+            letter = next(letter for letter in 'ABCD' if letter not in mcq.options)
+            mcq.options[letter] = text
+            return True
+        return False
+
+    def _docx_row_lines(self, row: List[str]) -> List[str]:
+        """Lines for one table row: one per cell, keeping a bare question number (first cell, followed by text)
+        or option label with the cell after it. Other numeric cells are content, such as numeric options."""
+        cells = [cell for cell in row if cell]
+        lines = []
+        label = None
+        for index, cell in enumerate(cells):
+            if label:
+                lines.append(f"{label} {cell}")
+                label = None
+            elif index == len(cells) - 1:
+                lines.append(cell)
+            elif index == 0 and re.match(r'^\d+[\.\)]?$', cell) and not re.match(r'^[\d\s\.,/%-]+$', cells[1]):
+                label = cell if cell[-1] in '.)' else f"{cell}."
+            elif re.match(r'^\(?[A-Da-d][\.\)]?$', cell):
+                label = cell if cell[-1] in '.)' else f"{cell})"
+            else:
+                lines.append(cell)
+        return lines
+
+    def _iter_docx_blocks(self, doc):
+        """Yield body content in document order as ("paragraph", (text, list_label, list_format))
+        or ("table", rows of cell texts)"""
+        from docx.oxml.ns import qn
+        from docx.text.paragraph import Paragraph
+        
+        numbering = self._docx_numbering_levels(doc)
+        style_numbering = self._docx_style_numbering(doc)
+        counters = {}
+        
+        for child in doc.element.body.iterchildren():
+            if child.tag == qn('w:p'):
+                paragraph = Paragraph(child, doc)
+                label, list_format = self._docx_list_label(paragraph, numbering, counters, style_numbering)
+                yield "paragraph", (paragraph.text, label, list_format)
+            elif child.tag == qn('w:tbl'):
+                rows = []
+                # Walk w:tc elements directly so merged cells are not repeated
+                for tr in child.iterchildren(qn('w:tr')):
+                    rows.append([
+                        "\n".join(Paragraph(p, doc).text for p in tc.iterchildren(qn('w:p'))).strip()
+                        for tc in tr.iterchildren(qn('w:tc'))
+                    ])
+                yield "table", rows
+
+    def _docx_numbering_levels(self, doc) -> Dict[str, Dict[int, Tuple[str, str, int]]]:
+        """Map numId -> ilvl -> (numFmt, lvlText, start) from the document's numbering definitions"""
+        from docx.oxml.ns import qn
+        
+        try:
+            numbering = doc.part.numbering_part.element
+        except (KeyError, NotImplementedError):
+            return {}
+        
+        abstract_levels = {}
+        for abstract_num in numbering.iterchildren(qn('w:abstractNum')):
+            levels = {}
+            for lvl in abstract_num.iterchildren(qn('w:lvl')):
+                ilvl = int(lvl.get(qn('w:ilvl')))
+                num_fmt = lvl.find(qn('w:numFmt'))
+                lvl_text = lvl.find(qn('w:lvlText'))
+                start = lvl.find(qn('w:start'))
+                levels[ilvl] = (
+                    num_fmt.get(qn('w:val')) if num_fmt is not None else 'decimal',
+                    lvl_text.get(qn('w:val')) if lvl_text is not None else f'%{ilvl + 1}.',
+                    int(start.get(qn('w:val'))) if start is not None else 1
+                )
+            abstract_levels[abstract_num.get(qn('w:abstractNumId'))] = levels
+        
+        levels_by_num = {}
+        for num in numbering.iterchildren(qn('w:num')):
+            abstract_id = num.find(qn('w:abstractNumId'))
+            if abstract_id is not None:
+                levels_by_num[num.get(qn('w:numId'))] = abstract_levels.get(abstract_id.get(qn('w:val')), {})
+        return levels_by_num
+
+    def _docx_style_numbering(self, doc) -> Dict[str, Any]:
+        """Map styleId -> numPr for paragraph styles that carry list numbering (e.g. "List Number").
+        Built once per document because resolving paragraph.style searches every style."""
+        from docx.oxml.ns import qn
+        
+        style_numbering = {}
+        for style in doc.styles.element.iterchildren(qn('w:style')):
+            p_pr = style.pPr
+            if p_pr is not None and p_pr.numPr is not None:
+                style_numbering[style.get(qn('w:styleId'))] = p_pr.numPr
+        return style_numbering
+
+    def _docx_list_label(self, paragraph, numbering: Dict, counters: Dict, style_numbering: Dict) -> Tuple[Optional[str], Optional[str]]:
+        """Resolve the rendered list label ("1.", "(b)") and number format of a paragraph, advancing the list counters"""
+        p_pr = paragraph._p.pPr
+        num_pr = p_pr.numPr if p_pr is not None else None
+        if num_pr is None and p_pr is not None and p_pr.pStyle is not None:
+            # Numbering inherited from the paragraph style
+            num_pr = style_numbering.get(p_pr.pStyle.val)
+        if num_pr is None or num_pr.numId is None:
+            return None, None
+        
+        num_id = str(num_pr.numId.val)
+        ilvl = num_pr.ilvl.val if num_pr.ilvl is not None else 0
+        levels = numbering.get(num_id)
+        if not levels or ilvl not in levels:
+            return None, None
+        
+        list_format, label, start = levels[ilvl]
+        level_counters = counters.setdefault(num_id, {})
+        level_counters[ilvl] = level_counters.get(ilvl, start - 1) + 1
+        for deeper in [level for level in level_counters if level > ilvl]:
+            del level_counters[deeper]
+        
+        if list_format in ('bullet', 'none'):
+            return None, list_format
+        
+        for level, (level_format, _, level_start) in levels.items():
+            placeholder = f'%{level + 1}'
+            if placeholder in label:
+                label = label.replace(placeholder, self._format_list_number(level_counters.get(level, level_start), level_format))
+        return label, list_format
+
+    def _format_list_number(self, number: int, list_format: str) -> str:
+        """Render a list counter in a Word number format"""
+        if list_format in ('upperLetter', 'lowerLetter'):
+            letters = ''
+            while number > 0:
+                number, remainder = divmod(number - 1, 26)
+                letters = chr(65 + remainder) + letters
+            return letters if list_format == 'upperLetter' else letters.lower()
+        if list_format in ('upperRoman', 'lowerRoman'):
+            numerals = ''
+            for value, numeral in ((1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+                                   (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')):
+                count, number = divmod(number, value)
+                numerals += numeral * count
+            return numerals if list_format == 'upperRoman' else numerals.lower()
+        return str(number)
 
     def extract_text_from_xlsx(self, file_content: bytes) -> str:
-        """Extract text from Excel file"""
+        """Extract text from Excel file, streaming rows in read-only mode"""
+        import openpyxl
+        
         try:
-            workbook = openpyxl.load_workbook(io.BytesIO(file_content))
-            text = ""
-            
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text += f"\n--- Sheet: {sheet_name} ---\n"
+            workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+            try:
+                buffer = PageBuffer()
+                for sheet in workbook.worksheets:
+                    buffer.start_page(sheet.title, f"--- Sheet: {sheet.title} ---")
+                    
+                    for row in sheet.iter_rows(values_only=True):
+                        if _budget_expired():
+                            break
+                        row_text = [str(cell) for cell in row if cell is not None]
+                        if row_text:
+                            buffer.add_line(" | ".join(row_text))
                 
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = []
-                    for cell in row:
-                        if cell is not None:
-                            row_text.append(str(cell))
-                    if row_text:
-                        text += " | ".join(row_text) + "\n"
-            
-            return text
+                return buffer.getvalue()
+            finally:
+                workbook.close()
         except Exception as e:
             raise ValueError(f"Error reading Excel file: {str(e)}")
 
+    def extract_mcqs_from_xlsx(self, file_content: bytes, max_questions: Optional[int] = None) -> Optional[List[MCQ]]:
+        """Build MCQs straight from spreadsheet rows when every non-empty sheet has a
+        Question/A/B/C/D(/Answer) header row; returns None to fall back to text parsing"""
+        import openpyxl
+        
+        try:
+            workbook = openpyxl.load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+        except Exception:
+            # Let the text extractor report the error
+            return None
+        
+        try:
+            # Check every sheet's header before consuming any data rows
+            sheets = []
+            for sheet in workbook.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                header = next((row for row in rows if any(cell is not None for cell in row)), None)
+                if header is None:
+                    continue
+                columns = self._match_mcq_columns(header)
+                if columns is None:
+                    return None
+                sheets.append((rows, columns))
+            
+            mcqs = []
+            for rows, columns in sheets:
+                for row in rows:
+                    if _budget_expired() or (max_questions and len(mcqs) >= max_questions):
+                        break
+                    mcq = self._mcq_from_row(row, columns, len(mcqs) + 1)
+                    if mcq:
+                        mcqs.append(mcq)
+            
+            return mcqs or None
+        finally:
+            workbook.close()
+
+    def _match_mcq_columns(self, header: tuple) -> Optional[Dict[str, int]]:
+        """Map MCQ fields to column indexes from a header row, or None if it is not an MCQ header"""
+        columns = {}
+        for index, cell in enumerate(header):
+            if cell is None:
+                continue
+            name = re.sub(r'[^a-z0-9 ]', '', str(cell).lower().replace('_', ' ')).strip()
+            name = re.sub(r'\s+', ' ', name)
+            for column, aliases in self.column_aliases.items():
+                if name in aliases and column not in columns:
+                    columns[column] = index
+                    break
+        
+        option_columns = sum(1 for letter in 'ABCD' if letter in columns)
+        if 'question' not in columns or option_columns < 2:
+            return None
+        return columns
+
+    def _mcq_from_row(self, row: tuple, columns: Dict[str, int], default_number: int) -> Optional[MCQ]:
+        """Build one MCQ from a spreadsheet row using the column map"""
+        def cell(column):
+            index = columns.get(column)
+            if index is None or index >= len(row) or row[index] is None:
+                return None
+            value = str(row[index]).strip()
+            return value or None
+        
+        question = cell('question')
+        if not question:
+            return None
+        
+        options = {}
+        for letter in 'ABCD':
+            value = cell(letter)
+            if value is not None:
+                options[letter] = value
+        if not options:
+            return None
+        
+        number = cell('number')
+        number_match = re.match(r'^\D*(\d+)', number) if number else None
+        question_number = int(number_match.group(1)) if number_match else default_number
+        
+        return MCQ(
+            question_number=question_number,
+            question=question,
+            options=self._validate_options(options),
+            correct_answer=self._normalize_answer(cell('answer'), options)
+        )
+
+    def _normalize_answer(self, answer: Optional[str], options: Dict[str, str]) -> Optional[str]:
+        """Turn an answer cell ("b", "Option B", "(B)" or the option text) into an option letter"""
+        if not answer:
+            return None
+        letter_match = re.match(r'^(?:option\s*)?\(?([A-Da-d])\)?[\.\)]?$', answer, re.IGNORECASE)
+        if letter_match:
+            return letter_match.group(1).upper()
+        for letter, text in options.items():
+            if answer.lower() == text.lower():
+                return letter
+        return None
+
     def extract_text_from_txt(self, file_content: bytes) -> str:
         """Extract text from plain text file"""
         try:
@@ -211,30 +2622,195 @@ class MCQExtractor:
             except Exception as e:
                 raise ValueError(f"Error reading text file: {str(e)}")
 
-    def extract_text_from_image(self, file_content: bytes) -> str:
-        """Extract text from image using OCR"""
+    def extract_text_from_image(self, file_content: bytes, pages: Optional[List[Tuple[int, Optional[int]]]] = None,
+                                max_questions: Optional[int] = None) -> str:
+        """Extract text from image using OCR. Multi-page TIFFs and animated GIF/WebP images are OCR'd
+        frame by frame as pages, decoding one frame at a time."""
+        from PIL import Image
+        
         try:
-            # Load image from bytes
             image = Image.open(io.BytesIO(file_content))
+            frame_count = getattr(image, "n_frames", 1)
+            if frame_count == 1:
+                if pages is not None:
+                    # Ranges beyond the only frame are rejected as for a one-page PDF
+                    PageScan(1, pages)
+                with stage_timer("decode_image"):
+                    gray = self._decode_image_for_ocr(image)
+                
+                # Preprocess image to improve OCR accuracy
+                processed_image = self.preprocess_image(gray)
+                
+                return self._ocr_image(processed_image)
             
-            # Convert PIL image to OpenCV format for preprocessing
-            opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            # Preprocess image to improve OCR accuracy
-            processed_image = self.preprocess_image(opencv_image)
-            
-            # Perform OCR
-            text = pytesseract.image_to_string(processed_image, config='--psm 6')
-            
-            return text
+            buffer = PageBuffer()
+            scan = PageScan(frame_count, pages, max_questions)
+            for frame_num in scan:
+                # Seeking replaces the decoded frame, so only the current one is held in memory
+                with stage_timer("decode_image"):
+                    image.seek(frame_num)
+                    gray = self._decode_image_for_ocr(image)
+                page_text = self._ocr_image(self.preprocess_image(gray))
+                del gray
+                self._add_pdf_page(buffer, frame_num, page_text, " (OCR)")
+                scan.count_questions(page_text)
+            return buffer.getvalue()
+        except PageRangeError:
+            raise
         except Exception as e:
             raise ValueError(f"Error reading image: {str(e)}")
 
+    def _ocr_image(self, image) -> str:
+        """OCR a preprocessed image word by word, then re-read only the lines Tesseract was unsure of
+        (low word confidence or a doubtful option label) at a higher scale, all in one more call"""
+        pytesseract = _import_pytesseract()
+        
+        with stage_timer("ocr", "tesseract"):
+            data = pytesseract.image_to_data(image, config='--psm 6', output_type=pytesseract.Output.DICT)
+        lines = self._ocr_lines(data)
+        
+        recheck = self._select_ocr_rechecks(image, lines)
+        if recheck and not _budget_expired():
+            metrics.count_fallback("tesseract", "tesseract_line", count=len(recheck))
+            with stage_timer("ocr", "tesseract_line"):
+                self._recheck_ocr_lines(image, recheck)
+        
+        # Blank line between paragraphs, as image_to_string lays them out
+        output = []
+        for index, line in enumerate(lines):
+            if index and line.paragraph != lines[index - 1].paragraph:
+                output.append("")
+            output.append(" ".join(line.words))
+        return "\n".join(output) + "\n" if output else ""
+
+    def _ocr_lines(self, data: Dict[str, list]) -> List[OCRLine]:
+        """Group image_to_data word rows into lines in reading order"""
+        lines: Dict[Tuple[int, int, int], OCRLine] = {}
+        for i, word in enumerate(data["text"]):
+            word = str(word).strip()
+            # Level 5 rows are words; the others describe pages, blocks, paragraphs and lines
+            if int(data["level"][i]) != 5 or not word:
+                continue
+            confidence = float(data["conf"][i])
+            left, top = int(data["left"][i]), int(data["top"][i])
+            right, bottom = left + int(data["width"][i]), top + int(data["height"][i])
+            key = (int(data["block_num"][i]), int(data["par_num"][i]), int(data["line_num"][i]))
+            line = lines.get(key)
+            if line is None:
+                lines[key] = OCRLine(key[:2], [word], [confidence], left, top, right, bottom)
+            else:
+                line.words.append(word)
+                line.confidences.append(confidence)
+                line.left, line.top = min(line.left, left), min(line.top, top)
+                line.right, line.bottom = max(line.right, right), max(line.bottom, bottom)
+        return list(lines.values())
+
+    def _select_ocr_rechecks(self, image, lines: List[OCRLine]) -> List[OCRLine]:
+        """Lines to re-read, least confident first, within OCR_MAX_RECHECK_LINES and OCR_RECHECK_MAX_AREA"""
+        area_left = image.shape[0] * image.shape[1] * OCR_RECHECK_MAX_AREA
+        selected = []
+        for line in sorted((line for line in lines if self._needs_ocr_recheck(line)), key=lambda line: min(line.confidences)):
+            area = ((line.right - line.left + 2 * OCR_RECHECK_PADDING) * (line.bottom - line.top + 2 * OCR_RECHECK_PADDING)
+                    * OCR_RECHECK_SCALE ** 2)
+            if area > area_left:
+                continue
+            area_left -= area
+            selected.append(line)
+            if len(selected) >= OCR_MAX_RECHECK_LINES:
+                break
+        return selected
+
+    def _needs_ocr_recheck(self, line: OCRLine) -> bool:
+        if min(line.confidences) < OCR_RECHECK_CONFIDENCE:
+            return True
+        return bool(OCR_LABEL_PATTERN.match(line.words[0])) and line.confidences[0] < OCR_LABEL_CONFIDENCE
+
+    def _recheck_ocr_lines(self, image, lines: List[OCRLine]):
+        """OCR the regions of the given lines again in a single Tesseract call: each region is upscaled and
+        stacked below the previous one on a white strip, and the words read inside a region replace its
+        line's words when Tesseract is more confident in them"""
+        import numpy as np
+        import cv2
+        pytesseract = _import_pytesseract()
+        
+        height, width = image.shape[:2]
+        regions = []  # (line, upscaled region, its top in the strip)
+        strip_height = OCR_RECHECK_GAP
+        for line in lines:
+            top, bottom = max(line.top - OCR_RECHECK_PADDING, 0), min(line.bottom + OCR_RECHECK_PADDING, height)
+            left, right = max(line.left - OCR_RECHECK_PADDING, 0), min(line.right + OCR_RECHECK_PADDING, width)
+            if bottom <= top or right <= left:
+                continue
+            region = cv2.resize(image[top:bottom, left:right], None, fx=OCR_RECHECK_SCALE, fy=OCR_RECHECK_SCALE,
+                                interpolation=cv2.INTER_CUBIC)
+            regions.append((line, region, strip_height))
+            strip_height += region.shape[0] + OCR_RECHECK_GAP
+        if not regions:
+            return
+        
+        strip_width = max(region.shape[1] for _, region, _ in regions) + 2 * OCR_RECHECK_GAP
+        strip = np.full((strip_height, strip_width) + image.shape[2:], 255, dtype=image.dtype)
+        for _, region, top in regions:
+            strip[top:top + region.shape[0], OCR_RECHECK_GAP:OCR_RECHECK_GAP + region.shape[1]] = region
+        
+        data = pytesseract.image_to_data(strip, config='--psm 6', output_type=pytesseract.Output.DICT)
+        
+        # Words belong to the region their vertical centre falls in, and are put back in left-to-right order.
+        # Centres in a region's padding are fragments of the neighbouring lines on the page.
+        region_tops = [top for _, _, top in regions]
+        margin = OCR_RECHECK_PADDING * OCR_RECHECK_SCALE
+        reads: List[List[Tuple[int, str, float]]] = [[] for _ in regions]
+        for i, word in enumerate(data["text"]):
+            word = str(word).strip()
+            if int(data["level"][i]) != 5 or not word:
+                continue
+            centre = int(data["top"][i]) + int(data["height"][i]) / 2
+            index = bisect.bisect_right(region_tops, centre) - 1
+            if index < 0 or not region_tops[index] + margin <= centre <= region_tops[index] + regions[index][1].shape[0] - margin:
+                continue
+            reads[index].append((int(data["left"][i]), word, float(data["conf"][i])))
+        
+        for (line, _, _), words in zip(regions, reads):
+            if not words:
+                continue
+            words.sort(key=lambda word: word[0])
+            confidences = [confidence for _, _, confidence in words]
+            if sum(confidences) / len(confidences) > line.confidence:
+                line.words = [text for _, text, _ in words]
+                line.confidences = confidences
+
+    def _decode_image_for_ocr(self, image):
+        """Decode an opened image (its current frame) as upright grayscale, scaled down by _ocr_image_scale.
+        JPEGs at least twice too large are decoded at 1/2, 1/4 or 1/8 scale in draft mode."""
+        import numpy as np
+        from PIL import ImageOps
+        
+        # Draft mode picks the smallest DCT scale that still covers the requested size in both dimensions
+        scale = self._ocr_image_scale(image.size)
+        if scale < 1:
+            image.draft('L', (max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'L':
+            image = image.convert('L')
+        # Formats without draft decoding are box-reduced by a whole factor
+        factor = int(1 / self._ocr_image_scale(image.size))
+        if factor > 1:
+            image = image.reduce(factor)
+        return np.asarray(image)
+
+    def _ocr_image_scale(self, size: Tuple[int, int]) -> float:
+        """Scale (at most 1) that brings the long side to OCR_IMAGE_TARGET_SIDE, but never takes the short side
+        below OCR_IMAGE_MIN_SHORT_SIDE: a 1170x4000 screenshot is already as small as its text allows"""
+        return min(1.0, max(OCR_IMAGE_TARGET_SIDE / max(size), OCR_IMAGE_MIN_SHORT_SIDE / min(size)))
+
     def preprocess_image(self, image):
-        """Preprocess image to improve OCR accuracy"""
+        """Preprocess image to improve OCR accuracy (BGR or grayscale input)"""
+        import numpy as np
+        import cv2
+        
         try:
             # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             
             # Apply Gaussian blur to reduce noise (lighter blur)
             blurred = cv2.GaussianBlur(gray, (3, 3), 0)
@@ -257,46 +2833,112 @@ class MCQExtractor:
             
             return processed
         except Exception as e:
-            print(f"Error in image preprocessing: {e}")
+            logger.warning("Error in image preprocessing: %s", e)
             # Return simple grayscale if preprocessing fails
-            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-    def parse_mcqs(self, text: str) -> List[Dict[str, Any]]:
-        """Parse MCQs from text with enhanced extraction"""
-        mcqs = []
-        
-        # Preprocess the text
-        text = self._preprocess_text(text)
+    def parse_mcqs(self, text: str, fingerprint: Optional[str] = None, max_questions: Optional[int] = None,
+                   document: Optional[DocumentIndex] = None, learn: bool = True) -> List[MCQ]:
+        """Parse MCQs from text with enhanced extraction. With a document fingerprint, a known
+        template is parsed with only the patterns that worked for it before, falling back to the full set.
+        With max_questions, parsing stops once that many questions have been assembled.
+        document is the text's index from index_document, built here when not given.
+        learn=False keeps a parse of only part of a document from updating its template's profile."""
+        if document is None:
+            document = self.index_document(text)
+        profile = self.profiles.get(fingerprint)
+        if profile and profile.question_patterns and profile.option_patterns:
+            patterns = self._pattern_set(profile.question_patterns, profile.option_patterns)
+            with stage_timer("parse", "profile"):
+                mcqs = self._parse_mcqs_with_patterns(document, patterns, max_questions)
+            if _budget_exhausted():
+                return mcqs
+            if self._is_confident_parse(mcqs):
+                self.profiles.record_hit(fingerprint)
+                return mcqs
+            metrics.count_fallback("profile", "full")
         
-        # Split into lines and clean
-        lines = text.split('\n')
-        clean_lines = []
+        patterns = self._pattern_set()
+        with stage_timer("parse", "full"):
+            mcqs = self._parse_mcqs_with_patterns(document, patterns, max_questions)
+        # A truncated parse has not seen every pattern the template uses
+        if fingerprint and learn and not max_questions and self._is_confident_parse(mcqs) and not _budget_exhausted():
+            self.profiles.learn_patterns(fingerprint, patterns)
+        return mcqs
+
+    def _pattern_set(self, question_indexes: Optional[List[int]] = None, option_indexes: Optional[List[int]] = None) -> PatternSet:
+        """Patterns for one parse: the full lists, or the given subsets in their original order"""
+        def select(patterns, indexes):
+            if indexes is None:
+                return list(enumerate(patterns))
+            return [(index, patterns[index]) for index in indexes if index < len(patterns)]
+        return PatternSet(
+            question=select(self.question_patterns, question_indexes),
+            option=select(self.option_patterns, option_indexes)
+        )
+
+    def _is_confident_parse(self, mcqs: List[MCQ]) -> bool:
+        """A parse is trusted for learning/fast-path use when nearly every question has at least two options"""
+        return bool(mcqs) and sum(1 for mcq in mcqs if len(mcq.options) >= 2) >= 0.8 * len(mcqs)
+
+    def document_for_analysis(self, file_content: bytes, spec: ExtractorSpec, document: DocumentIndex,
+                              pages: Optional[List[Tuple[int, Optional[int]]]] = None) -> DocumentIndex:
+        """The document to run document-level content analysis on. Structured readers index only their
+        MCQs, so the whole text (instructions, passages, headings) of a DOCX or XLSX is read with the format's
+        text extractor while the time budget lasts. Otherwise the MCQ text stands in, as it does for
+        layout-segmented PDFs, where the text pass could mean a second read of every page or OCR."""
+        if not document.questions_only or "structured" not in spec.capabilities or _budget_expired():
+            return document
+        with stage_timer("extract_text", spec.method):
+            text = getattr(self, spec.method)(file_content, **self._page_options(spec, pages))
+        if not text.strip() or _budget_expired():
+            return document
+        return self.index_document(text)
+
+    def index_document(self, text: str) -> DocumentIndex:
+        """Preprocess a document's text once and index it for parsing, answer matching and content analysis.
+        Paged text is preprocessed page by page, keeping its page offsets, unless its extractor already did."""
+        with stage_timer("preprocess"):
+            if isinstance(text, PageText) and text.pages:
+                if not text.preprocessed:
+                    buffer = PageBuffer()
+                    buffer.preprocessed = True
+                    for index, (label, start, _) in enumerate(text.pages):
+                        if _budget_expired():
+                            break
+                        buffer.start_page(label, text[start:text.body_starts[index]].rstrip('\n') or None)
+                        body = self._preprocess_text(text.page_body(index))
+                        if body:
+                            buffer.add_line(body)
+                    text = buffer.getvalue()
+            else:
+                text = self._preprocess_text(text)
+        return DocumentIndex(text, self._clean_ocr_errors)
+
+    def _parse_mcqs_with_patterns(self, document: DocumentIndex, patterns: PatternSet, max_questions: Optional[int] = None) -> List[MCQ]:
+        """Parse MCQs from an indexed document using the given question/option patterns, stopping after max_questions questions"""
+        mcqs = []
         
-        for line in lines:
-            line = line.strip()
-            if line:
-                clean_lines.append(line)
+        clean_lines = document.content_lines
+        # Lines with OCR errors cleaned, each computed once
+        ocr_clean_lines = document.cleaned_lines
         
         i = 0
         while i < len(clean_lines):
-            line = clean_lines[i]
-            
-            # Skip empty lines
-            if not line:
-                i += 1
-                continue
-            
-            # Clean OCR errors for this line
-            line = self._clean_ocr_errors(line)
+            if _budget_expired() or (max_questions and len(mcqs) >= max_questions):
+                break
+            line = ocr_clean_lines[i]
+            question_index = i
             
             # Try to match this line as a question
             question_match = None
             question_text = ""
             question_number = None
             
-            for pattern in self.question_patterns:
+            for index, pattern in patterns.question:
                 match = re.match(pattern, line)
                 if match:
+                    patterns.matched_question.add(index)
                     question_match = match
                     if len(match.groups()) == 1:
                         # Pattern without number group
@@ -312,7 +2954,7 @@ class MCQExtractor:
             
             if question_match and question_text:
                 # Found a question - now collect options using enhanced method
-                current_options, next_i = self._extract_options_with_context(clean_lines, i + 1)
+                current_options, next_i = self._extract_options_with_context(clean_lines, i + 1, patterns, ocr_clean_lines)
                 
                 # If we didn't get enough options, try the original method as fallback
                 if len(current_options) < 2:
@@ -324,8 +2966,7 @@ class MCQExtractor:
                     
                     # Collect options from following lines
                     while j < len(clean_lines) and len(current_options) < 4:
-                        next_line = clean_lines[j]
-                        next_line = self._clean_ocr_errors(next_line)
+                        next_line = ocr_clean_lines[j]
                         
                         # Check if this line contains options
                         if self._contains_multiple_options(next_line):
@@ -337,9 +2978,10 @@ class MCQExtractor:
                         
                         # Check if this is a single option
                         is_single_option = False
-                        for pattern in self.option_patterns:
+                        for index, pattern in patterns.option:
                             option_match = re.match(pattern, next_line)
                             if option_match:
+                                patterns.matched_option.add(index)
                                 option_letter = option_match.group(1).upper()
                                 option_text = option_match.group(2).strip()
                                 current_options[option_letter] = option_text
@@ -352,8 +2994,9 @@ class MCQExtractor:
                         
                         # Check if this is a new question
                         is_new_question = False
-                        for pattern in self.question_patterns:
+                        for index, pattern in patterns.question:
                             if re.match(pattern, next_line):
+                                patterns.matched_question.add(index)
                                 is_new_question = True
                                 break
                         
@@ -370,22 +3013,23 @@ class MCQExtractor:
                 if current_options:
                     current_options = self._validate_options(current_options)
                     
-                    mcq = {
-                        "question_number": question_number,
-                        "question": question_text.strip(),
-                        "options": current_options,
-                        "correct_answer": None  # Will be filled by enhanced answer extraction
-                    }
-                    
-                    mcqs.append(mcq)
+                    # correct_answer is filled by enhanced answer extraction
+                    mcqs.append(MCQ(
+                        question_number=question_number,
+                        question=question_text.strip(),
+                        options=current_options,
+                        page=document.page_of_line(document.content_line_numbers[question_index])
+                    ))
             else:
                 i += 1
         
         # Sort questions by question number to maintain order
-        mcqs.sort(key=lambda x: x['question_number'])
+        mcqs.sort(key=lambda x: x.question_number)
+        mcqs = mcqs[:max_questions]
         
         # Apply enhanced answer extraction
-        mcqs = self._enhance_answer_extraction(text, mcqs)
+        with stage_timer("answer_matching"):
+            self._enhance_answer_extraction(document, mcqs)
         
         return mcqs
 
@@ -541,8 +3185,11 @@ class MCQExtractor:
         
         return options
 
-    def _extract_options_with_context(self, lines: List[str], start_index: int) -> Tuple[Dict[str, str], int]:
-        """Extract options with surrounding context to handle incomplete options"""
+    def _extract_options_with_context(self, lines: List[str], start_index: int, patterns: Optional[PatternSet] = None,
+                                      cleaned_lines: Optional[Sequence[str]] = None) -> Tuple[Dict[str, str], int]:
+        """Extract options with surrounding context to handle incomplete options.
+        cleaned_lines, when given, holds each line already passed through _clean_ocr_errors."""
+        patterns = patterns or self._pattern_set()
         options = {}
         current_index = start_index
         
@@ -559,16 +3206,17 @@ class MCQExtractor:
                 continue
                 
             # Clean the line
-            clean_line = self._clean_ocr_errors(line)
+            clean_line = cleaned_lines[line_index] if cleaned_lines is not None else self._clean_ocr_errors(line)
             
             # Check if this is a new question (stop processing)
-            for pattern in self.question_patterns:
+            for index, pattern in patterns.question:
                 if re.match(pattern, clean_line):
+                    patterns.matched_question.add(index)
                     if len(options) > 0:  # Only stop if we found some options
                         return options, line_index
             
             # Try to extract options from this line
-            line_options = self._extract_options_from_single_line(clean_line, line_index, lines)
+            line_options = self._extract_options_from_single_line(clean_line, line_index, lines, patterns)
             
             if line_options:
                 options.update(line_options)
@@ -584,8 +3232,9 @@ class MCQExtractor:
         
         return options, current_index
 
-    def _extract_options_from_single_line(self, line: str, line_index: int, all_lines: List[str]) -> Dict[str, str]:
+    def _extract_options_from_single_line(self, line: str, line_index: int, all_lines: List[str], patterns: Optional[PatternSet] = None) -> Dict[str, str]:
         """Extract options from a single line with context awareness"""
+        patterns = patterns or self._pattern_set()
         options = {}
         
         # Pattern to match incomplete options like "A. Rs." or "B. BS."
@@ -612,9 +3261,10 @@ class MCQExtractor:
                 continue
         
         # Standard option extraction
-        for pattern in self.option_patterns:
+        for index, pattern in patterns.option:
             match = re.match(pattern, line)
             if match:
+                patterns.matched_option.add(index)
                 letter = match.group(1).upper()
                 text = match.group(2).strip()
                 
@@ -659,72 +3309,86 @@ class MCQExtractor:
             
         return None
 
-    def _enhance_answer_extraction(self, text: str, mcqs: List[Dict]) -> List[Dict]:
-        """Enhanced answer extraction with multiple strategies"""
-        enhanced_mcqs = []
-        
+    def _enhance_answer_extraction(self, document: DocumentIndex, mcqs: List[MCQ]) -> List[MCQ]:
+        """Enhanced answer extraction with multiple strategies, filling answers in place"""
         # Strategy 1: Look for answer key section
-        answer_key = self._extract_answer_key(text)
+        answer_key = self._extract_answer_key(document.lines)
         
-        for i, mcq in enumerate(mcqs):
-            enhanced_mcq = mcq.copy()
-            
+        for mcq in mcqs:
             # Try to find answer from answer key
-            if answer_key and mcq.get('question_number'):
-                q_num = mcq['question_number']
-                if q_num in answer_key:
-                    enhanced_mcq['correct_answer'] = answer_key[q_num]
-                    enhanced_mcqs.append(enhanced_mcq)
-                    continue
+            if answer_key and mcq.question_number in answer_key:
+                mcq.correct_answer = answer_key[mcq.question_number]
+                continue
             
             # Strategy 2: Look for answer patterns near the question
-            answer = self._find_answer_near_question(text, mcq)
+            answer = self._find_answer_near_question(document, mcq)
             if answer:
-                enhanced_mcq['correct_answer'] = answer
-            
-            enhanced_mcqs.append(enhanced_mcq)
+                mcq.correct_answer = answer
         
-        return enhanced_mcqs
+        return mcqs
 
-    def _extract_answer_key(self, text: str) -> Dict[int, str]:
-        """Extract answer key from text if present"""
+    def _extract_answer_key(self, lines: Sequence[str]) -> Dict[int, str]:
+        """Extract answer-key sections ("Answer Key", "Answers:", "Correct Answers") from the given lines.
+        Each line is read once: a header starts a section, which runs while its lines are key entries
+        ("1-A 2-C", "3. B", "4 | D"), column labels or number/letter grid rows."""
         answer_key = {}
-        
-        # Look for answer key sections
-        answer_key_patterns = [
-            r'(?i)answer\s*key[:\s]*(.+?)(?=\n\n|\Z)',
-            r'(?i)answers[:\s]*(.+?)(?=\n\n|\Z)',
-            r'(?i)correct\s*answers[:\s]*(.+?)(?=\n\n|\Z)',
-        ]
-        
-        for pattern in answer_key_patterns:
-            match = re.search(pattern, text, re.DOTALL)
-            if match:
-                answer_section = match.group(1)
+        line_count = len(lines)
+        i = 0
+        while i < line_count:
+            header = ANSWER_KEY_HEADER_PATTERN.match(lines[i])
+            i += 1
+            if not header:
+                continue
+            
+            # Entries may follow the header on the same line; other trailing text means it was prose
+            rest = header.group(1).strip()
+            if rest:
+                entries = self._answer_key_entries(rest)
+                if entries is None:
+                    continue
+                answer_key.update(entries)
+            
+            while i < line_count:
+                line = lines[i].strip()
+                if not line or PAGE_MARKER_PATTERN.match(line):
+                    i += 1
+                    continue
+                
+                # Grid: a row of question numbers followed by a row of letters
+                numbers = line.replace('|', ' ').replace(',', ' ').split()
+                if len(numbers) > 1 and all(token.isdigit() for token in numbers) and i + 1 < line_count:
+                    letters = lines[i + 1].replace('|', ' ').replace(',', ' ').split()
+                    if len(letters) == len(numbers) and all(len(token) == 1 and token in 'ABCDabcd' for token in letters):
+                        answer_key.update((int(number), letter.upper()) for number, letter in zip(numbers, letters))
+                        i += 2
+                        continue
                 
-                # Extract individual answers
-                answer_matches = re.findall(r'(\d+)[\.\):\s]*([A-Da-d])', answer_section)
-                for q_num, answer in answer_matches:
-                    answer_key[int(q_num)] = answer.upper()
+                entries = self._answer_key_entries(line)
+                if entries is not None:
+                    answer_key.update(entries)
+                elif not set(re.findall(r'[a-z]+', line.lower())) <= ANSWER_KEY_LABEL_WORDS:
+                    break
+                i += 1
         
         return answer_key
 
-    def _find_answer_near_question(self, text: str, mcq: Dict) -> str:
+    def _answer_key_entries(self, line: str) -> Optional[Dict[int, str]]:
+        """Entries of an answer-key line, or None when the line holds anything besides entries and separators"""
+        leftover, count = ANSWER_KEY_ENTRY_PATTERN.subn('', line)
+        if not count or leftover.strip(' \t|,;:.-'):
+            return None
+        return {int(number): letter.upper() for number, letter in ANSWER_KEY_ENTRY_PATTERN.findall(line)}
+
+    def _find_answer_near_question(self, document: DocumentIndex, mcq: MCQ) -> str:
         """Find answer near a specific question"""
-        q_num = mcq.get('question_number')
+        q_num = mcq.question_number
         if not q_num:
             return None
         
-        # Split text into lines
-        lines = text.split('\n')
+        lines = document.lines
         
         # Find the question line
-        question_line_index = None
-        for i, line in enumerate(lines):
-            if re.search(rf'\b{q_num}\.\s', line):
-                question_line_index = i
-                break
-        
+        question_line_index = document.question_line(q_num)
         if question_line_index is None:
             return None
         
@@ -732,15 +3396,20 @@ class MCQExtractor:
         search_end = min(question_line_index + 10, len(lines))
         
         for i in range(question_line_index, search_end):
-            line = lines[i]
-            
-            for pattern in self.answer_patterns:
-                match = re.search(pattern, line)
-                if match:
-                    return match.group(1).upper()
+            answer = self._answer_on_line(lines[i])
+            if answer:
+                return answer
         
         return None
 
+    def _answer_on_line(self, line: str) -> Optional[str]:
+        """Answer letter given on a line by any of the answer patterns, or None"""
+        for pattern in self.answer_patterns:
+            match = re.search(pattern, line)
+            if match:
+                return match.group(1).upper()
+        return None
+
     def detect_math_content(self, text: str) -> Dict[str, Any]:
         """Detect mathematical content in the text"""
         math_indicators = {
@@ -790,7 +3459,7 @@ class MCQExtractor:
         
         return math_indicators
 
-    def detect_visual_content(self, text: str) -> Dict[str, Any]:
+    def detect_visual_content(self, text: str, document: Optional[DocumentIndex] = None) -> Dict[str, Any]:
         """Detect visual content references in text"""
         visual_indicators = {
             'has_visual_content': False,
@@ -829,34 +3498,31 @@ class MCQExtractor:
                 visual_indicators['has_visual_content'] = True
         
         # Extract actual table structures
-        tables = self._extract_tables(text)
+        tables = self._extract_tables(text, document)
         if tables:
             visual_indicators['extracted_tables'] = tables
             visual_indicators['has_visual_content'] = True
         
         return visual_indicators
 
-    def _extract_tables(self, text: str) -> List[Dict]:
-        """Extract table structures from text"""
+    def _extract_tables(self, text: str, document: Optional[DocumentIndex] = None) -> List[Dict]:
+        """Extract table structures from text, reusing the lines of its index when given"""
         tables = []
         
         # Look for pipe-separated tables
-        lines = text.split('\n')
+        lines = document.lines if document is not None else text.split('\n')
         table_lines = []
         
         for line in lines:
             if '|' in line and line.count('|') >= 2:
                 table_lines.append(line)
-            elif table_lines and not line.strip():
-                # End of table
+            elif table_lines:
+                # End of table: a blank line, or (in preprocessed text, which has none) the next text line
                 if len(table_lines) >= 2:
                     table = self._parse_table_lines(table_lines)
                     if table:
                         tables.append(table)
                 table_lines = []
-            elif table_lines:
-                # Non-table line encountered, reset
-                table_lines = []
         
         # Check for remaining table at end
         if len(table_lines) >= 2:
@@ -888,19 +3554,17 @@ class MCQExtractor:
             'preview': True if len(rows) > 5 else False
         }
 
-    def _validate_and_fix_mcq(self, mcq: Dict) -> Dict:
-        """Validate and fix common issues in MCQ"""
-        fixed_mcq = mcq.copy()
-        
+    def _validate_and_fix_mcq(self, mcq: MCQ) -> MCQ:
+        """Validate and fix common issues in MCQ, recording them on the record in place"""
         # Fix corrupted question text
-        question = fixed_mcq.get('question', '')
+        question = mcq.question
         if self._is_corrupted_text(question):
             # Try to repair or mark as needs review
-            fixed_mcq['question'] = f"[NEEDS REVIEW] {question}"
-            fixed_mcq['extraction_issues'] = fixed_mcq.get('extraction_issues', []) + ['corrupted_question']
+            mcq.question = f"[NEEDS REVIEW] {question}"
+            mcq.extraction_issues.append('corrupted_question')
         
         # Fix incomplete options
-        options = fixed_mcq.get('options', {})
+        options = mcq.options
         incomplete_options = []
         
         for opt_key, opt_value in options.items():
@@ -908,7 +3572,7 @@ class MCQExtractor:
                 incomplete_options.append(opt_key)
         
         if incomplete_options:
-            fixed_mcq['extraction_issues'] = fixed_mcq.get('extraction_issues', []) + ['incomplete_options']
+            mcq.extraction_issues.append('incomplete_options')
         
         # Validate option completeness
         expected_options = {'A', 'B', 'C', 'D'}
@@ -916,69 +3580,280 @@ class MCQExtractor:
         missing_options = expected_options - actual_options
         
         if missing_options:
-            fixed_mcq['extraction_issues'] = fixed_mcq.get('extraction_issues', []) + ['missing_options']
-            fixed_mcq['missing_options'] = list(missing_options)
+            mcq.extraction_issues.append('missing_options')
+            mcq.missing_options = list(missing_options)
         
-        return fixed_mcq
+        return mcq
 
 
 # Initialize the MCQ extractor after class definition
 mcq_extractor = MCQExtractor()
+# Extracted MCQs are kept for /questions/search only when MCQ_QUESTION_DB names a SQLite file
+question_store = QuestionStore(os.environ["MCQ_QUESTION_DB"]) if os.environ.get("MCQ_QUESTION_DB") else None
+
+def _resolve_mcq_fields(profile: str, fields: Optional[str], compact: bool = False) -> Optional[frozenset]:
+    """Turn the profile/fields query parameters into the set of MCQ keys to return. An explicit fields list
+    is exactly what is returned: it takes precedence over profile and compact, which only pick a default."""
+    if profile not in MCQ_FIELD_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown profile: {profile}. Available profiles: {', '.join(MCQ_FIELD_PROFILES)}"
+        )
+    
+    if fields:
+        requested = frozenset(name.strip() for name in fields.split(',') if name.strip())
+        unknown = requested - MCQ_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown MCQ fields: {', '.join(sorted(unknown))}")
+        if requested:
+            return requested
+    
+    if compact and profile == "full":
+        profile = "compact"
+    return MCQ_FIELD_PROFILES[profile]
+
+@app.get("/formats")
+async def supported_formats():
+    """List the registered file formats with their relative cost and capabilities"""
+    return {
+        "formats": [
+            {
+                "name": spec.name,
+                "mime_type": spec.mime_type,
+                "extensions": list(spec.extensions),
+                "cost": spec.cost,
+                "capabilities": sorted(spec.capabilities),
+                "backends": list(spec.backends)
+            }
+            for spec in EXTRACTOR_REGISTRY.values()
+        ]
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Stage latency histograms and fallback/failure counters in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _is_admin(x_admin_token: Optional[str]) -> bool:
+    """Whether the X-Admin-Token header matches MCQ_ADMIN_TOKEN"""
+    admin_token = os.environ.get("MCQ_ADMIN_TOKEN")
+    return bool(admin_token and x_admin_token and hmac.compare_digest(x_admin_token, admin_token))
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only with the X-Admin-Token header matching MCQ_ADMIN_TOKEN"""
+    if not os.environ.get("MCQ_ADMIN_TOKEN"):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not _is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profiling/start", dependencies=[Depends(_require_admin)])
+async def start_profiling(
+    requests: int = Query(0, ge=0, description="Profile the next N requests that reach extraction (rejected ones don't count)"),
+    sample_rate: float = Query(0.0, ge=0.0, le=1.0, description="Then profile this fraction of requests"),
+    reset: bool = Query(True, description="Discard stats collected so far")
+):
+    """Arm the cProfile capture of extraction requests"""
+    if requests == 0 and sample_rate == 0:
+        raise HTTPException(status_code=400, detail="Set requests or sample_rate to start profiling")
+    request_profiler.arm(requests, sample_rate, reset)
+    return request_profiler.status()
+
+@app.post("/admin/profiling/stop", dependencies=[Depends(_require_admin)])
+async def stop_profiling():
+    """Stop profiling new requests, keeping the stats collected so far"""
+    request_profiler.disarm()
+    return request_profiler.status()
+
+@app.get("/admin/profiling", dependencies=[Depends(_require_admin)])
+async def profiling_status():
+    return request_profiler.status()
+
+@app.get("/admin/profiling/stats", dependencies=[Depends(_require_admin)])
+async def profiling_stats(
+    format: str = Query("text", description="text (top functions) or pstats (binary, for snakeviz/flameprof)"),
+    sort: str = Query("cumulative", description="pstats sort key for the text report, e.g. cumulative, tottime, calls"),
+    limit: int = Query(50, ge=1, description="Number of functions in the text report")
+):
+    """Per-function time aggregated across the profiled requests"""
+    if format == "pstats":
+        data = request_profiler.dump()
+        if data is None:
+            raise HTTPException(status_code=404, detail="No requests have been profiled yet")
+        return Response(data, media_type="application/octet-stream",
+                        headers={"Content-Disposition": 'attachment; filename="mcq-extractor.pstats"'})
+    if format != "text":
+        raise HTTPException(status_code=400, detail=f"Unknown stats format: {format}. Use text or pstats")
+    try:
+        report = request_profiler.report(sort, limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    if report is None:
+        raise HTTPException(status_code=404, detail="No requests have been profiled yet")
+    return PlainTextResponse(report)
+
+def _request_time_budget(time_budget: Optional[float], header_value: Optional[str]) -> TimeBudget:
+    """Budget from the time_budget query parameter, else the X-Time-Budget header, else MCQ_TIME_BUDGET (seconds)"""
+    seconds = time_budget
+    if seconds is None:
+        raw = header_value or os.environ.get("MCQ_TIME_BUDGET")
+        if raw:
+            try:
+                seconds = float(raw)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid time budget: {raw}")
+            if seconds <= 0:
+                raise HTTPException(status_code=400, detail=f"Time budget must be positive: {raw}")
+    return TimeBudget(seconds)
+
+def _request_page_ranges(pages: Optional[str]) -> Optional[List[Tuple[int, Optional[int]]]]:
+    """Page ranges from the pages query parameter, or None for every page"""
+    if pages is None:
+        return None
+    try:
+        return parse_page_ranges(pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _partial_summary(budget: TimeBudget) -> Dict[str, Any]:
+    """Extraction-summary fields describing how far a budget-limited request got"""
+    if not budget.exhausted:
+        return {}
+    metrics.count_partial("client_disconnected" if budget.cancelled else "time_budget")
+    if budget.pages_total is None:
+        return {}
+    return {"pages_processed": budget.pages_processed, "pages_total": budget.pages_total}
+
+def _duplicate_tagging(duplicates: Optional[bool]) -> bool:
+    """Whether to tag MCQs with near-duplicates: the duplicates query parameter, else MCQ_DUPLICATE_TAGGING (on)"""
+    if duplicates is not None:
+        return duplicates
+    return os.environ.get("MCQ_DUPLICATE_TAGGING", "1").strip().lower() not in ("0", "false", "no")
+
+def _extract_and_tag(content: bytes, filename: Optional[str], pages, max_questions: Optional[int],
+                     tag_duplicates: bool = True):
+    """Extract MCQs, tag them with near-duplicates from earlier uploads and keep complete extractions
+    (no page/question limit, budget not exhausted) in the duplicate index and, if enabled, the question store"""
+    mcqs, document, spec = mcq_extractor.extract_mcqs(content, filename, pages, max_questions)
+    complete = pages is None and not max_questions and not _budget_exhausted()
+    sha256 = hashlib.sha256(content).hexdigest()
+    if tag_duplicates:
+        mcq_extractor.tag_duplicates(mcqs, filename, sha256, add=complete)
+    if question_store is not None and mcqs and complete:
+        with stage_timer("store"):
+            question_store.store_document(sha256, filename, spec.name, mcqs)
+    return mcqs, document, spec
+
+async def _extract_upload(request: Request, budget: TimeBudget, content: bytes, filename: Optional[str],
+                          pages, max_questions: Optional[int], duplicates: Optional[bool] = None):
+    """Run _extract_and_tag in the thread pool, then label the request's later stage timings
+    (content analysis, export) with the detected format, which the worker set only in its own context"""
+    mcqs, document, spec = await _run_with_budget(
+        request, budget, _extract_and_tag, content, filename, pages, max_questions, _duplicate_tagging(duplicates)
+    )
+    _current_file_type.set(spec.name)
+    return mcqs, document, spec
+
+def _parse_and_tag(text: str, max_questions: Optional[int], tag_duplicates: bool = True) -> List[MCQ]:
+    mcqs = mcq_extractor.parse_text(text, max_questions)
+    if tag_duplicates:
+        mcq_extractor.tag_duplicates(mcqs, document=hashlib.sha256(text.encode('utf-8')).hexdigest(),
+                                     add=not max_questions and not _budget_exhausted())
+    return mcqs
+
+def _analyze_mcqs(mcqs: List[MCQ], document: DocumentIndex) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Validate and classify each MCQ in place; returns the document-level math and visual analysis"""
+    _classify_mcqs(mcqs)
+    
+    # Document-level analysis
+    return mcq_extractor.detect_math_content(document.text), mcq_extractor.detect_visual_content(document.text, document)
+
+def _analyze_upload(mcqs: List[MCQ], document: DocumentIndex, content: bytes, spec: ExtractorSpec,
+                    pages: Optional[List[Tuple[int, Optional[int]]]], limited: bool) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """_analyze_mcqs over the whole uploaded document, unless the request was limited to its first questions"""
+    if not limited:
+        document = mcq_extractor.document_for_analysis(content, spec, document, pages)
+    return _analyze_mcqs(mcqs, document)
+
+def _classify_mcqs(mcqs: List[MCQ]):
+    """Validate each MCQ and set its math and visual content and question type in place"""
+    for mcq in mcqs:
+        mcq_extractor._validate_and_fix_mcq(mcq)
+        
+        # Add content analysis
+        options_text = ' '.join(mcq.options.values())
+        full_text = f"{mcq.question} {options_text}"
+        
+        # Detect math and visual content
+        mcq.math_content = mcq_extractor.detect_math_content(full_text)
+        mcq.visual_content = mcq_extractor.detect_visual_content(full_text)
+        
+        # Classify question type
+        if mcq.has_math_content:
+            mcq.question_type = 'mathematical'
+        elif mcq.has_visual_content:
+            mcq.question_type = 'visual'
+        else:
+            mcq.question_type = 'standard'
 
 @app.post("/extract-mcq")
-async def extract_mcqs(file: UploadFile = File(...)):
+async def extract_mcqs(
+    request: Request,
+    file: UploadFile = File(...),
+    profile: str = Query("full", description="Per-MCQ field profile: full, compact, summary or minimal"),
+    fields: Optional[str] = Query(None, description="Comma-separated MCQ fields to return, e.g. question,options"),
+    pages: Optional[str] = Query(None, description="PDF pages or image frames to read, e.g. 1-3,5,8- (default: all)"),
+    max_questions: Optional[int] = Query(None, ge=1, description="Return only the first N questions, stopping extraction early"),
+    time_budget: Optional[float] = Query(None, gt=0, description="Seconds to spend before returning partial results"),
+    duplicates: Optional[bool] = Query(None, description="Tag MCQs with near-duplicates from earlier uploads (default: on, or MCQ_DUPLICATE_TAGGING)"),
+    x_time_budget: Optional[str] = Header(None)
+):
     """Extract MCQs from uploaded file with basic processing"""
     try:
+        mcq_fields = _resolve_mcq_fields(profile, fields)
+        budget = _request_time_budget(time_budget, x_time_budget)
+        page_ranges = _request_page_ranges(pages)
+        
         # Read file content
         content = await file.read()
         
-        # Extract text based on file type
-        file_extension = file.filename.split('.')[-1].lower()
-        
+        # Extract MCQs with the extractor matching the detected file format
         try:
-            if file_extension == 'pdf':
-                text = mcq_extractor.extract_text_from_pdf(content)
-            elif file_extension in ['jpg', 'jpeg', 'png', 'bmp', 'tiff']:
-                text = mcq_extractor.extract_text_from_image(content)
-            elif file_extension == 'docx':
-                text = mcq_extractor.extract_text_from_docx(content)
-            elif file_extension in ['xlsx', 'xls']:
-                text = mcq_extractor.extract_text_from_xlsx(content)
-            elif file_extension == 'txt':
-                text = mcq_extractor.extract_text_from_txt(content)
-            else:
-                raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_extension}")
+            mcqs, document, spec = await _extract_upload(
+                request, budget, content, file.filename, page_ranges, max_questions, duplicates
+            )
+            file_type = _file_type_label(spec, file.filename)
         except ValueError as e:
             # Convert ValueError from extraction methods to HTTPException
             raise HTTPException(status_code=400, detail=str(e))
         
-        if not text.strip():
+        # Out of time: whatever was parsed is returned with partial: true
+        if not document.text.strip() and not budget.exhausted:
             raise HTTPException(status_code=400, detail="No text could be extracted from the file")
         
-        # Parse MCQs
-        mcqs = mcq_extractor.parse_mcqs(text)
-        
-        if not mcqs:
+        if not mcqs and not budget.exhausted:
             raise HTTPException(status_code=400, detail="No MCQs found in the text")
         
         # Count statistics
         total_questions = len(mcqs)
-        complete_questions = sum(1 for mcq in mcqs if len(mcq.get('options', {})) >= 3)
-        questions_with_answers = sum(1 for mcq in mcqs if mcq.get('correct_answer'))
+        complete_questions = sum(1 for mcq in mcqs if len(mcq.options) >= 3)
+        questions_with_answers = sum(1 for mcq in mcqs if mcq.correct_answer)
         
-        return {
+        return MCQJSONResponse({
             "success": True,
+            "partial": budget.exhausted,
             "file_info": {
                 "filename": file.filename,
-                "file_type": file_extension.upper(),
+                "file_type": file_type,
                 "file_size_mb": round(len(content) / (1024 * 1024), 2)
             },
             "extraction_summary": {
                 "total_questions": total_questions,
                 "complete_questions": complete_questions,
-                "questions_with_answers": questions_with_answers            },
-            "mcqs": mcqs
-        }
+                "questions_with_answers": questions_with_answers,
+                **_partial_summary(budget)
+            },
+            "mcqs": [mcq.to_dict(mcq_fields) for mcq in mcqs]
+        })
         
     except HTTPException:
         # Re-raise HTTPExceptions as they are (don't wrap them)
@@ -988,98 +3863,71 @@ async def extract_mcqs(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Unexpected error processing file: {str(e)}")
 
 @app.post("/extract-mcq-enhanced")
-async def extract_mcqs_enhanced(file: UploadFile = File(...)):
+async def extract_mcqs_enhanced(
+    request: Request,
+    file: UploadFile = File(...),
+    compact: bool = Query(False, description="Omit the duplicated math_content/visual_content fields (use content_analysis)"),
+    profile: str = Query("full", description="Per-MCQ field profile: full, compact, summary or minimal"),
+    fields: Optional[str] = Query(None, description="Comma-separated MCQ fields to return, e.g. question,options"),
+    pages: Optional[str] = Query(None, description="PDF pages or image frames to read, e.g. 1-3,5,8- (default: all)"),
+    max_questions: Optional[int] = Query(None, ge=1, description="Return only the first N questions, stopping extraction early"),
+    time_budget: Optional[float] = Query(None, gt=0, description="Seconds to spend before returning partial results"),
+    duplicates: Optional[bool] = Query(None, description="Tag MCQs with near-duplicates from earlier uploads (default: on, or MCQ_DUPLICATE_TAGGING)"),
+    x_time_budget: Optional[str] = Header(None)
+):
     """Extract MCQs with enhanced processing, math detection, and visual content analysis"""
-    try:        # Read file content
-        content = await file.read()
+    try:
+        mcq_fields = _resolve_mcq_fields(profile, fields, compact)
+        budget = _request_time_budget(time_budget, x_time_budget)
+        page_ranges = _request_page_ranges(pages)
         
-        # Extract text based on file type
-        file_extension = file.filename.split('.')[-1].lower()
+        # Read file content
+        content = await file.read()
         
+        # Extract MCQs with the extractor matching the detected file format
         try:
-            if file_extension == 'pdf':
-                text = mcq_extractor.extract_text_from_pdf(content)
-            elif file_extension in ['jpg', 'jpeg', 'png', 'bmp', 'tiff']:
-                text = mcq_extractor.extract_text_from_image(content)
-            elif file_extension == 'docx':
-                text = mcq_extractor.extract_text_from_docx(content)
-            elif file_extension in ['xlsx', 'xls']:
-                text = mcq_extractor.extract_text_from_xlsx(content)
-            elif file_extension == 'txt':
-                text = mcq_extractor.extract_text_from_txt(content)
-            else:
-                raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_extension}")
+            mcqs, document, spec = await _extract_upload(
+                request, budget, content, file.filename, page_ranges, max_questions, duplicates
+            )
+            file_type = _file_type_label(spec, file.filename)
         except ValueError as e:
             # Convert ValueError from extraction methods to HTTPException
             raise HTTPException(status_code=400, detail=str(e))
         
-        if not text.strip():
+        if not document.text.strip() and not budget.exhausted:
             raise HTTPException(status_code=400, detail="No text could be extracted from the file")
         
-        # Parse MCQs with enhanced processing
-        mcqs = mcq_extractor.parse_mcqs(text)
-        
         if not mcqs:
             return {
                 "success": False,
+                "partial": budget.exhausted,
                 "message": "No MCQs found in the text",
                 "file_info": {
                     "filename": file.filename,
-                    "file_type": file_extension.upper(),
+                    "file_type": file_type,
                     "file_size_mb": round(len(content) / (1024 * 1024), 2)
                 },
                 "mcqs": []
             }
         
-        # Apply enhanced analysis
-        enhanced_mcqs = []
-        for mcq in mcqs:
-            enhanced_mcq = mcq_extractor._validate_and_fix_mcq(mcq)
-            
-            # Add content analysis
-            question_text = enhanced_mcq.get('question', '')
-            options_text = ' '.join(enhanced_mcq.get('options', {}).values())
-            full_text = f"{question_text} {options_text}"
-            
-            # Detect math content
-            math_analysis = mcq_extractor.detect_math_content(full_text)
-            enhanced_mcq['content_analysis'] = {
-                'mathematics': math_analysis
-            }
-            enhanced_mcq['math_content'] = math_analysis
-            enhanced_mcq['has_math_content'] = math_analysis['has_math']
-            
-            # Detect visual content
-            visual_analysis = mcq_extractor.detect_visual_content(full_text)
-            enhanced_mcq['content_analysis']['visual_elements'] = visual_analysis
-            enhanced_mcq['visual_content'] = visual_analysis
-            enhanced_mcq['has_visual_content'] = visual_analysis['has_visual_content']
-            
-            # Classify question type
-            if math_analysis['has_math']:
-                enhanced_mcq['question_type'] = 'mathematical'
-            elif visual_analysis['has_visual_content']:
-                enhanced_mcq['question_type'] = 'visual'
-            else:
-                enhanced_mcq['question_type'] = 'standard'
-            
-            enhanced_mcqs.append(enhanced_mcq)
-        
-        # Document-level analysis
-        doc_math_analysis = mcq_extractor.detect_math_content(text)
-        doc_visual_analysis = mcq_extractor.detect_visual_content(text)
+        # Apply enhanced analysis (records are updated in place)
+        enhanced_mcqs = mcqs
+        with stage_timer("content_analysis"):
+            doc_math_analysis, doc_visual_analysis = await _run_with_budget(
+                request, budget, _analyze_upload, enhanced_mcqs, document, content, spec, page_ranges, bool(max_questions)
+            )
         
         # Count statistics
         total_questions = len(enhanced_mcqs)
-        complete_questions = sum(1 for mcq in enhanced_mcqs if len(mcq.get('options', {})) >= 3)
-        questions_with_answers = sum(1 for mcq in enhanced_mcqs if mcq.get('correct_answer'))
-        mathematical_questions = sum(1 for mcq in enhanced_mcqs if mcq.get('has_math_content', False))
-        visual_questions = sum(1 for mcq in enhanced_mcqs if mcq.get('has_visual_content', False))
+        complete_questions = sum(1 for mcq in enhanced_mcqs if len(mcq.options) >= 3)
+        questions_with_answers = sum(1 for mcq in enhanced_mcqs if mcq.correct_answer)
+        mathematical_questions = sum(1 for mcq in enhanced_mcqs if mcq.has_math_content)
+        visual_questions = sum(1 for mcq in enhanced_mcqs if mcq.has_visual_content)
         
         # Type distribution
         type_distribution = {}
         for mcq in enhanced_mcqs:
-            q_type = mcq.get('question_type', 'standard')
+            q_type = mcq.question_type or 'standard'
             type_distribution[q_type] = type_distribution.get(q_type, 0) + 1
         
         # Processing notes
@@ -1091,7 +3939,7 @@ async def extract_mcqs_enhanced(file: UploadFile = File(...)):
             processing_notes.append(f"📊 Found {visual_questions} questions with visual content")
         
         # Check for issues
-        incomplete_questions = sum(1 for mcq in enhanced_mcqs if len(mcq.get('options', {})) < 4)
+        incomplete_questions = sum(1 for mcq in enhanced_mcqs if len(mcq.options) < 4)
         if incomplete_questions > 0:
             processing_notes.append(f"⚠️ {incomplete_questions} questions have incomplete options")
         
@@ -1099,11 +3947,15 @@ async def extract_mcqs_enhanced(file: UploadFile = File(...)):
         if missing_answers > 0:
             processing_notes.append(f"❓ {missing_answers} questions are missing answers")
         
-        return {
+        if budget.exhausted:
+            processing_notes.append("⏱️ Time budget reached: results are partial")
+        
+        return MCQJSONResponse({
             "success": True,
+            "partial": budget.exhausted,
             "file_info": {
                 "filename": file.filename,
-                "file_type": file_extension.upper(),
+                "file_type": file_type,
                 "file_size_mb": round(len(content) / (1024 * 1024), 2)
             },
             "extraction_summary": {
@@ -1112,7 +3964,8 @@ async def extract_mcqs_enhanced(file: UploadFile = File(...)):
                 "visual_content_questions": visual_questions,
                 "complete_questions": complete_questions,
                 "questions_with_answers": questions_with_answers,
-                "question_type_distribution": type_distribution
+                "question_type_distribution": type_distribution,
+                **_partial_summary(budget)
             },
             "document_analysis": {
                 "has_mathematical_content": doc_math_analysis['has_math'],
@@ -1130,7 +3983,7 @@ async def extract_mcqs_enhanced(file: UploadFile = File(...)):
                     "extracted_tables": len(doc_visual_analysis['extracted_tables'])
                 }
             },
-            "mcqs": enhanced_mcqs,
+            "mcqs": [mcq.to_dict(mcq_fields) for mcq in enhanced_mcqs],
             "processing_notes": processing_notes,
             "enhanced_features": {
                 "mathematical_notation_support": True,
@@ -1138,7 +3991,8 @@ async def extract_mcqs_enhanced(file: UploadFile = File(...)):
                 "table_extraction": True,
                 "equation_parsing": True,
                 "content_type_classification": True
-            }        }
+            }
+        })
         
     except HTTPException:
         # Re-raise HTTPExceptions as they are (don't wrap them)
@@ -1147,6 +4001,228 @@ async def extract_mcqs_enhanced(file: UploadFile = File(...)):
         # Only wrap unexpected exceptions
         raise HTTPException(status_code=500, detail=f"Unexpected error processing file: {str(e)}")
 
+async def _read_text_body(request: Request) -> str:
+    """Text of a /parse-text body: {"text": ...} as JSON, or the raw body read as a text file"""
+    if request.headers.get("content-type", "").split(";")[0].strip().lower() == "application/json":
+        try:
+            payload = orjson.loads(await request.body())
+        except orjson.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {str(e)}")
+        if not isinstance(payload, dict) or not isinstance(payload.get("text"), str):
+            raise HTTPException(status_code=400, detail='JSON body must be an object with a "text" string')
+        return payload["text"]
+    
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+    try:
+        return mcq_extractor.extract_text_from_txt(bytes(body))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/parse-text")
+async def parse_text(
+    request: Request,
+    profile: str = Query("full", description="Per-MCQ field profile: full, compact, summary or minimal"),
+    fields: Optional[str] = Query(None, description="Comma-separated MCQ fields to return, e.g. question,options"),
+    max_questions: Optional[int] = Query(None, ge=1, description="Return only the first N questions, stopping parsing early"),
+    time_budget: Optional[float] = Query(None, gt=0, description="Seconds to spend before returning partial results"),
+    duplicates: Optional[bool] = Query(None, description="Tag MCQs with near-duplicates from earlier uploads (default: on, or MCQ_DUPLICATE_TAGGING)"),
+    x_time_budget: Optional[str] = Header(None)
+):
+    """Parse MCQs from text sent as JSON ({"text": ...}) or as a plain-text body, skipping file extraction"""
+    try:
+        mcq_fields = _resolve_mcq_fields(profile, fields)
+        budget = _request_time_budget(time_budget, x_time_budget)
+        
+        text = await _read_text_body(request)
+        if not text.strip():
+            raise HTTPException(status_code=400, detail="No text to parse")
+        
+        mcqs = await _run_with_budget(request, budget, _parse_and_tag, text, max_questions,
+                                      _duplicate_tagging(duplicates))
+        
+        if not mcqs and not budget.exhausted:
+            raise HTTPException(status_code=400, detail="No MCQs found in the text")
+        
+        return MCQJSONResponse({
+            "success": True,
+            "partial": budget.exhausted,
+            "text_info": {
+                "characters": len(text)
+            },
+            "extraction_summary": {
+                "total_questions": len(mcqs),
+                "complete_questions": sum(1 for mcq in mcqs if len(mcq.options) >= 3),
+                "questions_with_answers": sum(1 for mcq in mcqs if mcq.correct_answer),
+                **_partial_summary(budget)
+            },
+            "mcqs": [mcq.to_dict(mcq_fields) for mcq in mcqs]
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error parsing text: {str(e)}")
+
+@app.post("/extract-text")
+async def extract_text(
+    request: Request,
+    file: UploadFile = File(...),
+    pages: Optional[str] = Query(None, description="PDF pages or image frames to read, e.g. 1-3,5,8- (default: all)"),
+    time_budget: Optional[float] = Query(None, gt=0, description="Seconds to spend before returning partial results"),
+    x_time_budget: Optional[str] = Header(None)
+):
+    """Extract the text of an uploaded file page by page (or sheet by sheet) without parsing MCQs"""
+    try:
+        budget = _request_time_budget(time_budget, x_time_budget)
+        page_ranges = _request_page_ranges(pages)
+        
+        content = await file.read()
+        
+        try:
+            text, spec = await _run_with_budget(
+                request, budget, mcq_extractor.extract_text, content, file.filename, page_ranges
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        if isinstance(text, PageText) and text.pages:
+            page_texts = [
+                {"page": label, "text": text.page_body(index)}
+                for index, (label, _, _) in enumerate(text.pages)
+            ]
+        else:
+            # Unpaged formats (text files, images, DOCX) come back as a single segment, if any text was read
+            page_texts = [{"page": None, "text": str(text)}] if text.strip() else []
+        
+        return MCQJSONResponse({
+            "success": True,
+            "partial": budget.exhausted,
+            "file_info": {
+                "filename": file.filename,
+                "file_type": _file_type_label(spec, file.filename),
+                "file_size_mb": round(len(content) / (1024 * 1024), 2)
+            },
+            "extraction_summary": {
+                "pages_returned": len(page_texts),
+                "characters": len(text),
+                **_partial_summary(budget)
+            },
+            "pages": page_texts
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error processing file: {str(e)}")
+
+def _analyze_and_export(mcqs: List[MCQ], format: str) -> bytes:
+    """Run the enhanced per-MCQ analysis (question type and content flags) and export the MCQs"""
+    _classify_mcqs(mcqs)
+    with stage_timer("export", format):
+        sink = io.BytesIO()
+        export_mcqs(mcqs, format, sink)
+    return sink.getvalue()
+
+@app.post("/extract-mcq/export")
+async def export_extracted_mcqs(
+    request: Request,
+    file: UploadFile = File(...),
+    format: str = Query("csv", description="csv, parquet or arrow (Arrow IPC stream)"),
+    pages: Optional[str] = Query(None, description="PDF pages or image frames to read, e.g. 1-3,5,8- (default: all)"),
+    max_questions: Optional[int] = Query(None, ge=1, description="Return only the first N questions, stopping extraction early"),
+    time_budget: Optional[float] = Query(None, gt=0, description="Seconds to spend before returning partial results"),
+    duplicates: Optional[bool] = Query(None, description="Tag MCQs with near-duplicates from earlier uploads (default: on, or MCQ_DUPLICATE_TAGGING)"),
+    x_time_budget: Optional[str] = Header(None)
+):
+    """Extract MCQs with enhanced analysis and return them as one flat table (see MCQ_EXPORT_COLUMNS)"""
+    try:
+        if format not in MCQ_EXPORT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unknown export format: {format}. Use {', '.join(MCQ_EXPORT_FORMATS)}")
+        budget = _request_time_budget(time_budget, x_time_budget)
+        page_ranges = _request_page_ranges(pages)
+        
+        content = await file.read()
+        
+        try:
+            mcqs, document, spec = await _extract_upload(
+                request, budget, content, file.filename, page_ranges, max_questions, duplicates
+            )
+            data = await _run_with_budget(request, budget, _analyze_and_export, mcqs, format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        media_type, extension = MCQ_EXPORT_FORMATS[format]
+        stem = re.sub(r'[^\w.\- ]', '_', file.filename.rsplit('.', 1)[0]) if file.filename else "mcqs"
+        headers = {"Content-Disposition": f'attachment; filename="{stem}.{extension}"'}
+        # A table has no room for the JSON summary, so partial results are flagged in a header
+        if budget.exhausted:
+            _partial_summary(budget)
+            headers["X-Partial-Result"] = "true"
+        return Response(data, media_type=media_type, headers=headers)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unexpected error processing file: {str(e)}")
+
+@app.get("/questions/search")
+async def search_questions(
+    q: Optional[str] = Query(None, description="Words to find in question or option text (all must match)"),
+    document: Optional[str] = Query(None, description="SHA-256 of a source file, to list or search its questions"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Search MCQs stored from earlier extractions, without re-uploading the files.
+    As for /duplicates/search, other uploaders' content needs the admin token: without it, only the
+    questions of a document whose hash the caller knows are returned, and without the uploader's filename."""
+    if question_store is None:
+        raise HTTPException(status_code=404, detail="Question store is not enabled (set MCQ_QUESTION_DB)")
+    if q is None and document is None:
+        raise HTTPException(status_code=400, detail="Give a search query (q) or a document hash")
+    admin = _is_admin(x_admin_token)
+    if document is None and not admin:
+        raise HTTPException(status_code=403, detail="Searching every stored document needs the admin token; "
+                                                    "give a document hash to search one document")
+    try:
+        total, results = await run_in_threadpool(question_store.search, q, document, limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not admin:
+        for result in results:
+            result["document"].pop("filename")
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "results": results
+    }
+
+@app.post("/duplicates/search")
+async def search_duplicates(
+    question: str = Body(..., description="Question text"),
+    options: Dict[str, str] = Body({}, description="Options by letter, e.g. {\"A\": \"Paris\"}"),
+    threshold: float = Query(DUPLICATE_THRESHOLD, ge=0.1, le=1.0, description="Minimum estimated Jaccard similarity"),
+    limit: int = Query(20, ge=1, le=200),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Find indexed questions from earlier uploads that are near-duplicates of the given question.
+    Other uploaders' filenames and question text are only returned with the admin token."""
+    def search():
+        index = mcq_extractor.duplicates
+        return index.query(question, options, threshold, limit), len(index)
+    
+    matches, indexed = await run_in_threadpool(search)
+    if not _is_admin(x_admin_token):
+        matches = [{"id": match["id"], "similarity": match["similarity"]} for match in matches]
+    return {
+        "indexed_questions": indexed,
+        "matches": matches
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test answer-key detection in MCQExtractor._extract_answer_key
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from main import MCQExtractor
+
+extractor = MCQExtractor()
+
+
+def answer_key(text):
+    return extractor._extract_answer_key(text.split('\n'))
+
+
+def test_entries_on_the_header_line():
+    assert answer_key("Answer Key: 1-A 2-C 3. B") == {1: 'A', 2: 'C', 3: 'B'}
+
+
+def test_section_runs_until_a_non_key_line():
+    text = "Answer Key\n1-A 2-C\n3. B\n4 | D\n5. The next question\n6-A"
+    assert answer_key(text) == {1: 'A', 2: 'C', 3: 'B', 4: 'D'}
+
+
+def test_table_with_column_labels():
+    assert answer_key("Correct Answers\nQ.No | Answer\n1 | B\n2 | C") == {1: 'B', 2: 'C'}
+
+
+def test_number_and_letter_grid():
+    assert answer_key("Answer Key\n1 2 3 4\nA C B D") == {1: 'A', 2: 'C', 3: 'B', 4: 'D'}
+
+
+def test_prose_mentioning_answers_is_not_a_key():
+    assert answer_key("Answers should be marked clearly. 1-A") == {}
+    assert answer_key("5. Which of the following answers is true?\nA) 1-A") == {}
+
+
+def test_parse_uses_the_key():
+    text = "1. First?\nA) a\nB) b\n2. Second?\nA) c\nB) d\n\nAnswer Key\n1-B 2-A"
+    assert [mcq.correct_answer for mcq in extractor.parse_mcqs(text)] == ['B', 'A']
+
+
+if __name__ == "__main__":
+    test_entries_on_the_header_line()
+    test_section_runs_until_a_non_key_line()
+    test_table_with_column_labels()
+    test_number_and_letter_grid()
+    test_prose_mentioning_answers_is_not_a_key()
+    test_parse_uses_the_key()
+    print("All answer key tests passed")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test column gutter detection, its per-template cache and column-by-column reading order
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import fitz
+import pytest
+
+import main
+from main import MCQExtractor
+
+LEFT = [(50 + (i % 3) * 10, 270, 100 + i * 15) for i in range(20)]
+RIGHT = [(320 + (i % 3) * 10, 550, 100 + i * 15) for i in range(20)]
+
+
+def test_gutter_is_found_between_two_columns():
+    gutters = MCQExtractor()._detect_column_gutters(LEFT + RIGHT, 612)
+    assert len(gutters) == 1
+    start, end = gutters[0]
+    assert 270 <= start and end <= 320
+
+
+def test_single_column_and_sparse_pages_have_no_gutters():
+    extractor = MCQExtractor()
+    assert extractor._detect_column_gutters(LEFT, 612) == []
+    # Option grids: two columns of cells, but only a few rows each
+    grid = [(50, 200, 100 + (i // 2) * 15) for i in range(0, 40, 2)] + [(320, 450, 100)] * 20
+    assert extractor._detect_column_gutters(grid, 612) == []
+
+
+def test_headings_across_the_gutter_split_reading_bands():
+    extractor = MCQExtractor()
+    items = [(50, 270, 100, "left 1"), (320, 550, 100, "right 1"), (50, 550, 200, "heading"),
+             (50, 270, 300, "left 2"), (320, 550, 300, "right 2"), (50, 270, 150, "left 1b")]
+    assert extractor._reading_order(items, [(280.0, 310.0)]) == ["left 1", "left 1b", "right 1", "heading",
+                                                                 "left 2", "right 2"]
+
+
+def test_gutters_are_cached_per_template(monkeypatch):
+    extractor = MCQExtractor()
+    gutters = extractor._page_gutters(LEFT + RIGHT, 612, ("a4", "publisher"))
+    detect = extractor._detect_column_gutters
+    monkeypatch.setattr(extractor, "_detect_column_gutters", lambda *args: pytest.fail("detected again"))
+    shifted = [(x0, x1, y0 + 7) for x0, x1, y0 in LEFT + RIGHT]
+    assert extractor._page_gutters(shifted, 612, ("a4", "publisher")) == gutters
+
+    # A page of the same template that does not fit the cached geometry is detected afresh
+    monkeypatch.setattr(extractor, "_detect_column_gutters", detect)
+    assert extractor._page_gutters(LEFT, 612, ("a4", "publisher")) == []
+
+
+def test_cache_keeps_the_most_recent_templates(monkeypatch):
+    monkeypatch.setattr(main, "COLUMN_LAYOUT_CACHE_SIZE", 2)
+    extractor = MCQExtractor()
+    for key in ("one", "two", "one", "three"):
+        extractor._page_gutters(LEFT + RIGHT, 612, (key,))
+    assert list(extractor._column_layout_cache) == [("one",), ("three",)]
+
+
+def _two_column_pdf():
+    doc = fitz.open()
+    page = doc.new_page()
+    columns = [(50, [1, 2, 3]), (320, [4, 5, 6])]
+    for x, numbers in columns:
+        y = 72
+        for number in numbers:
+            for line in [f"{number}. Question number {number} text?", f"A) left{number}" if x == 50 else f"A) right{number}",
+                         "B) other", "C) third", "D) fourth"]:
+                page.insert_text((x, y), line, fontsize=10)
+                y += 14
+            y += 10
+    return doc.tobytes()
+
+
+def test_two_column_pdf_is_read_column_by_column():
+    extractor = MCQExtractor()
+    mcqs, _, _ = extractor.extract_mcqs(_two_column_pdf(), "exam.pdf")
+    assert [mcq.question_number for mcq in mcqs] == [1, 2, 3, 4, 5, 6]
+    assert [mcq.options["A"] for mcq in mcqs] == ["left1", "left2", "left3", "right4", "right5", "right6"]
+    assert all(len(mcq.options) == 4 for mcq in mcqs)
+
+    text = extractor.extract_text_from_pdf(_two_column_pdf())
+    assert text.index("right4") > text.index("left3")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
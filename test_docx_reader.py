@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test the structured DOCX reader: list numbering, question tables, option grids and the text fallback
+"""
+
+import io
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from docx import Document
+from fastapi.testclient import TestClient
+
+import main
+from main import MCQExtractor
+
+extractor = MCQExtractor()
+
+
+def _docx(build):
+    doc = Document()
+    build(doc)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _table(doc, rows):
+    table = doc.add_table(rows=0, cols=max(len(row) for row in rows))
+    for row in rows:
+        for cell, value in zip(table.add_row().cells, row):
+            cell.text = value
+
+
+def test_list_numbered_questions():
+    def build(doc):
+        doc.add_paragraph("What is 2 + 2?", style="List Number")
+        for line in ["A) 3", "B) 4", "C) 5", "Answer: B"]:
+            doc.add_paragraph(line)
+        doc.add_paragraph("Which planet is largest?", style="List Number")
+        for line in ["A) Mars", "B) Jupiter"]:
+            doc.add_paragraph(line)
+
+    mcqs = extractor.extract_mcqs_from_docx(_docx(build))
+    assert [(mcq.question_number, mcq.question) for mcq in mcqs] == [(1, "What is 2 + 2?"), (2, "Which planet is largest?")]
+    assert mcqs[0].options == {"A": "3", "B": "4", "C": "5"}
+    assert mcqs[0].correct_answer == "B"
+    assert mcqs[1].options == {"A": "Mars", "B": "Jupiter"}
+
+
+def test_question_table_with_header():
+    def build(doc):
+        _table(doc, [["No", "Question", "A", "B", "C", "D", "Answer"],
+                     ["1", "Capital of Peru?", "Lima", "Quito", "Bogota", "Santiago", "A"],
+                     ["2", "Square root of 81?", "7", "8", "9", "10", "C"]])
+
+    mcqs = extractor.extract_mcqs_from_docx(_docx(build))
+    assert [mcq.question for mcq in mcqs] == ["Capital of Peru?", "Square root of 81?"]
+    assert mcqs[1].options == {"A": "7", "B": "8", "C": "9", "D": "10"}
+    assert [mcq.correct_answer for mcq in mcqs] == ["A", "C"]
+
+
+def test_option_grid_under_a_numbered_question():
+    def build(doc):
+        doc.add_paragraph("Which of these is a prime number?", style="List Number")
+        _table(doc, [["A) 4", "B) 6"], ["C) 7", "D) 9"]])
+
+    mcqs = extractor.extract_mcqs_from_docx(_docx(build))
+    assert mcqs[0].options == {"A": "4", "B": "6", "C": "7", "D": "9"}
+
+
+def test_text_fallback_keeps_numeric_option_cells():
+    def build(doc):
+        _table(doc, [["1", "How many sides does a triangle have?"],
+                     ["A)", "3"], ["B)", "4"], ["C)", "5"], ["D)", "6"],
+                     ["2.", "What is 10 / 2?"],
+                     ["A", "2", "B", "5"],
+                     ["C", "10", "D", "20"]])
+        doc.add_paragraph("Answer Key: 1-A 2-B")
+
+    assert extractor.extract_mcqs_from_docx(_docx(build)) is None
+    mcqs, _, spec = extractor.extract_mcqs(_docx(build), "quiz.docx")
+    assert spec.name == "docx"
+    assert [mcq.question_number for mcq in mcqs] == [1, 2]
+    assert mcqs[0].options == {"A": "3", "B": "4", "C": "5", "D": "6"}
+    assert mcqs[1].options == {"A": "2", "B": "5", "C": "10", "D": "20"}
+    assert [mcq.correct_answer for mcq in mcqs] == ["A", "B"]
+
+
+def test_row_lines():
+    assert extractor._docx_row_lines(["1", "How many?"]) == ["1. How many?"]
+    assert extractor._docx_row_lines(["3", "4", "5", "6"]) == ["3", "4", "5", "6"]
+    assert extractor._docx_row_lines(["Pick one", "12"]) == ["Pick one", "12"]
+    assert extractor._docx_row_lines(["(a)", "12", "b.", "15"]) == ["(a) 12", "b. 15"]
+
+
+def test_document_analysis_covers_text_outside_the_questions():
+    def build(doc):
+        doc.add_paragraph("Use the formula x^2 + y^2 = r^2 where needed. See the graph below.")
+        doc.add_paragraph("Who wrote Hamlet?", style="List Number")
+        for line in ["A) Shakespeare", "B) Marlowe"]:
+            doc.add_paragraph(line)
+
+    client = TestClient(main.app)
+    files = {"file": ("quiz.docx", _docx(build))}
+    analysis = client.post("/extract-mcq-enhanced", params={"duplicates": False}, files=files).json()["document_analysis"]
+    assert analysis["has_mathematical_content"]
+    limited = client.post("/extract-mcq-enhanced", params={"duplicates": False, "max_questions": 1}, files=files).json()
+    assert not limited["document_analysis"]["has_mathematical_content"]
+
+
+if __name__ == "__main__":
+    test_list_numbered_questions()
+    test_question_table_with_header()
+    test_option_grid_under_a_numbered_question()
+    test_text_fallback_keeps_numeric_option_cells()
+    test_row_lines()
+    test_document_analysis_covers_text_outside_the_questions()
+    print("All DOCX reader tests passed")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test near-duplicate signatures and tagging in DuplicateIndex
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import MCQ, DuplicateIndex
+
+
+def _mcq(number, question, options):
+    return MCQ(question_number=number, question=question, options=options)
+
+
+def test_signature_ignores_case_punctuation_and_option_order():
+    index = DuplicateIndex()
+    first = index.signature("What is the capital of France?", {"A": "Paris", "B": "Rome"})
+    second = index.signature("WHAT is the capital of France", {"A": "Rome", "B": "Paris."})
+    assert (first == second).all()
+    assert index.signature("?!", {}) is None
+
+
+def test_devanagari_questions_have_their_own_signatures():
+    index = DuplicateIndex()
+    options = {"A": "Rs. 100", "B": "Rs. 200"}
+    assert index.signature("कति?", {}) is not None
+
+    mcqs = [
+        _mcq(1, "एउटा कलमको मूल्य कति हो?", options),
+        _mcq(2, "रामसँग कति रुपैयाँ छ?", options),
+        _mcq(3, "एउटा कलमको मूल्य कति हो ?", options),
+    ]
+    index.tag(mcqs)
+    assert [mcq.duplicates for mcq in mcqs] == [[], [], [0]]
+    assert len(index) == 2
+
+
+def test_near_duplicates_are_tagged_and_exact_ones_not_reindexed():
+    index = DuplicateIndex()
+    options = {"A": "Paris", "B": "Rome", "C": "Madrid", "D": "Berlin"}
+    index.tag([_mcq(1, "Which city is the capital of France?", options)], "a.pdf")
+    later = [
+        _mcq(4, "Which city is the capital of France ?", options),
+        _mcq(5, "Which city is the capital city of France?", options),
+        _mcq(6, "Which planet is closest to the Sun?", {"A": "Mercury", "B": "Venus"}),
+    ]
+    index.tag(later, "b.pdf")
+    assert later[0].duplicates == [0]
+    assert later[1].duplicates == [0]
+    assert later[2].duplicates == []
+    assert len(index) == 3
+    assert index.query("Which city is the capital of France?", options)[0]["source"] == "a.pdf"
+
+
+def test_in_memory_index_stops_growing_at_its_cap(monkeypatch):
+    monkeypatch.setattr(main, "DUPLICATE_INDEX_MAX_MEMORY_ENTRIES", 2)
+    index = DuplicateIndex()
+    questions = ["Who wrote Hamlet?", "What is the boiling point of water?", "How many legs does a spider have?",
+                 "Which ocean is the largest?"]
+    mcqs = [_mcq(n, question, {"A": "yes", "B": "no"}) for n, question in enumerate(questions, 1)]
+    index.tag(mcqs)
+    assert len(index) == 2
+    repeat = _mcq(5, mcqs[0].question, mcqs[0].options)
+    index.tag([repeat])
+    assert repeat.duplicates == [0]
+
+
+def test_processes_sharing_a_directory_agree_on_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "DUPLICATE_INDEX_SAVE_EVERY", 3)
+    options = {"A": "yes", "B": "no"}
+    first, second = DuplicateIndex(str(tmp_path)), DuplicateIndex(str(tmp_path))
+
+    first.tag([_mcq(1, "Is water wet at room temperature?", options)])
+    second.tag([_mcq(1, "Does ice float on liquid water?", options)])
+    first.tag([_mcq(2, "Is the moon made of rock and dust?", options)])
+    assert first.query("Does ice float on liquid water?", options)[0]["id"] == 1
+    assert second.query("Is the moon made of rock and dust?", options)[0]["id"] == 2
+    # The third entry triggered a save; both still see the same ids after it
+    assert os.path.exists(tmp_path / "signatures.npy")
+    assert os.path.getsize(tmp_path / "pending.jsonl") == 0
+    second.tag([_mcq(3, "Is sound faster in steel than in air?", options)])
+    assert first.query("Is sound faster in steel than in air?", options)[0]["id"] == 3
+
+    reopened = DuplicateIndex(str(tmp_path))
+    assert len(reopened) == 4
+    assert reopened.query("Is water wet at room temperature?", options)[0]["id"] == 0
+
+
+def test_search_hides_sources_without_the_admin_token(monkeypatch):
+    monkeypatch.setattr(main.mcq_extractor, "_duplicates", DuplicateIndex())
+    monkeypatch.setenv("MCQ_ADMIN_TOKEN", "secret")
+    question, options = "Which gas do plants absorb from the air?", {"A": "CO2", "B": "O2"}
+    main.mcq_extractor.duplicates.tag([_mcq(1, question, options)], "private-exam.pdf")
+    client = TestClient(main.app)
+
+    body = {"question": question, "options": options}
+    match = client.post("/duplicates/search", json=body).json()["matches"][0]
+    assert match == {"id": 0, "similarity": 1.0}
+    match = client.post("/duplicates/search", json=body, headers={"X-Admin-Token": "secret"}).json()["matches"][0]
+    assert match["source"] == "private-exam.pdf"
+
+
+def test_a_document_is_indexed_once_and_never_matches_itself():
+    index = DuplicateIndex()
+    options = {"A": "Paris", "B": "Rome"}
+    first = [_mcq(1, "Which city is the capital of France?", options)]
+    index.tag(first, "a.pdf", document="a" * 64)
+    again = [_mcq(1, "Which city is the capital of France?", options)]
+    index.tag(again, "a-copy.pdf", document="a" * 64)
+    assert again[0].duplicates == []
+    assert len(index) == 1
+    other = [_mcq(3, "Which city is the capital of France?", options)]
+    index.tag(other, "b.pdf", document="b" * 64)
+    assert other[0].duplicates == [0]
+
+
+def test_limited_and_disabled_extractions_are_not_indexed(monkeypatch):
+    monkeypatch.setattr(main.mcq_extractor, "_duplicates", DuplicateIndex())
+    client = TestClient(main.app)
+    text = "\n".join(f"{n}. Which number comes after {n * 11}?\nA) {n * 11 + 1}\nB) {n * 11 + 2}" for n in range(1, 6))
+
+    response = client.post("/extract-mcq", params={"max_questions": 2}, files={"file": ("quiz.txt", text)}).json()
+    assert len(response["mcqs"]) == 2
+    assert len(main.mcq_extractor.duplicates) == 0
+
+    response = client.post("/extract-mcq", params={"duplicates": False}, files={"file": ("quiz.txt", text)}).json()
+    assert all("duplicates" not in mcq for mcq in response["mcqs"])
+    assert len(main.mcq_extractor.duplicates) == 0
+
+    monkeypatch.setenv("MCQ_DUPLICATE_TAGGING", "0")
+    client.post("/extract-mcq", files={"file": ("quiz.txt", text)})
+    assert len(main.mcq_extractor.duplicates) == 0
+    monkeypatch.delenv("MCQ_DUPLICATE_TAGGING")
+
+    client.post("/extract-mcq", files={"file": ("quiz.txt", text)})
+    assert len(main.mcq_extractor.duplicates) == 5
+    response = client.post("/extract-mcq", files={"file": ("quiz.txt", text)}).json()
+    assert len(main.mcq_extractor.duplicates) == 5
+    assert all("duplicates" not in mcq for mcq in response["mcqs"])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
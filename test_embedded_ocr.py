@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test the scanned-PDF OCR path: which pages are OCR'd from their embedded images and which are rendered
+"""
+
+import io
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import fitz
+import pytest
+from PIL import Image
+
+from main import MCQExtractor
+
+
+def _png(width, height, shade=255):
+    buffer = io.BytesIO()
+    Image.new("L", (width, height), shade).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _pdf(*pages):
+    """One A4 page per list of (rect, png) placements"""
+    doc = fitz.open()
+    for placements in pages:
+        page = doc.new_page(width=595, height=842)
+        for rect, png in placements:
+            page.insert_image(fitz.Rect(*rect), stream=png)
+    return doc.tobytes()
+
+
+FULL_PAGE = (0, 0, 595, 842)
+SCAN = _png(1240, 1754)
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    """Records the shape of every image handed to OCR, without Tesseract"""
+    extractor = MCQExtractor()
+    shapes = []
+    monkeypatch.setattr(extractor, "preprocess_image", lambda image: image)
+    monkeypatch.setattr(extractor, "_ocr_image", lambda image: shapes.append(image.shape[:2]) or f"read {len(shapes)}\n")
+    return extractor, shapes
+
+
+def test_image_pages_are_read_at_native_resolution_once_per_image(ocr):
+    extractor, shapes = ocr
+    other = _png(1240, 1754, shade=250)
+    text = extractor._extract_text_from_scanned_pdf(_pdf([(FULL_PAGE, SCAN)], [(FULL_PAGE, other)], [(FULL_PAGE, SCAN)]))
+    assert shapes == [(1754, 1240), (1754, 1240)]
+    assert [label for label, _, _ in text.pages] == ["1", "2", "3"]
+    assert text.page_body(2).strip() == "read 1"
+
+
+def test_images_are_read_top_to_bottom_and_icons_skipped(ocr):
+    extractor, shapes = ocr
+    top, bottom, icon = _png(1240, 900, shade=200), _png(1240, 800, shade=100), _png(16, 16)
+    page = [((0, 430, 595, 842), bottom), ((0, 0, 595, 430), top), ((10, 10, 20, 20), icon)]
+    text = extractor._extract_text_from_scanned_pdf(_pdf(page))
+    assert shapes == [(900, 1240), (800, 1240)]
+    assert text.page_body(0) == "read 1\nread 2\n"
+
+
+@pytest.mark.parametrize("placements", [
+    [(FULL_PAGE, _png(300, 424))],  # below the 2x render's resolution
+    [((0, 0, 300, 400), SCAN)],  # most of the page is not covered by images
+])
+def test_pages_that_images_do_not_cover_well_are_rendered(ocr, placements):
+    extractor, shapes = ocr
+    extractor._extract_text_from_scanned_pdf(_pdf(placements))
+    # The 2x render of an A4 page
+    assert shapes == [(1684, 1190)]
+
+
+def test_embedded_image_ocr_can_be_turned_off(ocr, monkeypatch):
+    extractor, shapes = ocr
+    monkeypatch.setenv("MCQ_OCR_EMBEDDED_IMAGES", "0")
+    extractor._extract_text_from_scanned_pdf(_pdf([(FULL_PAGE, SCAN)]))
+    assert shapes == [(1684, 1190)]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
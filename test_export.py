@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test exporting MCQs as CSV, Parquet and Arrow, directly and through /extract-mcq/export
+"""
+
+import csv
+import io
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import MCQ, MCQ_EXPORT_COLUMNS, export_mcq_batches, export_mcqs
+
+MCQS = [
+    MCQ(question_number=1, question="What is 2 + 2?", options={"A": "3", "B": "4", "C": "5", "D": "6"},
+        correct_answer="B", page=1, question_type="mathematical", math_content={"has_math": True}),
+    MCQ(question_number=2, question="Which city, \"the capital\", is in France?", options={"A": "Paris", "B": "Lyon"},
+        page=2, missing_options=["C", "D"]),
+]
+TEXT = "1. What is 12 + 30?\nA) 42\nB) 24\nC) 32\nD) 52\nAnswer: A\n2. Which planet is red?\nA) Mars\nB) Venus\n"
+
+
+def test_csv_round_trip():
+    sink = io.BytesIO()
+    export_mcqs(MCQS, "csv", sink)
+    rows = list(csv.DictReader(io.StringIO(sink.getvalue().decode("utf-8"))))
+    assert list(rows[0]) == list(MCQ_EXPORT_COLUMNS)
+    assert rows[0]["option_b"] == "4"
+    assert rows[0]["correct_answer"] == "B"
+    assert rows[0]["has_math_content"] == "True"
+    assert rows[1]["question"] == MCQS[1].question
+    assert rows[1]["option_c"] == ""
+    assert rows[1]["has_missing_options"] == "True"
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_arrow_formats_round_trip(format):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    sink = io.BytesIO()
+    export_mcq_batches([MCQS[:1], MCQS[1:]], format, sink)
+    sink.seek(0)
+    table = pq.read_table(sink) if format == "parquet" else pa.ipc.open_stream(sink).read_all()
+    assert table.column_names == list(MCQ_EXPORT_COLUMNS)
+    rows = table.to_pylist()
+    assert rows[0]["question_number"] == 1
+    assert rows[0]["has_math_content"] is True
+    assert rows[1]["option_c"] is None
+    assert rows[1]["page"] == 2
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        export_mcqs(MCQS, "xml", io.BytesIO())
+
+
+def test_endpoint_exports_classified_mcqs_without_document_analysis(monkeypatch):
+    detect_visual_content = main.mcq_extractor.detect_visual_content
+
+    def detect_per_mcq(text, document=None):
+        assert document is None, "document-level analysis is not exported"
+        return detect_visual_content(text)
+
+    monkeypatch.setattr(main.mcq_extractor, "detect_visual_content", detect_per_mcq)
+    response = TestClient(main.app).post("/extract-mcq/export", params={"duplicates": False},
+                                         files={"file": ("quiz.txt", TEXT)})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="quiz.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8"))))
+    assert [row["option_a"] for row in rows] == ["42", "Mars"]
+    assert [row["question_type"] for row in rows] == ["mathematical", "standard"]
+    assert rows[0]["correct_answer"] == "A"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
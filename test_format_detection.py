@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test content sniffing in detect_file_format and the extractor registry
+"""
+
+import io
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import fitz
+import pytest
+from docx import Document
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import main
+from main import EXTRACTOR_REGISTRY, ExtractorSpec, MCQExtractor, detect_file_format, register_extractor
+
+
+def _bmp_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'white').save(buffer, 'BMP')
+    return buffer.getvalue()
+
+
+def test_real_bmp_is_detected_without_extension():
+    assert detect_file_format(_bmp_bytes()).name == "image"
+    assert detect_file_format(_bmp_bytes(), "scan.bmp").name == "image"
+
+
+def test_text_starting_with_bm_is_not_a_bmp():
+    content = b"BMI and health quiz\n1. What does BMI measure?\nA) Height\nB) Body mass\nAnswer: B\n"
+    assert detect_file_format(content, "quiz.txt").name == "txt"
+    assert detect_file_format(content).name == "txt"
+
+    mcqs, _, spec = MCQExtractor().extract_mcqs(content, "quiz.txt")
+    assert spec.name == "txt"
+    assert len(mcqs) == 1
+    assert mcqs[0].correct_answer == "B"
+
+
+def test_text_extension_wins_over_printable_image_signature():
+    content = b"GIF89a quiz\n1. Which format is animated?\nA) GIF\nB) BMP\n"
+    assert detect_file_format(content, "quiz.txt").name == "txt"
+    assert detect_file_format(content, "quiz.gif").name == "image"
+
+
+def test_content_wins_over_a_wrong_or_missing_extension():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "1. Question?")
+    buffer = io.BytesIO()
+    Document().save(buffer)
+    assert detect_file_format(doc.tobytes(), "exam.txt").name == "pdf"
+    assert detect_file_format(buffer.getvalue(), "exam.xlsx").name == "docx"
+    assert detect_file_format(buffer.getvalue()).name == "docx"
+
+
+@pytest.mark.parametrize("content,message", [
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + bytes(504), "Legacy binary Office files"),
+    (bytes(range(256)), "Unsupported file type: unknown"),
+])
+def test_unsupported_content_is_rejected(content, message):
+    with pytest.raises(ValueError, match=message):
+        detect_file_format(content, "exam.xls" if content.startswith(b"\xd0") else None)
+
+
+def test_registered_formats_are_sniffed_and_dispatched(monkeypatch):
+    monkeypatch.setattr(main, "EXTRACTOR_REGISTRY", dict(EXTRACTOR_REGISTRY))
+    spec = register_extractor(ExtractorSpec(
+        name="quizpack", method="extract_text_from_quizpack", mime_type="application/x-quizpack",
+        extensions=("qpk",), sniff=lambda content: content.startswith(b"QPK\x00"), cost=1,
+        capabilities=frozenset({"text"})
+    ))
+    extractor = MCQExtractor()
+    monkeypatch.setattr(extractor, "extract_text_from_quizpack", lambda content: content[4:].decode(), raising=False)
+
+    content = b"QPK\x001. Which is a prime?\nA) 4\nB) 7\nAnswer: B"
+    assert detect_file_format(content, "pack.bin") is spec
+    mcqs, _, detected = extractor.extract_mcqs(content, "pack.bin")
+    assert detected is spec
+    assert mcqs[0].correct_answer == "B"
+
+    formats = {entry["name"]: entry for entry in TestClient(main.app).get("/formats").json()["formats"]}
+    assert formats["quizpack"]["extensions"] == ["qpk"]
+    assert formats["pdf"]["capabilities"] == ["layout", "ocr_fallback", "pages", "text"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test how uploaded images are decoded for OCR: JPEG draft scaling, tall screenshots and multi-frame TIFFs
+"""
+
+import io
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from PIL import Image
+
+from main import MCQExtractor, PageRangeError
+
+extractor = MCQExtractor()
+
+
+def _image(size, format, frames=1):
+    images = [Image.new("RGB", size, (255, 255, 255)) for _ in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format=format, save_all=frames > 1, append_images=images[1:])
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def test_large_jpeg_is_draft_decoded_near_the_target():
+    gray = extractor._decode_image_for_ocr(_image((4032, 3024), "JPEG"))
+    assert gray.shape == (1512, 2016)
+    assert gray.ndim == 2
+
+
+def test_tall_screenshot_keeps_its_native_width():
+    assert extractor._decode_image_for_ocr(_image((1170, 4000), "JPEG")).shape == (4000, 1170)
+    assert extractor._decode_image_for_ocr(_image((1170, 4000), "PNG")).shape == (4000, 1170)
+
+
+def test_other_formats_are_reduced_by_a_whole_factor():
+    assert extractor._decode_image_for_ocr(_image((6000, 4500), "PNG")).shape == (1500, 2000)
+    assert extractor._decode_image_for_ocr(_image((1600, 1200), "PNG")).shape == (1200, 1600)
+
+
+def test_tiff_frames_are_ocrd_as_pages(monkeypatch):
+    decoded = []
+    monkeypatch.setattr(extractor, "preprocess_image", lambda gray: gray)
+    monkeypatch.setattr(extractor, "_ocr_image", lambda gray: f"{len(decoded)}. Question {len(decoded)}?\nA) yes\nB) no")
+    decode = extractor._decode_image_for_ocr
+    monkeypatch.setattr(extractor, "_decode_image_for_ocr", lambda image: decoded.append(image.tell()) or decode(image))
+
+    buffer = io.BytesIO()
+    _image((200, 100), "TIFF", frames=3).save(buffer, format="TIFF", save_all=True)
+    text = extractor.extract_text_from_image(buffer.getvalue(), pages=[(2, 3)])
+    assert decoded == [1, 2]
+    assert [label for label, _, _ in text.pages] == ["2", "3"]
+    assert "2. Question 2?" in text
+
+
+def _frames_ocr(monkeypatch):
+    """Replace OCR with one question per frame, recording the frames read"""
+    read = []
+    monkeypatch.setattr(extractor, "preprocess_image", lambda gray: gray)
+    monkeypatch.setattr(extractor, "_ocr_image", lambda gray: f"{len(read)}. Question?\nA) yes\nB) no\n"
+                        if not read.append(gray.shape) else "")
+    return read
+
+
+def test_animated_gif_frames_stop_after_max_questions(monkeypatch):
+    read = _frames_ocr(monkeypatch)
+    frames = [Image.new("L", (120, 80), shade) for shade in (0, 80, 160, 240, 40)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:])
+    text = extractor.extract_text_from_image(buffer.getvalue(), max_questions=2)
+    # The third frame starts a question beyond the limit, so the first two are complete
+    assert len(read) == 3
+    assert [label for label, _, _ in text.pages] == ["1", "2", "3"]
+
+
+def test_pages_beyond_the_frames_are_rejected(monkeypatch):
+    _frames_ocr(monkeypatch)
+    buffer = io.BytesIO()
+    _image((200, 100), "TIFF", frames=2).save(buffer, format="TIFF", save_all=True)
+    with pytest.raises(PageRangeError, match="2 pages"):
+        extractor.extract_text_from_image(buffer.getvalue(), pages=[(3, None)])
+
+    single = io.BytesIO()
+    Image.new("L", (200, 100), 255).save(single, format="PNG")
+    with pytest.raises(PageRangeError, match="1 page$"):
+        extractor.extract_text_from_image(single.getvalue(), pages=[(2, 2)])
+    assert extractor.extract_text_from_image(single.getvalue(), pages=[(1, 1)]).startswith("1. Question?")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test the layout-aware PDF segmenter on clean and OCR-noisy text
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import fitz
+
+from main import MCQExtractor
+
+QUESTIONS = [
+    ("What is the capital of France?", ["London", "Berlin", "Paris", "Madrid"], "C"),
+    ("How many legs does a spider have?", ["Six", "Eight", "Ten", "Twelve"], "B"),
+    ("Which planet is known as the red planet?", ["Venus", "Mars", "Earth", "Jupiter"], "B"),
+]
+
+
+def _pdf(lines):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((50, 50), "\n".join(lines), fontsize=10)
+    return doc.tobytes()
+
+
+def _lines(labels):
+    lines = []
+    for number, (question, options, answer) in enumerate(QUESTIONS, 1):
+        lines.append(f"{number}. {question}")
+        lines.extend(f"{label}) {option}" for label, option in zip(labels[number - 1], options))
+        lines.append(f"Answer: {answer}")
+    return lines
+
+
+def _check(mcqs):
+    assert [mcq.question_number for mcq in mcqs] == [1, 2, 3]
+    for mcq, (question, options, answer) in zip(mcqs, QUESTIONS):
+        assert mcq.question == question
+        assert list(mcq.options.values()) == options
+        assert mcq.correct_answer == answer
+
+
+def test_clean_layout():
+    _check(MCQExtractor().extract_mcqs_from_pdf(_pdf(_lines(["ABCD"] * 3))))
+
+
+def test_misread_option_labels_keep_the_following_options():
+    # "G)" for "C)" and "8)" for "B)", as OCR text layers often have
+    labels = ["ABGD", "A8CD", "a8Gd"]
+    _check(MCQExtractor().extract_mcqs_from_pdf(_pdf(_lines(labels))))
+
+
+def test_next_question_number_is_not_read_as_an_option():
+    lines = ["7. Which gas do plants absorb?", "A) Oxygen", "B) Carbon dioxide", "C) Helium", "D) Neon",
+             "8) Which metal is liquid at room temperature?", "A) Iron", "B) Mercury", "C) Gold", "D) Tin"]
+    mcqs = MCQExtractor().extract_mcqs_from_pdf(_pdf(lines))
+    assert [mcq.question_number for mcq in mcqs] == [7, 8]
+    assert mcqs[1].options["B"] == "Mercury"
+
+
+if __name__ == "__main__":
+    test_clean_layout()
+    test_misread_option_labels_keep_the_following_options()
+    test_next_question_number_is_not_read_as_an_option()
+    print("All layout segmenter tests passed")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test the MCQ record: slots, mapping access, serialization and in-place updates through the pipeline
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import orjson
+import pytest
+
+from main import MCQ, MCQJSONResponse, MCQExtractor
+
+
+def _mcq(**kwargs):
+    return MCQ(question_number=1, question="What is 2 + 2?", options={"A": "3", "B": "4"}, **kwargs)
+
+
+def test_record_is_slotted_with_mapping_access():
+    mcq = _mcq(correct_answer="B")
+    assert not hasattr(mcq, "__dict__")
+    with pytest.raises(AttributeError):
+        mcq.explanation = "four"
+    assert mcq["correct_answer"] == "B"
+    assert mcq.get("page") is None
+    assert mcq.get("explanation", "none") == "none"
+    with pytest.raises(KeyError):
+        mcq["explanation"]
+
+
+def test_optional_fields_are_left_out_of_the_response():
+    assert _mcq().to_dict() == {"question_number": 1, "question": "What is 2 + 2?",
+                                "options": {"A": "3", "B": "4"}, "correct_answer": None}
+    data = _mcq(page=3, missing_options=["C", "D"], duplicates=[7]).to_dict()
+    assert (data["page"], data["missing_options"], data["duplicates"]) == (3, ["C", "D"], [7])
+
+
+def test_content_analysis_shares_the_same_objects():
+    math = {"has_math": True, "math_symbols": ["+"]}
+    visual = {"has_visual_content": False}
+    data = _mcq(math_content=math, visual_content=visual, question_type="mathematical").to_dict()
+    assert data["content_analysis"]["mathematics"] is data["math_content"] is math
+    assert data["content_analysis"]["visual_elements"] is visual
+    assert data["has_math_content"] is True
+    assert data["has_visual_content"] is False
+
+
+def test_responses_serialize_records_directly():
+    body = orjson.loads(MCQJSONResponse({"mcqs": [_mcq(page=2)], "fields": frozenset({"page"})}).body)
+    assert body["mcqs"][0]["page"] == 2
+    assert body["fields"] == ["page"]
+    with pytest.raises(TypeError):
+        MCQJSONResponse({"value": object()})
+
+
+def test_pipeline_updates_records_in_place():
+    extractor = MCQExtractor()
+    mcqs = extractor.parse_mcqs("1. What is 2 + 2?\nA) 3\nB) 4\nC) 5\nD) 6\nAnswer: B")
+    mcq = mcqs[0]
+    assert mcq.correct_answer == "B"
+    assert extractor._validate_and_fix_mcq(mcq) is mcq
+    assert mcq.options == {"A": "3", "B": "4", "C": "5", "D": "6"}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test word-level OCR: line grouping and the re-read of low-confidence lines (Tesseract is mocked)
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+import numpy as np
+import pytest
+
+import main
+from main import MCQExtractor
+
+PAGE = np.full((300, 400), 255, dtype=np.uint8)
+
+
+def _data(words):
+    """image_to_data output for (block, par, line, left, top, width, height, text, conf) word rows"""
+    keys = ("block_num", "par_num", "line_num", "left", "top", "width", "height", "text", "conf")
+    data = {key: [] for key in keys + ("level",)}
+    for word in words:
+        for key, value in zip(keys, word):
+            data[key].append(value)
+        data["level"].append(5)
+    # A line-level row, which is skipped
+    for key in keys:
+        data[key].append("" if key == "text" else 0)
+    data["level"].append(4)
+    return data
+
+
+@pytest.fixture
+def tesseract(monkeypatch):
+    calls = []
+    fake = SimpleNamespace(Output=SimpleNamespace(DICT="dict"), reads=[])
+
+    def image_to_data(image, config, output_type):
+        calls.append(image.shape)
+        return fake.reads.pop(0)
+
+    fake.image_to_data = image_to_data
+    fake.calls = calls
+    monkeypatch.setattr(main, "_import_pytesseract", lambda: fake)
+    return fake
+
+
+def test_confident_lines_are_read_once(tesseract):
+    tesseract.reads = [_data([
+        (1, 1, 1, 10, 10, 30, 20, "1.", 96), (1, 1, 1, 50, 10, 80, 20, "Capital?", 93),
+        (1, 1, 2, 10, 40, 30, 20, "A)", 95), (1, 1, 2, 50, 40, 60, 20, "Paris", 91),
+        (1, 2, 1, 10, 90, 30, 20, "B)", 95), (1, 2, 1, 50, 90, 60, 20, "Rome", 90),
+    ])]
+    text = MCQExtractor()._ocr_image(PAGE)
+    assert text == "1. Capital?\nA) Paris\n\nB) Rome\n"
+    assert len(tesseract.calls) == 1
+
+
+def test_doubtful_lines_are_reread_upscaled_in_one_call(tesseract):
+    tesseract.reads = [
+        _data([
+            (1, 1, 1, 10, 10, 30, 20, "1.", 96), (1, 1, 1, 50, 10, 80, 20, "Capital?", 93),
+            (1, 1, 2, 10, 100, 30, 20, "8)", 70), (1, 1, 2, 50, 100, 60, 20, "Paris", 92),
+            (1, 1, 3, 10, 160, 30, 20, "C)", 95), (1, 1, 3, 50, 160, 60, 20, "Lyom", 40),
+        ]),
+        # Strip: least confident line first (y=24), then the doubtful label line (y=104)
+        _data([
+            (1, 1, 1, 20, 40, 60, 20, "Lyon", 94), (1, 1, 1, 2, 40, 10, 20, "C)", 96),
+            (1, 1, 2, 20, 120, 60, 20, "Paris", 90), (1, 1, 2, 2, 120, 10, 20, "B)", 91),
+            # Fragment of a neighbouring line in the padding of the first region
+            (1, 1, 3, 20, 20, 60, 8, "noise", 99),
+        ]),
+    ]
+    text = MCQExtractor()._ocr_image(PAGE)
+    assert text == "1. Capital?\nB) Paris\nC) Lyon\n"
+    assert len(tesseract.calls) == 2
+    # Two regions of 28 rows upscaled twice, with a gap above, between and below them
+    assert tesseract.calls[1][0] == 24 + 56 + 24 + 56 + 24
+
+
+def test_a_less_confident_reread_is_discarded(tesseract):
+    tesseract.reads = [
+        _data([(1, 1, 1, 10, 100, 60, 20, "Lyom", 50)]),
+        _data([(1, 1, 1, 20, 40, 60, 20, "Lynn", 30)]),
+    ]
+    assert MCQExtractor()._ocr_image(PAGE) == "Lyom\n"
+
+
+def test_rechecks_stay_within_the_area_limit(monkeypatch):
+    monkeypatch.setattr(main, "OCR_RECHECK_MAX_AREA", 0.05)
+    extractor = MCQExtractor()
+    lines = extractor._ocr_lines(_data([
+        (1, 1, 1, 0, 0, 390, 20, "wide", 10),
+        (1, 1, 2, 0, 50, 40, 20, "narrow", 20),
+        (1, 1, 3, 0, 100, 40, 20, "sure", 95),
+    ]))
+    assert [line.words for line in extractor._select_ocr_rechecks(PAGE, lines)] == [["narrow"]]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test page-range parsing and page selection for the pages parameter
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import MCQExtractor, PageRangeError, PageScan, parse_page_ranges
+
+
+def _pdf(page_count):
+    doc = fitz.open()
+    for page_num in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{page_num + 1}. Question {page_num + 1}?\nA) yes\nB) no\nAnswer: A")
+    return doc.tobytes()
+
+
+def test_parse_page_ranges():
+    assert parse_page_ranges("1-3,5,8-") == [(1, 3), (5, 5), (8, None)]
+    assert parse_page_ranges(" 2 - 4 , ") == [(2, 4)]
+
+
+@pytest.mark.parametrize("spec", ["", "0", "3-1", "a-b", "1-2-3", "-4"])
+def test_parse_page_ranges_rejects_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec)
+
+
+def test_page_scan_selects_pages_within_the_document():
+    assert list(PageScan(5, [(2, 3), (5, None), (4, 9)])) == [1, 2, 3, 4]
+    assert list(PageScan(3)) == [0, 1, 2]
+
+
+def test_page_scan_rejects_pages_beyond_the_document():
+    with pytest.raises(PageRangeError, match="3 pages"):
+        PageScan(3, [(5, 9)])
+
+
+def test_out_of_range_pages_fail_before_extraction():
+    extractor = MCQExtractor()
+    with pytest.raises(PageRangeError):
+        extractor.extract_mcqs(_pdf(3), "exam.pdf", pages=[(50, 60)])
+    with pytest.raises(PageRangeError):
+        extractor.extract_text(_pdf(3), "exam.pdf", pages=[(4, None)])
+
+
+def test_limited_requests_do_not_update_profiles():
+    extractor = MCQExtractor()
+    mcqs, _, _ = extractor.extract_mcqs(_pdf(3), "exam.pdf", pages=[(2, 2)])
+    assert [mcq.question_number for mcq in mcqs] == [2]
+    assert not extractor.profiles._profiles
+
+    extractor.extract_mcqs(_pdf(3), "exam.pdf")
+    assert extractor.profiles._profiles
+
+
+def test_pages_are_rejected_for_formats_without_pages():
+    extractor = MCQExtractor()
+    text = b"1. Question 1?\nA) yes\nB) no"
+    with pytest.raises(PageRangeError, match="TXT files have no pages"):
+        extractor.extract_mcqs(text, "quiz.txt", pages=[(1, 1)])
+    with pytest.raises(PageRangeError):
+        extractor.extract_text(text, "quiz.txt", pages=[(1, 1)])
+
+    client = TestClient(main.app)
+    for endpoint in ("/extract-mcq", "/extract-mcq-enhanced", "/extract-text", "/extract-mcq/export"):
+        response = client.post(endpoint, params={"pages": "1"}, files={"file": ("quiz.txt", text)})
+        assert response.status_code == 400, endpoint
+        assert "no pages" in response.json()["detail"]
+    assert client.post("/extract-mcq", params={"pages": "2"}, files={"file": ("exam.pdf", _pdf(3))}).status_code == 200
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
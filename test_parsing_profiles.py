@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test template learning: fingerprints, learned pattern profiles, their reuse and persistence
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from main import MCQExtractor, ParsingProfileStore, PatternSet
+
+HEADER = "Model Exam Paper 2024\nPublisher Press\nTime: 45 minutes\n"
+
+
+def _paper(first, count=5):
+    return HEADER + "\n".join(f"{n}. Which number follows {n * 3}?\nA) {n * 3 + 1}\nB) {n * 3 + 2}\nC) {n}\nD) {n + 9}"
+                              for n in range(first, first + count))
+
+
+def test_fingerprint_masks_numbers_and_ignores_body():
+    extractor = MCQExtractor()
+    assert extractor._document_fingerprint("txt", _paper(1)) == extractor._document_fingerprint("txt", _paper(40))
+    assert (extractor._document_fingerprint("txt", "Another Publisher\n" + _paper(1))
+            != extractor._document_fingerprint("txt", _paper(1)))
+    assert extractor._document_fingerprint("txt", _paper(1)) != extractor._document_fingerprint("pdf", _paper(1))
+
+
+def test_profile_is_learned_then_reused(monkeypatch):
+    extractor = MCQExtractor()
+    fingerprint = extractor._document_fingerprint("txt", _paper(1))
+    extractor.parse_mcqs(_paper(1), fingerprint=fingerprint)
+    profile = extractor.profiles.get(fingerprint)
+    assert profile.documents == 1
+    assert 0 < len(profile.question_patterns) < len(extractor.question_patterns)
+    assert 0 < len(profile.option_patterns) < len(extractor.option_patterns)
+
+    used = []
+    parse = extractor._parse_mcqs_with_patterns
+
+    def record_patterns(document, patterns, max_questions):
+        used.append((len(patterns.question), len(patterns.option)))
+        return parse(document, patterns, max_questions)
+
+    monkeypatch.setattr(extractor, "_parse_mcqs_with_patterns", record_patterns)
+    mcqs = extractor.parse_mcqs(_paper(20), fingerprint=fingerprint)
+    assert [mcq.question_number for mcq in mcqs] == list(range(20, 25))
+    assert used == [(len(profile.question_patterns), len(profile.option_patterns))]
+    assert profile.documents == 2
+
+
+def test_unconfident_profile_parse_falls_back_to_every_pattern():
+    extractor = MCQExtractor()
+    fingerprint = "f" * 40
+    # A profile whose option pattern never matches this text
+    extractor.profiles.learn_patterns(fingerprint, PatternSet(question=[], option=[], matched_question={0},
+                                                              matched_option={9}))
+    mcqs = extractor.parse_mcqs(_paper(1), fingerprint=fingerprint)
+    assert all(len(mcq.options) == 4 for mcq in mcqs)
+    assert extractor.profiles.get(fingerprint).option_patterns != [9]
+
+
+def test_partial_parses_are_not_learned():
+    extractor = MCQExtractor()
+    fingerprint = extractor._document_fingerprint("txt", _paper(1))
+    extractor.parse_mcqs(_paper(1), fingerprint=fingerprint, max_questions=2)
+    extractor.parse_mcqs(_paper(1), fingerprint=fingerprint, learn=False)
+    assert extractor.profiles.get(fingerprint) is None
+
+
+def test_profiles_persist_and_stay_bounded(tmp_path):
+    path = str(tmp_path / "profiles.json")
+    store = ParsingProfileStore(path, max_profiles=2)
+    for fingerprint in ("a", "b", "c"):
+        store.learn_patterns(fingerprint, PatternSet(question=[], option=[], matched_question={0}, matched_option={2}))
+    store.record_structured("c", False)
+
+    reopened = ParsingProfileStore(path)
+    assert reopened.get("a") is None
+    assert reopened.get("b").question_patterns == [0]
+    assert reopened.get("c").structured is False
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_unreadable_profile_file_starts_empty(tmp_path):
+    path = tmp_path / "profiles.json"
+    path.write_text("not json")
+    assert ParsingProfileStore(str(path)).get("a") is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test the admin request profiler: which requests use up the armed slots
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import ProfilingMiddleware, RequestProfiler
+
+QUIZ = ("quiz.txt", "1. Which is a prime number?\nA) 4\nB) 7\nAnswer: B")
+ADMIN = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("MCQ_ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(main, "request_profiler", RequestProfiler())
+    # The hook is installed at import time only when MCQ_ADMIN_TOKEN is set, so wrap the app here
+    return TestClient(ProfilingMiddleware(main.app))
+
+
+def test_only_requests_reaching_extraction_use_slots(client):
+    assert client.post("/admin/profiling/start", params={"requests": 2}, headers=ADMIN).status_code == 200
+
+    assert client.post("/extract-mcq", params={"profile": "bad"}, files={"file": QUIZ}).status_code == 400
+    assert client.post("/extract-mcq", params={"pages": "x"}, files={"file": QUIZ}).status_code == 400
+    assert client.post("/extract-mcq", params={"max_questions": 0}, files={"file": QUIZ}).status_code == 422
+    assert client.get("/admin/profiling", headers=ADMIN).json()["remaining_requests"] == 2
+
+    assert client.post("/extract-mcq", params={"duplicates": False}, files={"file": QUIZ}).status_code == 200
+    # No MCQs is a 400 too, but only after extraction ran, so it is profiled
+    assert client.post("/extract-mcq", files={"file": ("notes.txt", "hello")}).status_code == 400
+    status = client.get("/admin/profiling", headers=ADMIN).json()
+    assert status["remaining_requests"] == 0
+    assert status["profiled_requests"] == 2
+    assert not status["armed"]
+    assert "extract_mcqs" in client.get("/admin/profiling/stats", headers=ADMIN).text
+
+
+def test_slots_are_not_given_back_to_a_later_arming(client):
+    profiler = main.request_profiler
+    profiler.arm(requests=1)
+    assert profiler.claim()
+    profiler.arm(requests=3)
+    profiler.record(None)
+    assert profiler.remaining == 3
+
+
+def test_admin_endpoints_need_the_token(client):
+    assert client.post("/admin/profiling/start", params={"requests": 1}).status_code == 403
+    assert client.post("/admin/profiling/start", headers=ADMIN).status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
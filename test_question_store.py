@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test storing extracted MCQs and searching them with QuestionStore
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import MCQ, QuestionStore
+
+FRANCE = "f" * 64
+SCIENCE = "5" * 64
+
+
+def _mcq(number, question, options, answer=None, page=None):
+    return MCQ(question_number=number, question=question, options=options, correct_answer=answer, page=page)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = QuestionStore(str(tmp_path / "questions.db"))
+    store.store_document(FRANCE, "geography.pdf", "pdf", [
+        _mcq(1, "What is the capital of France?", {"A": "Paris", "B": "Lyon"}, "A", page=1),
+        _mcq(2, "Which river flows through Paris, the capital?", {"A": "Seine", "B": "Loire"}, "A", page=1),
+        _mcq(3, "Which mountain range borders France and Spain?", {"A": "Alps", "B": "Pyrenees"}, "B", page=2),
+    ])
+    store.store_document(SCIENCE, "science.txt", "txt", [
+        _mcq(1, "Which gas do plants absorb?", {"A": "Oxygen", "B": "Carbon dioxide"}, "B"),
+        _mcq(2, "एउटा कलमको मूल्य कति हो?", {"A": "Rs. 100", "B": "Rs. 200"}),
+    ])
+    return store
+
+
+def test_terms_are_anded_and_options_are_searched(store):
+    total, results = store.search("capital France")
+    assert total == 1
+    assert results[0]["question_number"] == 1
+    assert results[0]["document"] == {"sha256": FRANCE, "filename": "geography.pdf", "file_type": "pdf"}
+    assert results[0]["options"] == {"A": "Paris", "B": "Lyon"}
+    assert results[0]["page"] == 1
+
+    total, results = store.search("pyrenees")
+    assert [r["question_number"] for r in results] == [3]
+
+
+def test_query_syntax_is_treated_as_words(store):
+    # Quotes, operators and brackets would be FTS5 syntax errors; AND is just a word of question 3
+    total, results = store.search('"France" AND Spain)')
+    assert total == 1
+    assert results[0]["question_number"] == 3
+    assert store.search('Paris*')[0] == 2
+    with pytest.raises(ValueError):
+        store.search("?!")
+
+
+def test_results_are_ranked_by_bm25(store):
+    store.store_document("b" * 64, "rivers.txt", "txt", [
+        _mcq(1, "Which of these cities was founded first, according to historians of rivers?",
+             {"A": "Rome", "B": "Athens"}),
+        _mcq(2, "Which rivers are longer than other rivers?", {"A": "Nile", "B": "Amazon"}),
+    ])
+    _, results = store.search("rivers")
+    assert [r["question_number"] for r in results] == [2, 1]
+
+
+def test_devanagari_words_are_searchable(store):
+    total, results = store.search("मूल्य")
+    assert total == 1
+    assert results[0]["document"]["sha256"] == SCIENCE
+
+
+def test_limit_and_offset_page_through_a_document(store):
+    total, first = store.search(document=FRANCE.upper(), limit=2)
+    assert total == 3
+    assert [r["question_number"] for r in first] == [1, 2]
+    _, rest = store.search(document=FRANCE, limit=2, offset=2)
+    assert [r["question_number"] for r in rest] == [3]
+    assert store.search("Which", document=SCIENCE)[0] == 1
+
+
+def test_storing_a_document_again_replaces_its_questions(store):
+    store.store_document(FRANCE, "geography-v2.pdf", "pdf", [
+        _mcq(1, "What is the capital of Italy?", {"A": "Rome", "B": "Milan"}, "A"),
+    ])
+    assert store.search("France")[0] == 0
+    total, results = store.search(document=FRANCE)
+    assert total == 1
+    assert results[0]["document"]["filename"] == "geography-v2.pdf"
+    assert store.search("Italy")[0] == 1
+    assert store.search(document=SCIENCE)[0] == 2
+
+
+def test_endpoint_needs_the_admin_token_for_other_uploaders_content(store, monkeypatch):
+    monkeypatch.setattr(main, "question_store", store)
+    monkeypatch.setenv("MCQ_ADMIN_TOKEN", "secret")
+    client = TestClient(main.app)
+
+    assert client.get("/questions/search", params={"q": "capital"}).status_code == 403
+    response = client.get("/questions/search", params={"q": "capital", "document": FRANCE})
+    assert response.status_code == 200
+    assert response.json()["results"][0]["document"] == {"sha256": FRANCE, "file_type": "pdf"}
+
+    admin = {"X-Admin-Token": "secret"}
+    response = client.get("/questions/search", params={"q": "capital"}, headers=admin)
+    assert response.json()["total"] == 2
+    assert response.json()["results"][0]["document"]["filename"] == "geography.pdf"
+    assert client.get("/questions/search", params={"q": "capital"},
+                      headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test per-MCQ field selection (profile, compact, fields) and gzip compression of responses
+"""
+
+import gzip
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from main import MCQ, MCQ_FIELD_PROFILES, _resolve_mcq_fields
+
+TEXT = "\n".join(f"{n}. What is {n} + {n}?\nA) {n}\nB) {2 * n}\nC) {3 * n}\nD) {4 * n}\nAnswer: B"
+                 for n in range(1, 31))
+
+
+def test_profiles_and_compact_pick_the_default_fields():
+    assert _resolve_mcq_fields("full", None) is None
+    assert _resolve_mcq_fields("full", None, compact=True) == MCQ_FIELD_PROFILES["compact"]
+    assert _resolve_mcq_fields("minimal", None, compact=True) == MCQ_FIELD_PROFILES["minimal"]
+
+
+def test_explicit_fields_take_precedence():
+    assert _resolve_mcq_fields("full", "question, options") == {"question", "options"}
+    assert _resolve_mcq_fields("minimal", "page") == {"page"}
+    assert _resolve_mcq_fields("full", "math_content", compact=True) == {"math_content"}
+    assert _resolve_mcq_fields("summary", " , ") == MCQ_FIELD_PROFILES["summary"]
+
+
+def test_unknown_profile_or_field_is_rejected():
+    for profile, fields in [("tiny", None), ("full", "question,answer")]:
+        with pytest.raises(HTTPException) as error:
+            _resolve_mcq_fields(profile, fields)
+        assert error.value.status_code == 400
+
+
+def test_to_dict_keeps_only_the_selected_fields():
+    mcq = MCQ(question_number=1, question="Q?", options={"A": "x"}, math_content={"has_math": False},
+              visual_content={"has_visual_content": False})
+    assert set(mcq.to_dict()) >= {"content_analysis", "math_content", "visual_content"}
+    assert mcq.to_dict(frozenset({"question", "math_content"})) == {"question": "Q?", "math_content": {"has_math": False}}
+
+
+def test_enhanced_endpoint_returns_requested_fields_with_compact():
+    client = TestClient(main.app)
+    files = {"file": ("quiz.txt", TEXT)}
+    params = {"duplicates": False}
+    compact = client.post("/extract-mcq-enhanced", params={**params, "compact": True}, files=files).json()
+    assert "math_content" not in compact["mcqs"][0]
+    assert "content_analysis" in compact["mcqs"][0]
+
+    requested = client.post("/extract-mcq-enhanced", params={**params, "compact": True, "fields": "math_content"},
+                            files=files).json()
+    assert set(requested["mcqs"][0]) == {"math_content"}
+
+
+def test_large_responses_are_gzipped_for_clients_that_accept_it():
+    client = TestClient(main.app)
+    files = {"file": ("quiz.txt", TEXT)}
+    response = client.post("/extract-mcq", params={"duplicates": False}, files=files,
+                           headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["mcqs"]) == 30
+
+    raw = client.post("/extract-mcq", params={"duplicates": False}, files=files,
+                      headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert len(gzip.compress(raw.content)) < len(raw.content)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test /parse-text (MCQs from text the caller has) and /extract-text (text without parsing)
+"""
+
+import io
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import fitz
+import pytest
+from docx import Document
+from fastapi.testclient import TestClient
+
+import main
+
+TEXT = "1. What is 2 + 2?\nA) 3\nB) 4\nC) 5\nAnswer: B\n2. Which planet is red?\nA) Mars\nB) Venus\nC) Earth"
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+def _pdf(page_count):
+    doc = fitz.open()
+    for page_num in range(page_count):
+        doc.new_page().insert_text((72, 72), f"Page body {page_num + 1}")
+    return doc.tobytes()
+
+
+def test_parse_text_accepts_json_and_plain_bodies(client):
+    params = {"duplicates": False}
+    from_json = client.post("/parse-text", params=params, json={"text": TEXT}).json()
+    plain = client.post("/parse-text", params=params, content=TEXT.encode("latin-1"),
+                        headers={"Content-Type": "text/plain"}).json()
+    assert from_json["mcqs"] == plain["mcqs"]
+    assert from_json["text_info"] == {"characters": len(TEXT)}
+    assert [mcq["correct_answer"] for mcq in from_json["mcqs"]] == ["B", None]
+    assert from_json["extraction_summary"]["questions_with_answers"] == 1
+
+
+def test_parse_text_shapes_and_limits_like_extract(client):
+    response = client.post("/parse-text", params={"max_questions": 1, "fields": "question", "duplicates": False},
+                           json={"text": TEXT}).json()
+    assert response["mcqs"] == [{"question": "What is 2 + 2?"}]
+
+
+@pytest.mark.parametrize("body,detail", [
+    ({"json": {"text": "   "}}, "No text to parse"),
+    ({"json": {"body": TEXT}}, 'JSON body must be an object with a "text" string'),
+    ({"content": b"{not json", "headers": {"Content-Type": "application/json"}}, "Invalid JSON body"),
+    ({"json": {"text": "Just some notes without questions"}}, "No MCQs found in the text"),
+])
+def test_parse_text_rejects_bad_bodies(client, body, detail):
+    response = client.post("/parse-text", **body)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith(detail)
+
+
+def test_extract_text_returns_pdf_pages(client):
+    response = client.post("/extract-text", params={"pages": "2-"}, files={"file": ("exam.pdf", _pdf(3))}).json()
+    assert [page["page"] for page in response["pages"]] == ["2", "3"]
+    assert response["pages"][0]["text"].strip() == "Page body 2"
+    assert "---" not in response["pages"][1]["text"]
+    assert response["extraction_summary"]["pages_returned"] == 2
+    assert response["file_info"]["file_type"] == "PDF"
+
+
+def test_extract_text_returns_unpaged_formats_as_one_segment(client):
+    doc = Document()
+    doc.add_paragraph("Intro paragraph")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    response = client.post("/extract-text", files={"file": ("notes.docx", buffer.getvalue())}).json()
+    assert len(response["pages"]) == 1
+    assert response["pages"][0]["page"] is None
+    assert "Intro paragraph" in response["pages"][0]["text"]
+
+
+def test_extract_text_reports_unreadable_files(client):
+    response = client.post("/extract-text", files={"file": ("broken.pdf", b"%PDF-1.4 truncated")})
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test request time budgets: partial results, where extraction stops and what counts as exhausted
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import MCQExtractor, TimeBudget, _budget_exhausted, _budget_expired, _request_budget
+
+TEXT = "\n".join(f"{n}. Question {n}?\nA) yes\nB) no\nAnswer: A" for n in range(1, 21)).encode()
+
+
+@pytest.fixture
+def budget():
+    budget = TimeBudget(60)
+    token = _request_budget.set(budget)
+    yield budget
+    _request_budget.reset(token)
+
+
+def _pdf(page_count):
+    doc = fitz.open()
+    for page_num in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"{page_num + 1}. Question {page_num + 1}?\nA) yes\nB) no")
+    return doc.tobytes()
+
+
+def test_exhausted_only_when_work_is_skipped(budget):
+    budget.deadline = time.monotonic() - 1
+    assert not _budget_exhausted()
+    assert _budget_expired()
+    assert budget.exhausted
+
+
+def test_run_finishing_after_the_deadline_is_complete_and_learned_from(budget, monkeypatch):
+    extractor = MCQExtractor()
+    parse = extractor._parse_mcqs_with_patterns
+
+    def parse_then_expire(*args):
+        mcqs = parse(*args)
+        budget.deadline = time.monotonic() - 1
+        return mcqs
+
+    monkeypatch.setattr(extractor, "_parse_mcqs_with_patterns", parse_then_expire)
+    mcqs, _, _ = extractor.extract_mcqs(TEXT, "quiz.txt")
+    assert len(mcqs) == 20
+    assert not budget.exhausted
+    assert extractor.profiles._profiles
+
+
+def test_budget_spent_before_parsing_stops_at_the_boundary(budget, monkeypatch):
+    extractor = MCQExtractor()
+    read = extractor.extract_text_from_txt
+
+    def read_then_expire(content):
+        text = read(content)
+        budget.deadline = time.monotonic() - 1
+        return text
+
+    monkeypatch.setattr(extractor, "extract_text_from_txt", read_then_expire)
+    monkeypatch.setattr(extractor, "index_document", lambda text: pytest.fail("preprocessed after the deadline"))
+    mcqs, document, _ = extractor.extract_mcqs(TEXT, "quiz.txt")
+    assert mcqs == []
+    assert document.text == TEXT.decode()
+    assert budget.exhausted
+
+
+def test_pdf_pages_stop_when_the_budget_runs_out(budget, monkeypatch):
+    extractor = MCQExtractor()
+    add_page = extractor._add_pdf_page
+
+    def add_then_expire(buffer, page_num, *args):
+        add_page(buffer, page_num, *args)
+        if page_num == 1:
+            budget.deadline = time.monotonic() - 1
+
+    monkeypatch.setattr(extractor, "_add_pdf_page", add_then_expire)
+    text = extractor.extract_text_from_pdf(_pdf(5))
+    assert [label for label, _, _ in text.pages] == ["1", "2"]
+    assert (budget.pages_processed, budget.pages_total) == (2, 5)
+    assert budget.exhausted
+
+
+def test_endpoints_report_partial_results():
+    client = TestClient(main.app)
+    big = "\n".join(f"{n}. Question {n}?\nA) yes\nB) no" for n in range(1, 20001)).encode()
+    response = client.post("/extract-mcq", params={"time_budget": 0.01}, files={"file": ("big.txt", big)}).json()
+    assert response["partial"] is True
+    assert len(response["mcqs"]) < 20000
+
+    response = client.post("/extract-mcq", files={"file": ("quiz.txt", TEXT)}).json()
+    assert response["partial"] is False
+    assert len(response["mcqs"]) == 20
+
+
+def test_extract_text_returns_no_pages_without_text():
+    response = TestClient(main.app).post("/extract-text", files={"file": ("blank.txt", b"  \n\n")}).json()
+    assert response["pages"] == []
+    assert response["extraction_summary"]["pages_returned"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test the structured XLSX reader: header-mapped columns, answer normalisation and the text fallback
+"""
+
+import io
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from openpyxl import Workbook
+
+from main import MCQExtractor
+
+extractor = MCQExtractor()
+
+
+def _xlsx(*sheets):
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for index, rows in enumerate(sheets):
+        sheet = workbook.create_sheet(f"Sheet{index + 1}")
+        for row in rows:
+            sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+BANK = [
+    [None],
+    ["Q No", "Question Text", "Option A", "Option B", "Option C", "Option D", "Correct Answer"],
+    ["Q1", "Capital of Peru?", "Lima", "Quito", "Bogota", "Santiago", "a"],
+    [2, "Square root of 81?", 7, 8, 9, 10, "Option C"],
+    [3, "Largest ocean?", "Atlantic", "Pacific", None, None, "Pacific"],
+    [None, None, None, None, None, None, None],
+    [4, "", "x", "y", None, None, None],
+]
+
+
+def test_rows_are_mapped_through_header_aliases():
+    mcqs = extractor.extract_mcqs_from_xlsx(_xlsx(BANK))
+    assert [mcq.question_number for mcq in mcqs] == [1, 2, 3]
+    assert mcqs[1].options == {"A": "7", "B": "8", "C": "9", "D": "10"}
+    assert mcqs[2].options == {"A": "Atlantic", "B": "Pacific"}
+    assert [mcq.correct_answer for mcq in mcqs] == ["A", "C", "B"]
+
+
+def test_numbers_default_to_row_order_across_sheets():
+    other = [["question", "a", "b"], ["Who wrote Hamlet?", "Shakespeare", "Marlowe"]]
+    mcqs = extractor.extract_mcqs_from_xlsx(_xlsx(BANK, other))
+    assert [(mcq.question_number, mcq.question) for mcq in mcqs][-1] == (4, "Who wrote Hamlet?")
+    assert len(extractor.extract_mcqs_from_xlsx(_xlsx(BANK, other), max_questions=2)) == 2
+
+
+@pytest.mark.parametrize("header", [["Question", "A"], ["Prompt", "A", "B"]])
+def test_sheets_without_an_mcq_header_fall_back_to_text(header):
+    assert extractor._match_mcq_columns(tuple(header)) is None
+    content = _xlsx(BANK, [header, ["1. Which gas do plants absorb?"], ["A) Oxygen"], ["B) Carbon dioxide"]])
+    assert extractor.extract_mcqs_from_xlsx(content) is None
+
+
+def test_text_fallback_reads_sheets_as_pages():
+    content = _xlsx([["1. Which gas do plants absorb?"], ["A) Oxygen", None], ["B) Carbon dioxide"], ["Answer: B"]])
+    mcqs, document, spec = extractor.extract_mcqs(content, "bank.xlsx")
+    assert spec.name == "xlsx"
+    assert [label for label, _, _ in extractor.extract_text_from_xlsx(content).pages] == ["Sheet1"]
+    assert mcqs[0].options == {"A": "Oxygen", "B": "Carbon dioxide"}
+    assert mcqs[0].correct_answer == "B"
+
+
+def test_unreadable_workbook_is_reported_by_the_text_extractor():
+    assert extractor.extract_mcqs_from_xlsx(b"PK\x03\x04 not a workbook") is None
+    with pytest.raises(ValueError, match="Error reading Excel file"):
+        extractor.extract_text_from_xlsx(b"PK\x03\x04 not a workbook")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))